@@ -3,8 +3,10 @@ import csv
 import glob
 import os
 import json
-from flask import Flask, request, jsonify
-from datetime import datetime
+import base64
+import functools
+from flask import Flask, Response, request, jsonify, send_file, url_for
+from datetime import datetime, timezone
 import logging
 
 try:
@@ -13,16 +15,135 @@ try:
 except Exception:
     HAS_MARSHMALLOW = False
 
+try:
+    from helpers.columnar import ColumnarSnapshot, columnar_dir, export_snapshot
+    from helpers import ranking_engine
+    HAS_NUMPY = True
+except Exception:
+    HAS_NUMPY = False
+
 from models.Usuario import Usuario
+from helpers.db_pool import ConnectionPool, DEFAULT_PRAGMAS, get_db, init_app as init_db_pool
+from helpers.metrics import Metrics, init_app as init_metrics
+from helpers.compression import CompressedPayload, Compressor, init_app as init_compression
+from helpers.profiling import RequestProfiler, init_app as init_profiler
+from helpers.replica import ReadReplica, get_read_db, init_app as init_replica
+from helpers.ranking_cache import RankingCache
+from helpers.jobs import JobRunner, DONE as JOB_DONE
+from helpers.json_journal import JsonJournal
+from helpers import data_version, rollups, search
+from helpers.data_version import DataVersions, make_etag
+from helpers.ranking_sql import (RANKING_METRICS, GEO_FILTERS, DEFAULT_METRIC, RANKING_COLUMNS,
+                                 RANK_METHODS, DEFAULT_RANK_METHOD, assign_ranks,
+                                 GROWTH_BASES, GROWTH_ORDERS, GROWTH_COLUMNS,
+                                 build_ranking_query, build_growth_query, create_ranking_indexes)
 
 # Config
 DATABASE_NAME = "censoescolar.db"
 CSV_GLOB = "microdados_ed_basica_*.csv"
 JSON_USUARIOS_FILE = "data/usuarios.json"
 JSON_INSTITUICOES_FILE = "data/instituicoesensino.json"
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+# PRAGMAs aplicadas a cada conexão nova do pool (ajuste aqui WAL, mmap_size, cache_size...)
+SQLITE_PRAGMAS = dict(DEFAULT_PRAGMAS)
+RANKING_CACHE_TTL = int(os.environ.get('RANKING_CACHE_TTL', 300))
+RANKING_CACHE_MAX_ENTRIES = 128
+RANKING_LIMIT = 10
+RANKING_MAX_LIMIT = 500
+LIST_LIMIT = 20
+LIST_MAX_LIMIT = 1000
+LIST_STREAM_MAX_LIMIT = 100000  # em NDJSON as linhas saem em lotes, então a página pode ser maior
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+# 'numpy' usa o snapshot colunar quando ele cobre o ano; 'sql' força a consulta no SQLite
+RANKING_ENGINE = os.environ.get('RANKING_ENGINE', 'numpy')
+JOB_WORKERS = 2
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 30))  # sem heartbeat por mais que isso, a tarefa é órfã
+STREAM_BATCH_SIZE = 1000  # linhas por fetchmany nas respostas NDJSON
+JOB_PROGRESS_EVERY = 50000  # linhas entre atualizações de progresso da tarefa
+BULK_MAX_ITEMS = 10000  # itens por requisição nas rotas /bulk
+BULK_IN_CHUNK = 500  # valores por consulta IN na checagem de duplicados
+COLUMNAR_DIR = columnar_dir(DATABASE_NAME) if HAS_NUMPY else None
+JSON_COMPACT_EVERY = int(os.environ.get('JSON_COMPACT_EVERY', 1000))  # operações no journal antes de compactar
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'  # latência por rota e por SQL em /metrics
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'  # cProfile sob demanda (ver helpers/profiling.py)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # fração das requisições perfiladas sem cabeçalho
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')  # se definido, exigido no cabeçalho X-Profile
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))  # perfis mantidos no ring buffer
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1') == '1'  # gzip/zstd/br por Accept-Encoding
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))  # nível do gzip (1-9)
+READ_REPLICA = os.environ.get('READ_REPLICA', '0') == '1'  # leituras numa cópia em memória do banco (ver helpers/replica.py)
+READ_REPLICA_REFRESH = float(os.environ.get('READ_REPLICA_REFRESH', 1.0))  # segundos entre as conferências do disco
 
 app = Flask(__name__)
 
+# Métricas Prometheus (ver helpers/metrics.py); desligadas, não instalam nenhum hook
+metrics = Metrics(enabled=METRICS_ENABLED)
+init_metrics(app, metrics)
+
+# Profiling por requisição (cabeçalho X-Profile ou amostragem); desligado, nem é instalado
+profiler = RequestProfiler(PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE, token=PROFILE_TOKEN,
+                           keep=PROFILE_KEEP, enabled=PROFILING_ENABLED)
+init_profiler(app, profiler)
+
+# Compressão das respostas (ver helpers/compression.py); os rankings em cache guardam o corpo já comprimido
+compressor = Compressor(enabled=COMPRESSION_ENABLED, min_size=COMPRESSION_MIN_SIZE,
+                        levels={'gzip': COMPRESSION_LEVEL})
+init_compression(app, compressor)
+
+# Pool de conexões SQLite compartilhado pelas rotas (ver helpers/db_pool.py)
+db_pool = ConnectionPool(DATABASE_NAME, pragmas=SQLITE_PRAGMAS, max_size=DB_POOL_SIZE,
+                         factory=metrics.connection_factory() if metrics.enabled else None)
+init_db_pool(app, db_pool)
+
+# Réplica de leitura em memória (ver helpers/replica.py); desligada, as leituras usam o pool acima
+replica = ReadReplica(DATABASE_NAME, pool_size=DB_POOL_SIZE, refresh_interval=READ_REPLICA_REFRESH,
+                      factory=metrics.connection_factory() if metrics.enabled else None,
+                      on_build=create_ranking_indexes, enabled=READ_REPLICA)
+init_replica(app, replica)
+
+# Cache dos rankings; invalidado pelas rotas de escrita e pelos scripts de migração
+ranking_cache = RankingCache(DATABASE_NAME, max_entries=RANKING_CACHE_MAX_ENTRIES, ttl=RANKING_CACHE_TTL)
+# Versões por tabela (tb_data_version) que dão os ETags das rotas de leitura; com a réplica,
+# as da própria cópia em memória, para o ETag acompanhar o que ela já tem
+data_versions = replica if replica.enabled else DataVersions(DATABASE_NAME)
+# O CREATE TABLE IF NOT EXISTS do ranking só precisa rodar uma vez por processo
+_ranking_table_ready = False
+# Idem para a checagem do índice de busca (bancos anteriores a ele o ganham na primeira vez)
+_search_index_ready = False
+# Idem para as agregações (tb_agregado)
+_rollups_ready = False
+
+# Tarefas em segundo plano (materialização do ranking a partir dos CSVs); o estado fica em
+# tb_job, visível e de-duplicado entre todos os workers
+ranking_jobs = JobRunner(DATABASE_NAME, max_workers=JOB_WORKERS, lease_seconds=JOB_LEASE_SECONDS)
+
+# Snapshot colunar (.npy via mmap) de tb_instituicao_year, compartilhado pelos workers no page cache
+columnar = ColumnarSnapshot(COLUMNAR_DIR) if HAS_NUMPY else None
+
+# Espelhos JSON: journal append-only + snapshot compactado (ver helpers/json_journal.py)
+usuarios_store = JsonJournal(JSON_USUARIOS_FILE, 'id', unique_fields=('cpf',), compact_every=JSON_COMPACT_EVERY)
+instituicoes_store = JsonJournal(JSON_INSTITUICOES_FILE, 'codigo', compact_every=JSON_COMPACT_EVERY)
+JSON_STORES = {'usuarios': usuarios_store, 'instituicoesensino': instituicoes_store}
+
+
+def _collect_status_metrics():
+    """Contadores do pool de conexões e do cache de rankings, lidos a cada /metrics."""
+    pool, cache = db_pool.stats(), ranking_cache.stats()
+    return [
+        ('db_pool_acquire_total', 'Conexões emprestadas do pool (hit = reaproveitada).', 'counter',
+         {('hit',): pool['hits'], ('miss',): pool['misses']}, ('result',)),
+        ('db_pool_idle_connections', 'Conexões ociosas no pool.', 'gauge', {(): pool['idle']}, ()),
+        ('ranking_cache_lookups_total', 'Consultas ao cache de rankings.', 'counter',
+         {('hit',): cache['hits'], ('miss',): cache['misses']}, ('result',)),
+        ('ranking_cache_entries', 'Rankings em cache.', 'gauge', {(): cache['entries']}, ()),
+    ]
+
+
+metrics.add_collector(_collect_status_metrics)
+
 # Logger
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -79,37 +200,238 @@ def _find_column(header, candidates):
 
 # ===== Funções auxiliares para manipulação de JSON =====
 
-def _load_json(filepath):
-    """Carrega dados de um arquivo JSON."""
-    if not os.path.exists(filepath):
-        return []
+def _journal_put(store, item):
+    """Anexa `item` ao journal do espelho JSON."""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        store.put(item)
+        return True
     except Exception as e:
-        logger.warning('Erro ao carregar %s: %s', filepath, e)
-        return []
+        logger.error('Erro ao gravar journal de %s: %s', store.snapshot_path, e)
+        return False
 
 
-def _save_json(filepath, data):
-    """Salva dados em um arquivo JSON."""
+def _journal_delete(store, key):
+    """Anexa a remoção de `key` ao journal do espelho JSON."""
     try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        logger.info('Arquivo %s salvo com sucesso', filepath)
+        store.delete(key)
         return True
     except Exception as e:
-        logger.error('Erro ao salvar %s: %s', filepath, e)
+        logger.error('Erro ao gravar journal de %s: %s', store.snapshot_path, e)
         return False
 
 
-def _find_by_id_json(data, id_key, id_value):
-    """Encontra um item em uma lista JSON por um campo ID."""
-    for item in data:
-        if str(item.get(id_key)) == str(id_value):
-            return item
-    return None
+def _journal_put_many(store, items):
+    """Anexa vários itens ao journal do espelho JSON em uma única escrita."""
+    try:
+        if items:
+            store.put_many(items)
+        return True
+    except Exception as e:
+        logger.error('Erro ao gravar journal de %s: %s', store.snapshot_path, e)
+        return False
+
+
+# ===== Cargas em lote =====
+
+def _apply_rollups(cursor, codigos, antes):
+    """Aplica às agregações do cadastro a diferença entre `antes` e o estado atual de `codigos`.
+
+    Roda na mesma transação da escrita em `tb_instituicao`, antes do commit. Devolve as
+    unidades `(nivel, codigo)` tocadas.
+    """
+    depois = rollups.fetch_cadastro_rows(cursor, codigos)
+    return rollups.apply_cadastro_deltas(cursor, [(antes.get(str(c)), depois.get(str(c))) for c in codigos])
+
+
+def _ensure_search_index():
+    """Cria ou reconstrói o índice de busca se ele não cobre tb_instituicao (uma vez por processo)."""
+    global _search_index_ready
+    if _search_index_ready:
+        return
+    if search.ensure(get_db()):
+        logger.info('Índice de busca %s reconstruído', search.TABLE)
+        replica.refresh()
+    _search_index_ready = True
+
+
+def _ensure_rollups(conn=None):
+    """Cria e preenche tb_agregado se faltar ou estiver vazia (uma vez por processo).
+
+    `conn` é a conexão de quem roda fora de um request (a carga do ranking).
+    """
+    global _rollups_ready
+    if _rollups_ready:
+        return
+    if rollups.ensure(conn or get_db()):
+        logger.info('Agregações %s recalculadas', rollups.TABLE)
+        replica.refresh()
+    _rollups_ready = True
+
+
+def _sync_cadastro(codigos, unidades, ids):
+    """Leva para a réplica de leitura as instituições `codigos`, as agregações `unidades` e as
+    entradas `ids` do índice de busca (após o commit)."""
+    if not replica.enabled:
+        return
+    codigos = [str(c) for c in codigos]
+    changes = {'tb_instituicao': (f"codigo IN ({','.join('?' * len(codigos))})", codigos)}
+    if ids:
+        ids = sorted(set(ids))
+        changes[search.TABLE] = (f"rowid IN ({','.join('?' * len(ids))})", ids)
+    if unidades:
+        changes[rollups.TABLE] = (
+            f"nu_ano_censo = {rollups.CADASTRO} AND (nivel, codigo) IN (VALUES {', '.join(['(?, ?)'] * len(unidades))})",
+            [v for unidade in unidades for v in unidade])
+    replica.sync(changes)
+
+
+def _bulk_payload():
+    """Itens de uma carga em lote: array JSON ou NDJSON (um objeto por linha).
+
+    Levanta ValueError se o corpo não puder ser lido.
+    """
+    raw = request.get_data(as_text=True)
+    if request.mimetype == 'application/x-ndjson' or not raw.lstrip().startswith('['):
+        return [json.loads(line) for line in raw.splitlines() if line.strip()]
+    return json.loads(raw)
+
+
+def _existing_values(cur, table, column, values):
+    """Subconjunto de `values` já presente em `table.column` (consultas IN em blocos)."""
+    values = list(values)
+    found = set()
+    for i in range(0, len(values), BULK_IN_CHUNK):
+        chunk = values[i:i + BULK_IN_CHUNK]
+        cur.execute(f"SELECT {column} FROM {table} WHERE {column} IN ({','.join('?' * len(chunk))})", chunk)
+        found.update(r[0] for r in cur.fetchall())
+    return found
+
+
+# ===== Respostas em streaming (NDJSON) =====
+
+def _wants_stream():
+    """True se o cliente pediu NDJSON (`?stream=1` ou `Accept: application/x-ndjson`)."""
+    if request.args.get('stream') == '1':
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best == 'application/x-ndjson'
+
+
+# ===== GET condicional (ETag / Last-Modified / 304) =====
+
+def _not_modified(etag, last_modified):
+    response = Response(status=304)
+    _set_validators(response, etag, last_modified)
+    return response
+
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept')
+    if compressor.enabled:
+        response.vary.add('Accept-Encoding')
+
+
+def _conditional(*tabelas):
+    """Responde 304 se o ETag do cliente ainda vale, sem chamar a rota nem ler os dados.
+
+    O ETag (forte) combina a versão de `tabelas` em tb_data_version com a URL completa e o
+    formato (JSON ou NDJSON); respostas 200 saem com ETag, Last-Modified e `no-cache`.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            state = data_versions.get(tabelas)
+            if state is None:
+                return view(*args, **kwargs)
+            versions, last_modified = state
+            etag = make_etag(versions, request.full_path, 'ndjson' if _wants_stream() else 'json')
+            if last_modified:
+                last_modified = datetime.fromtimestamp(last_modified, timezone.utc)
+            if request.if_none_match:
+                # O cliente pode ter guardado a versão comprimida (ETag com sufixo do codec)
+                for variant in compressor.etag_variants(etag):
+                    if request.if_none_match.contains_weak(variant):
+                        return _not_modified(variant, last_modified)
+            elif last_modified and request.if_modified_since and last_modified <= request.if_modified_since:
+                return _not_modified(etag, last_modified)
+
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+def _ndjson_response(sql, params, to_item):
+    """Resposta NDJSON gerada sob demanda: lê o cursor com fetchmany e serializa por lote,
+    então o pico de memória não depende do número de linhas devolvidas.
+
+    Usa uma conexão própria do pool (e não a do app context), pois o gerador continua
+    rodando depois que a função da rota retorna.
+    """
+    def generate():
+        pool, conn = replica.acquire() if replica.enabled else (db_pool, db_pool.acquire())
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                yield ''.join(json.dumps(to_item(r), ensure_ascii=False) + '\n' for r in rows)
+        finally:
+            cur.close()
+            pool.release(conn)
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+# ===== Paginação de instituições =====
+
+def _instituicao_filters(args):
+    """Cláusulas WHERE para os filtros aceitos na listagem de instituições."""
+    where = []
+    params = []
+    for field in ('co_uf', 'co_municipio'):
+        if args.get(field):
+            where.append(f"{field} = ?")
+            params.append(_safe_int(args[field]))
+    if args.get('sg_uf'):
+        where.append("sg_uf = ?")
+        params.append(args['sg_uf'].upper())
+    return where, params
+
+
+def _instituicao_item(r):
+    return {
+        'codigo': r[0],
+        'nome': r[1],
+        'no_municipio': r[2],
+        'co_municipio': r[3],
+        'sg_uf': r[4]
+    }
+
+
+def _encode_cursor(last_id):
+    """Cursor opaco (base64 url-safe) com o último id da página."""
+    raw = json.dumps({'id': last_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(token):
+    """Decodifica o cursor; string vazia significa primeira página. Levanta ValueError."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        return int(json.loads(raw)['id'])
+    except Exception as e:
+        raise ValueError(f"cursor inválido: {token}") from e
 
 
 @app.get('/')
@@ -117,15 +439,144 @@ def index():
     return jsonify({"service": "Censo Escolar API", "version": "1.0"}), 200
 
 
+@app.get('/healthz')
+def healthz():
+    """Liveness: o processo está de pé e responde (não consulta o banco)."""
+    return {"status": "ok", "pid": os.getpid()}, 200
+
+
+@app.get('/readyz')
+def readyz():
+    """Readiness: banco acessível e worker aceitando tráfego (503 durante a parada graciosa)."""
+    draining = app.config.get('DRAINING', False)
+    checks = {'draining': draining}
+    ready = not draining
+    try:
+        get_db().execute("SELECT 1 FROM tb_instituicao LIMIT 1").fetchall()
+        checks['database'] = 'ok'
+    except sqlite3.Error as e:
+        checks['database'] = str(e)
+        ready = False
+    if columnar is not None:
+        checks['columnar'] = columnar.version
+    return {"status": "ready" if ready else "not ready", "pid": os.getpid(), "checks": checks}, 200 if ready else 503
+
+
+@app.get('/status/db-pool')
+def db_pool_status():
+    """Contadores de hit/miss do pool de conexões SQLite."""
+    return jsonify(db_pool.stats()), 200
+
+
+@app.get('/status/read-replica')
+def read_replica_status():
+    """Geração atual da réplica de leitura em memória, cópias, syncs e pool."""
+    return jsonify(replica.stats()), 200
+
+
+@app.get('/status/asgi')
+def asgi_status():
+    """Threads do executor ocupadas e requisições esperando por uma (só no modo ASGI, ver asgi.py)."""
+    bridge = app.extensions.get('asgi_bridge')
+    if bridge is None:
+        return {"mensagem": "API não está rodando em modo ASGI (asgi.py)."}, 404
+    return jsonify(bridge.stats()), 200
+
+
+@app.get('/status/ranking-cache')
+def ranking_cache_status():
+    """Contadores do cache de rankings."""
+    return jsonify(ranking_cache.stats()), 200
+
+
+@app.get('/metrics')
+def metrics_endpoint():
+    """Métricas no formato texto do Prometheus (com METRICS_ENABLED=1)."""
+    if not metrics.enabled:
+        return {"mensagem": "Métricas desativadas. Inicie a API com METRICS_ENABLED=1."}, 404
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.get('/profiles')
+def list_profiles():
+    """Perfis gravados (mais recentes primeiro), com rota, duração e funções mais caras."""
+    if not profiler.enabled:
+        return {"mensagem": "Profiling desativado. Inicie a API com PROFILING_ENABLED=1."}, 404
+    try:
+        limit = int(request.args.get('limit', PROFILE_KEEP))
+    except ValueError:
+        return {"mensagem": "O parâmetro limit deve ser inteiro."}, 400
+    if limit < 1 or limit > PROFILE_KEEP:
+        return {"mensagem": f"limit deve estar entre 1 e {PROFILE_KEEP}."}, 400
+    return jsonify(profiler.list(limit)), 200
+
+
+@app.get('/profiles/<nome>')
+def download_profile(nome):
+    """Arquivo de um perfil: `<id>.pstats`, `<id>.collapsed` ou `<id>.json`."""
+    if not profiler.enabled:
+        return {"mensagem": "Profiling desativado. Inicie a API com PROFILING_ENABLED=1."}, 404
+    profile_id, _, ext = nome.rpartition('.')
+    path = profiler.path(profile_id, ext)
+    if path is None:
+        return {"mensagem": "Perfil não encontrado"}, 404
+    return send_file(os.path.abspath(path), as_attachment=ext == 'pstats', download_name=nome)
+
+
+@app.get('/status/columnar')
+def columnar_status():
+    """Versão, anos e linhas do snapshot colunar carregado."""
+    if columnar is None:
+        return {"mensagem": "NumPy não instalado; snapshot colunar indisponível"}, 503
+    columnar.refresh()
+    return jsonify(columnar.stats()), 200
+
+
+@app.get('/jobs')
+def list_jobs():
+    """Lista as tarefas em segundo plano recentes."""
+    return jsonify([job.to_dict() for job in ranking_jobs.list()]), 200
+
+
+@app.get('/jobs/<job_id>')
+def job_status(job_id):
+    """Status e progresso (arquivos processados, linhas lidas, linhas/s) de uma tarefa."""
+    job = ranking_jobs.get(job_id)
+    if job is None:
+        return {"mensagem": "Tarefa não encontrada"}, 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.get('/export/<nome>')
+def export_json(nome):
+    """Conteúdo atual de `data/<nome>.json` (snapshot + journal) no formato original."""
+    store = JSON_STORES.get(nome)
+    if store is None:
+        return {"mensagem": "Arquivo desconhecido"}, 404
+    return jsonify(store.export()), 200
+
+
+@app.post('/export/<nome>/compact')
+def compact_json(nome):
+    """Força a compactação: grava o snapshot `data/<nome>.json` e zera o journal."""
+    store = JSON_STORES.get(nome)
+    if store is None:
+        return {"mensagem": "Arquivo desconhecido"}, 404
+    store.compact()
+    return {"mensagem": f"{store.snapshot_path} compactado"}, 200
+
+
 @app.get('/usuarios')
+@_conditional('tb_usuario')
 def get_usuarios():
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT id, nome, cpf, nascimento FROM tb_usuario")
-        rows = cursor.fetchall()
-    finally:
-        conn.close()
+    """Lista usuários; com `?stream=1` ou `Accept: application/x-ndjson` responde em NDJSON."""
+    if _wants_stream():
+        return _ndjson_response("SELECT id, nome, cpf, nascimento FROM tb_usuario", (),
+                                lambda row: Usuario(row[0], row[1], row[2], row[3]).to_json())
+
+    cursor = get_read_db().cursor()
+    cursor.execute("SELECT id, nome, cpf, nascimento FROM tb_usuario")
+    rows = cursor.fetchall()
 
     usuarios = []
     for row in rows:
@@ -143,43 +594,41 @@ def create_usuario():
             logger.warning('Dados inválidos para criar usuário: %s', data)
             return {"mensagem": "Campos obrigatórios: nome, cpf, nascimento"}, 400
 
-        # Carregar usuários do JSON
-        usuarios_json = _load_json(JSON_USUARIOS_FILE)
-        
-        # Verificar se CPF já existe
-        if any(u.get('cpf') == data['cpf'] for u in usuarios_json):
-            logger.warning('CPF duplicado na criação de usuário: %s', data['cpf'])
-            return {"mensagem": "CPF já existe"}, 409
-
-        # Gerar novo ID
-        novo_id = max([u.get('id', 0) for u in usuarios_json] + [0]) + 1
-        novo_usuario = {
-            'id': novo_id,
-            'nome': data['nome'],
-            'cpf': data['cpf'],
-            'nascimento': data['nascimento']
-        }
-
-        # Persistir em JSON
-        usuarios_json.append(novo_usuario)
-        if not _save_json(JSON_USUARIOS_FILE, usuarios_json):
-            return {"mensagem": "Erro ao salvar usuário em JSON"}, 500
+        with usuarios_store.lock():
+            # Verificar se CPF já existe
+            if usuarios_store.find('cpf', data['cpf']) is not None:
+                logger.warning('CPF duplicado na criação de usuário: %s', data['cpf'])
+                return {"mensagem": "CPF já existe"}, 409
+
+            # Gerar novo ID
+            novo_id = usuarios_store.next_id()
+            novo_usuario = {
+                'id': novo_id,
+                'nome': data['nome'],
+                'cpf': data['cpf'],
+                'nascimento': data['nascimento']
+            }
+
+            # Persistir em JSON
+            if not _journal_put(usuarios_store, novo_usuario):
+                return {"mensagem": "Erro ao salvar usuário em JSON"}, 500
 
         # Persistir em banco de dados
-        conn = sqlite3.connect(DATABASE_NAME)
+        conn = get_db()
         cursor = conn.cursor()
         try:
             cursor.execute(
                 "INSERT INTO tb_usuario (nome, cpf, nascimento) VALUES (?, ?, ?)",
                 (data['nome'], data['cpf'], data['nascimento'])
             )
+            data_version.bump(cursor, 'tb_usuario')
             conn.commit()
+            replica.sync({'tb_usuario': ("id = ?", (cursor.lastrowid,))})
             logger.info('Usuário criado com sucesso: ID=%d, CPF=%s', novo_id, data['cpf'])
         except Exception as e:
+            conn.rollback()
             logger.error('Erro ao inserir usuário no DB: %s', e)
             return {"mensagem": "Erro ao inserir no banco de dados"}, 500
-        finally:
-            conn.close()
 
         return jsonify(novo_usuario), 201
 
@@ -196,44 +645,45 @@ def update_usuario(usuario_id):
         if not data:
             return {"mensagem": "Corpo da requisição vazio"}, 400
 
-        # Carregar usuários do JSON
-        usuarios_json = _load_json(JSON_USUARIOS_FILE)
-        usuario = _find_by_id_json(usuarios_json, 'id', usuario_id)
-        
-        if not usuario:
-            logger.warning('Usuário não encontrado para atualização: ID=%d', usuario_id)
-            return {"mensagem": "Usuário não encontrado"}, 404
-
-        # Atualizar campos
-        if 'nome' in data:
-            usuario['nome'] = data['nome']
-        if 'cpf' in data:
-            # Verificar duplicação de CPF
-            if any(u.get('cpf') == data['cpf'] and u.get('id') != usuario_id for u in usuarios_json):
-                return {"mensagem": "CPF já existe em outro usuário"}, 409
-            usuario['cpf'] = data['cpf']
-        if 'nascimento' in data:
-            usuario['nascimento'] = data['nascimento']
-
-        # Persistir em JSON
-        if not _save_json(JSON_USUARIOS_FILE, usuarios_json):
-            return {"mensagem": "Erro ao salvar usuário em JSON"}, 500
+        with usuarios_store.lock():
+            usuario = usuarios_store.get(usuario_id)
+
+            if not usuario:
+                logger.warning('Usuário não encontrado para atualização: ID=%d', usuario_id)
+                return {"mensagem": "Usuário não encontrado"}, 404
+
+            # Atualizar campos
+            if 'nome' in data:
+                usuario['nome'] = data['nome']
+            if 'cpf' in data:
+                # Verificar duplicação de CPF
+                dono = usuarios_store.find('cpf', data['cpf'])
+                if dono is not None and dono != str(usuario_id):
+                    return {"mensagem": "CPF já existe em outro usuário"}, 409
+                usuario['cpf'] = data['cpf']
+            if 'nascimento' in data:
+                usuario['nascimento'] = data['nascimento']
+
+            # Persistir em JSON
+            if not _journal_put(usuarios_store, usuario):
+                return {"mensagem": "Erro ao salvar usuário em JSON"}, 500
 
         # Persistir em banco de dados
-        conn = sqlite3.connect(DATABASE_NAME)
+        conn = get_db()
         cursor = conn.cursor()
         try:
             cursor.execute(
                 "UPDATE tb_usuario SET nome = ?, cpf = ?, nascimento = ? WHERE id = ?",
                 (usuario['nome'], usuario['cpf'], usuario['nascimento'], usuario_id)
             )
+            data_version.bump(cursor, 'tb_usuario')
             conn.commit()
+            replica.sync({'tb_usuario': ("id = ?", (usuario_id,))})
             logger.info('Usuário atualizado com sucesso: ID=%d', usuario_id)
         except Exception as e:
+            conn.rollback()
             logger.error('Erro ao atualizar usuário no DB: %s', e)
             return {"mensagem": "Erro ao atualizar no banco de dados"}, 500
-        finally:
-            conn.close()
 
         return jsonify(usuario), 200
 
@@ -246,31 +696,28 @@ def update_usuario(usuario_id):
 def delete_usuario(usuario_id):
     """Deleta um usuário de JSON e banco de dados."""
     try:
-        # Carregar usuários do JSON
-        usuarios_json = _load_json(JSON_USUARIOS_FILE)
-        usuario = _find_by_id_json(usuarios_json, 'id', usuario_id)
-        
-        if not usuario:
-            logger.warning('Usuário não encontrado para deleção: ID=%d', usuario_id)
-            return {"mensagem": "Usuário não encontrado"}, 404
-
-        # Remover do JSON
-        usuarios_json = [u for u in usuarios_json if u.get('id') != usuario_id]
-        if not _save_json(JSON_USUARIOS_FILE, usuarios_json):
-            return {"mensagem": "Erro ao deletar usuário em JSON"}, 500
+        with usuarios_store.lock():
+            if usuarios_store.get(usuario_id) is None:
+                logger.warning('Usuário não encontrado para deleção: ID=%d', usuario_id)
+                return {"mensagem": "Usuário não encontrado"}, 404
+
+            # Remover do JSON
+            if not _journal_delete(usuarios_store, usuario_id):
+                return {"mensagem": "Erro ao deletar usuário em JSON"}, 500
 
         # Deletar do banco de dados
-        conn = sqlite3.connect(DATABASE_NAME)
+        conn = get_db()
         cursor = conn.cursor()
         try:
             cursor.execute("DELETE FROM tb_usuario WHERE id = ?", (usuario_id,))
+            data_version.bump(cursor, 'tb_usuario')
             conn.commit()
+            replica.sync({'tb_usuario': ("id = ?", (usuario_id,))})
             logger.info('Usuário deletado com sucesso: ID=%d', usuario_id)
         except Exception as e:
+            conn.rollback()
             logger.error('Erro ao deletar usuário no DB: %s', e)
             return {"mensagem": "Erro ao deletar do banco de dados"}, 500
-        finally:
-            conn.close()
 
         return {"mensagem": f"Usuário {usuario_id} deletado com sucesso"}, 200
 
@@ -279,44 +726,207 @@ def delete_usuario(usuario_id):
         return {"mensagem": "Erro interno ao deletar usuário"}, 500
 
 
+@app.post('/usuarios/bulk')
+def bulk_usuarios():
+    """Cria/atualiza usuários em lote (array JSON ou NDJSON).
+
+    Itens sem `id` são criados (nome, cpf, nascimento obrigatórios); itens com `id`
+    atualizam o usuário. A validação e a checagem de CPF duplicado (contra o banco, o
+    JSON e o próprio lote) são feitas em uma passada, e as gravações vão para o banco em
+    uma única transação com `executemany`. A resposta traz o status de cada item.
+    """
+    try:
+        itens = _bulk_payload()
+    except ValueError:
+        return {"mensagem": "Corpo deve ser um array JSON ou NDJSON"}, 400
+    if not isinstance(itens, list) or not itens:
+        return {"mensagem": "Nenhum item enviado"}, 400
+    if len(itens) > BULK_MAX_ITEMS:
+        return {"mensagem": f"Máximo de {BULK_MAX_ITEMS} itens por lote"}, 413
+
+    try:
+        conn = get_db()
+        cursor = conn.cursor()
+        with usuarios_store.lock():
+            # Só cpf texto/número entra na consulta; os demais são recusados no próprio item
+            cpfs_no_banco = _existing_values(
+                cursor, 'tb_usuario', 'cpf',
+                {i['cpf'] for i in itens if isinstance(i, dict) and isinstance(i.get('cpf'), (str, int))})
+            cpfs_no_lote = set()
+            pendentes = {}  # id -> usuário já alterado neste lote
+            inserir, atualizar, resultados = [], [], []
+            proximo_id = usuarios_store.next_id()
+
+            for indice, item in enumerate(itens):
+                if not isinstance(item, dict):
+                    resultados.append({'indice': indice, 'status': 400, 'mensagem': 'Item deve ser um objeto'})
+                    continue
+                if 'cpf' in item and not isinstance(item['cpf'], (str, int)):
+                    resultados.append({'indice': indice, 'status': 400, 'mensagem': 'cpf deve ser texto ou número'})
+                    continue
+
+                if 'id' in item:
+                    usuario = pendentes.get(str(item['id'])) or usuarios_store.get(item['id'])
+                    if usuario is None:
+                        resultados.append({'indice': indice, 'status': 404, 'mensagem': 'Usuário não encontrado'})
+                        continue
+                    cpf = item.get('cpf', usuario['cpf'])
+                    if cpf != usuario['cpf']:
+                        dono = usuarios_store.find('cpf', cpf)
+                        if cpf in cpfs_no_lote or cpf in cpfs_no_banco or (dono is not None and dono != str(usuario['id'])):
+                            resultados.append({'indice': indice, 'status': 409, 'mensagem': 'CPF já existe em outro usuário'})
+                            continue
+                    usuario.update({k: item[k] for k in ('nome', 'cpf', 'nascimento') if k in item})
+                    cpfs_no_lote.add(cpf)
+                    pendentes[str(usuario['id'])] = usuario
+                    atualizar.append((usuario['nome'], usuario['cpf'], usuario['nascimento'], usuario['id']))
+                    resultados.append({'indice': indice, 'status': 200, 'id': usuario['id']})
+                    continue
+
+                if not all(k in item for k in ['nome', 'cpf', 'nascimento']):
+                    resultados.append({'indice': indice, 'status': 400,
+                                       'mensagem': 'Campos obrigatórios: nome, cpf, nascimento'})
+                    continue
+                if (item['cpf'] in cpfs_no_lote or item['cpf'] in cpfs_no_banco
+                        or usuarios_store.find('cpf', item['cpf']) is not None):
+                    resultados.append({'indice': indice, 'status': 409, 'mensagem': 'CPF já existe'})
+                    continue
+                novo_usuario = {
+                    'id': proximo_id,
+                    'nome': item['nome'],
+                    'cpf': item['cpf'],
+                    'nascimento': item['nascimento']
+                }
+                proximo_id += 1
+                cpfs_no_lote.add(item['cpf'])
+                pendentes[str(novo_usuario['id'])] = novo_usuario
+                inserir.append((item['nome'], item['cpf'], item['nascimento']))
+                resultados.append({'indice': indice, 'status': 201, 'id': novo_usuario['id']})
+
+            # Persistir em banco de dados (uma transação)
+            try:
+                cursor.executemany("INSERT INTO tb_usuario (nome, cpf, nascimento) VALUES (?, ?, ?)", inserir)
+                cursor.executemany("UPDATE tb_usuario SET nome = ?, cpf = ?, nascimento = ? WHERE id = ?", atualizar)
+                data_version.bump(cursor, 'tb_usuario')
+                conn.commit()
+                replica.sync({'tb_usuario': None})
+            except Exception as e:
+                conn.rollback()
+                logger.error('Erro ao gravar lote de usuários no DB: %s', e)
+                return {"mensagem": "Erro ao gravar no banco de dados"}, 500
+
+            # Persistir em JSON
+            if not _journal_put_many(usuarios_store, list(pendentes.values())):
+                return {"mensagem": "Erro ao salvar usuários em JSON"}, 500
+
+        erros = sum(1 for r in resultados if r['status'] >= 400)
+        logger.info('Lote de usuários: %d criados, %d atualizados, %d erros', len(inserir), len(atualizar), erros)
+        return jsonify({'criados': len(inserir), 'atualizados': len(atualizar), 'erros': erros,
+                        'itens': resultados}), 200
+
+    except Exception as e:
+        logger.error('Erro ao processar lote de usuários: %s', e)
+        return {"mensagem": "Erro interno ao processar lote de usuários"}, 500
+
+
 @app.get('/instituicoesensino')
+@_conditional('tb_instituicao')
 def list_instituicoes():
-    limit = int(request.args.get('limit', 20))
-    offset = int(request.args.get('offset', 0))
-    conn = sqlite3.connect(DATABASE_NAME)
-    cur = conn.cursor()
-    cur.execute("SELECT codigo, nome, no_municipio, co_municipio, sg_uf FROM tb_instituicao LIMIT ? OFFSET ?", (limit, offset))
+    """Lista instituições com paginação por OFFSET ou por cursor (keyset).
+
+    Filtros opcionais: `co_uf`, `co_municipio`, `sg_uf`. Com o parâmetro `cursor`
+    (vazio na primeira página) a resposta é `{"items": [...], "next_cursor": ...}` e a
+    página seguinte é buscada com `id > último id`, custando o mesmo que a primeira.
+    Sem `cursor`, mantém o formato antigo (lista) com `LIMIT ? OFFSET ?`.
+
+    Com `?stream=1` ou `Accept: application/x-ndjson` os itens são enviados em NDJSON,
+    um por linha, lidos do banco em lotes (em modo cursor, sem `next_cursor`).
+
+    `limit` vai de 1 a LIST_MAX_LIMIT (LIST_STREAM_MAX_LIMIT em NDJSON); `offset` não pode
+    ser negativo.
+    """
+    try:
+        limit = int(request.args.get('limit', LIST_LIMIT))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return {"mensagem": "Os parâmetros limit e offset devem ser inteiros."}, 400
+    max_limit = LIST_STREAM_MAX_LIMIT if _wants_stream() else LIST_MAX_LIMIT
+    if limit < 1 or limit > max_limit or offset < 0:
+        return {"mensagem": f"limit deve estar entre 1 e {max_limit} e offset não pode ser negativo."}, 400
+    where, params = _instituicao_filters(request.args)
+
+    if 'cursor' in request.args:
+        try:
+            after_id = _decode_cursor(request.args['cursor'])
+        except ValueError:
+            return {"mensagem": "Cursor inválido"}, 400
+        if after_id is not None:
+            where.append("id > ?")
+            params.append(after_id)
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+        sql = f"SELECT id, codigo, nome, no_municipio, co_municipio, sg_uf FROM tb_instituicao{where_sql} ORDER BY id LIMIT ?"
+        if _wants_stream():
+            return _ndjson_response(sql, (*params, limit), lambda r: _instituicao_item(r[1:]))
+        cur = get_read_db().cursor()
+        cur.execute(sql, (*params, limit))
+        rows = cur.fetchall()
+        items = [_instituicao_item(r[1:]) for r in rows]
+        next_cursor = _encode_cursor(rows[-1][0]) if len(rows) == limit else None
+        return jsonify({'items': items, 'next_cursor': next_cursor}), 200
+
+    where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+    sql = f"SELECT codigo, nome, no_municipio, co_municipio, sg_uf FROM tb_instituicao{where_sql} LIMIT ? OFFSET ?"
+    if _wants_stream():
+        return _ndjson_response(sql, (*params, limit, offset), _instituicao_item)
+    cur = get_read_db().cursor()
+    cur.execute(sql, (*params, limit, offset))
     rows = cur.fetchall()
-    conn.close()
+    items = [_instituicao_item(r) for r in rows]
+    return jsonify(items), 200
+
+
+@app.get('/instituicoesensino/busca')
+@_conditional('tb_instituicao')
+def buscar_instituicoes():
+    """Busca instituições pelo nome da escola e do município, sem diferenciar acentos e maiúsculas.
+
+    `q` (obrigatório) traz os termos, todos obrigatórios; o último vale como prefixo
+    ("escola sao jo"). A ordem é por relevância (BM25 do índice FTS5, ver helpers/search.py)
+    e cada item traz `relevancia` (maior é melhor). Aceita os filtros da listagem (`co_uf`,
+    `co_municipio`, `sg_uf`), `limit` (padrão 20, máximo 100) e `offset`.
+    """
+    match = search.match_query(request.args.get('q'))
+    if match is None:
+        return {"mensagem": "Informe o texto da busca no parâmetro q."}, 400
+    try:
+        limit = int(request.args.get('limit', SEARCH_LIMIT))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return {"mensagem": "Os parâmetros limit e offset devem ser inteiros."}, 400
+    if limit < 1 or limit > SEARCH_MAX_LIMIT or offset < 0:
+        return {"mensagem": f"limit deve estar entre 1 e {SEARCH_MAX_LIMIT} e offset não pode ser negativo."}, 400
+    where, params = _instituicao_filters(request.args)
+
+    _ensure_search_index()
+    cur = get_read_db().cursor()
+    cur.execute(search.search_query(where), (match, *params, limit, offset))
     items = []
-    for r in rows:
-        items.append({
-            'codigo': r[0],
-            'nome': r[1],
-            'no_municipio': r[2],
-            'co_municipio': r[3],
-            'sg_uf': r[4]
-        })
+    for r in cur.fetchall():
+        item = _instituicao_item(r)
+        item['relevancia'] = round(-r[5], 4)
+        items.append(item)
     return jsonify(items), 200
 
 
 @app.get('/instituicoesensino/<codigo>')
+@_conditional('tb_instituicao')
 def get_instituicao(codigo):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cur = conn.cursor()
+    cur = get_read_db().cursor()
     cur.execute("SELECT codigo, nome, no_municipio, co_municipio, sg_uf FROM tb_instituicao WHERE codigo = ?", (codigo,))
     row = cur.fetchone()
-    conn.close()
     if not row:
         return {"mensagem": "Instituição não encontrada"}, 404
-    item = {
-        'codigo': row[0],
-        'nome': row[1],
-        'no_municipio': row[2],
-        'co_municipio': row[3],
-        'sg_uf': row[4]
-    }
-    return jsonify(item), 200
+    return jsonify(_instituicao_item(row)), 200
 
 
 @app.post('/instituicoesensino')
@@ -328,46 +938,51 @@ def create_instituicao():
             logger.warning('Dados inválidos para criar instituição: %s', data)
             return {"mensagem": "Campos obrigatórios: codigo, nome, co_uf, co_municipio"}, 400
 
-        # Carregar instituições do JSON
-        instituicoes_json = _load_json(JSON_INSTITUICOES_FILE)
-        
-        # Verificar se código já existe
-        if any(i.get('codigo') == data['codigo'] for i in instituicoes_json):
-            logger.warning('Código duplicado na criação de instituição: %s', data['codigo'])
-            return {"mensagem": "Código de instituição já existe"}, 409
-
-        nova_instituicao = {
-            'codigo': data['codigo'],
-            'nome': data['nome'],
-            'co_uf': data.get('co_uf'),
-            'co_municipio': data.get('co_municipio'),
-            'qt_mat_bas': data.get('qt_mat_bas', 0),
-            'qt_mat_prof': data.get('qt_mat_prof', 0),
-            'qt_mat_esp': data.get('qt_mat_esp', 0)
-        }
-
-        # Persistir em JSON
-        instituicoes_json.append(nova_instituicao)
-        if not _save_json(JSON_INSTITUICOES_FILE, instituicoes_json):
-            return {"mensagem": "Erro ao salvar instituição em JSON"}, 500
+        with instituicoes_store.lock():
+            # Verificar se código já existe
+            if instituicoes_store.get(data['codigo']) is not None:
+                logger.warning('Código duplicado na criação de instituição: %s', data['codigo'])
+                return {"mensagem": "Código de instituição já existe"}, 409
+
+            nova_instituicao = {
+                'codigo': data['codigo'],
+                'nome': data['nome'],
+                'co_uf': data.get('co_uf'),
+                'co_municipio': data.get('co_municipio'),
+                'qt_mat_bas': data.get('qt_mat_bas', 0),
+                'qt_mat_prof': data.get('qt_mat_prof', 0),
+                'qt_mat_esp': data.get('qt_mat_esp', 0)
+            }
+
+            # Persistir em JSON
+            if not _journal_put(instituicoes_store, nova_instituicao):
+                return {"mensagem": "Erro ao salvar instituição em JSON"}, 500
 
         # Persistir em banco de dados
-        conn = sqlite3.connect(DATABASE_NAME)
+        _ensure_search_index()
+        _ensure_rollups()
+        conn = get_db()
         cursor = conn.cursor()
         try:
+            antes = rollups.fetch_cadastro_rows(cursor, [nova_instituicao['codigo']])
+            ids = search.unindex(cursor, [nova_instituicao['codigo']])
             cursor.execute(
                 "INSERT OR IGNORE INTO tb_instituicao (codigo, nome, co_uf, co_municipio, qt_mat_bas, qt_mat_prof, qt_mat_esp) VALUES (?, ?, ?, ?, ?, ?, ?)",
                 (nova_instituicao['codigo'], nova_instituicao['nome'], nova_instituicao['co_uf'], 
                  nova_instituicao['co_municipio'], nova_instituicao['qt_mat_bas'], 
                  nova_instituicao['qt_mat_prof'], nova_instituicao['qt_mat_esp'])
             )
+            unidades = _apply_rollups(cursor, [nova_instituicao['codigo']], antes)
+            ids += search.index(cursor, [nova_instituicao['codigo']])
+            data_version.bump(cursor, 'tb_instituicao')
             conn.commit()
+            _sync_cadastro([nova_instituicao['codigo']], unidades, ids)
+            ranking_cache.invalidate()
             logger.info('Instituição criada com sucesso: Código=%s', nova_instituicao['codigo'])
         except Exception as e:
+            conn.rollback()
             logger.error('Erro ao inserir instituição no DB: %s', e)
             return {"mensagem": "Erro ao inserir no banco de dados"}, 500
-        finally:
-            conn.close()
 
         return jsonify(nova_instituicao), 201
 
@@ -384,48 +999,55 @@ def update_instituicao(codigo):
         if not data:
             return {"mensagem": "Corpo da requisição vazio"}, 400
 
-        # Carregar instituições do JSON
-        instituicoes_json = _load_json(JSON_INSTITUICOES_FILE)
-        instituicao = _find_by_id_json(instituicoes_json, 'codigo', codigo)
-        
-        if not instituicao:
-            logger.warning('Instituição não encontrada para atualização: Código=%s', codigo)
-            return {"mensagem": "Instituição não encontrada"}, 404
-
-        # Atualizar campos
-        if 'nome' in data:
-            instituicao['nome'] = data['nome']
-        if 'co_uf' in data:
-            instituicao['co_uf'] = data['co_uf']
-        if 'co_municipio' in data:
-            instituicao['co_municipio'] = data['co_municipio']
-        if 'qt_mat_bas' in data:
-            instituicao['qt_mat_bas'] = data['qt_mat_bas']
-        if 'qt_mat_prof' in data:
-            instituicao['qt_mat_prof'] = data['qt_mat_prof']
-        if 'qt_mat_esp' in data:
-            instituicao['qt_mat_esp'] = data['qt_mat_esp']
-
-        # Persistir em JSON
-        if not _save_json(JSON_INSTITUICOES_FILE, instituicoes_json):
-            return {"mensagem": "Erro ao salvar instituição em JSON"}, 500
+        with instituicoes_store.lock():
+            instituicao = instituicoes_store.get(codigo)
+
+            if not instituicao:
+                logger.warning('Instituição não encontrada para atualização: Código=%s', codigo)
+                return {"mensagem": "Instituição não encontrada"}, 404
+
+            # Atualizar campos
+            if 'nome' in data:
+                instituicao['nome'] = data['nome']
+            if 'co_uf' in data:
+                instituicao['co_uf'] = data['co_uf']
+            if 'co_municipio' in data:
+                instituicao['co_municipio'] = data['co_municipio']
+            if 'qt_mat_bas' in data:
+                instituicao['qt_mat_bas'] = data['qt_mat_bas']
+            if 'qt_mat_prof' in data:
+                instituicao['qt_mat_prof'] = data['qt_mat_prof']
+            if 'qt_mat_esp' in data:
+                instituicao['qt_mat_esp'] = data['qt_mat_esp']
+
+            # Persistir em JSON
+            if not _journal_put(instituicoes_store, instituicao):
+                return {"mensagem": "Erro ao salvar instituição em JSON"}, 500
 
         # Persistir em banco de dados
-        conn = sqlite3.connect(DATABASE_NAME)
+        _ensure_search_index()
+        _ensure_rollups()
+        conn = get_db()
         cursor = conn.cursor()
         try:
+            antes = rollups.fetch_cadastro_rows(cursor, [codigo])
+            ids = search.unindex(cursor, [codigo])
             cursor.execute(
                 "UPDATE tb_instituicao SET nome = ?, co_uf = ?, co_municipio = ?, qt_mat_bas = ?, qt_mat_prof = ?, qt_mat_esp = ? WHERE codigo = ?",
                 (instituicao['nome'], instituicao['co_uf'], instituicao['co_municipio'],
                  instituicao['qt_mat_bas'], instituicao['qt_mat_prof'], instituicao['qt_mat_esp'], codigo)
             )
+            unidades = _apply_rollups(cursor, [codigo], antes)
+            ids += search.index(cursor, [codigo])
+            data_version.bump(cursor, 'tb_instituicao')
             conn.commit()
+            _sync_cadastro([codigo], unidades, ids)
+            ranking_cache.invalidate()
             logger.info('Instituição atualizada com sucesso: Código=%s', codigo)
         except Exception as e:
+            conn.rollback()
             logger.error('Erro ao atualizar instituição no DB: %s', e)
             return {"mensagem": "Erro ao atualizar no banco de dados"}, 500
-        finally:
-            conn.close()
 
         return jsonify(instituicao), 200
 
@@ -438,31 +1060,36 @@ def update_instituicao(codigo):
 def delete_instituicao(codigo):
     """Deleta uma instituição de JSON e banco de dados."""
     try:
-        # Carregar instituições do JSON
-        instituicoes_json = _load_json(JSON_INSTITUICOES_FILE)
-        instituicao = _find_by_id_json(instituicoes_json, 'codigo', codigo)
-        
-        if not instituicao:
-            logger.warning('Instituição não encontrada para deleção: Código=%s', codigo)
-            return {"mensagem": "Instituição não encontrada"}, 404
-
-        # Remover do JSON
-        instituicoes_json = [i for i in instituicoes_json if i.get('codigo') != codigo]
-        if not _save_json(JSON_INSTITUICOES_FILE, instituicoes_json):
-            return {"mensagem": "Erro ao deletar instituição em JSON"}, 500
+        with instituicoes_store.lock():
+            instituicao = instituicoes_store.get(codigo)
+            if not instituicao:
+                logger.warning('Instituição não encontrada para deleção: Código=%s', codigo)
+                return {"mensagem": "Instituição não encontrada"}, 404
+
+            # Remover do JSON
+            if not _journal_delete(instituicoes_store, instituicao['codigo']):
+                return {"mensagem": "Erro ao deletar instituição em JSON"}, 500
 
         # Deletar do banco de dados
-        conn = sqlite3.connect(DATABASE_NAME)
+        _ensure_search_index()
+        _ensure_rollups()
+        conn = get_db()
         cursor = conn.cursor()
         try:
+            antes = rollups.fetch_cadastro_rows(cursor, [codigo])
+            ids = search.unindex(cursor, [codigo])
             cursor.execute("DELETE FROM tb_instituicao WHERE codigo = ?", (codigo,))
+            unidades = _apply_rollups(cursor, [codigo], antes)
+            ids += search.index(cursor, [codigo])
+            data_version.bump(cursor, 'tb_instituicao')
             conn.commit()
+            _sync_cadastro([codigo], unidades, ids)
+            ranking_cache.invalidate()
             logger.info('Instituição deletada com sucesso: Código=%s', codigo)
         except Exception as e:
+            conn.rollback()
             logger.error('Erro ao deletar instituição no DB: %s', e)
             return {"mensagem": "Erro ao deletar do banco de dados"}, 500
-        finally:
-            conn.close()
 
         return {"mensagem": f"Instituição {codigo} deletada com sucesso"}, 200
 
@@ -471,248 +1098,472 @@ def delete_instituicao(codigo):
         return {"mensagem": "Erro interno ao deletar instituição"}, 500
 
 
+@app.post('/instituicoesensino/bulk')
+def bulk_instituicoes():
+    """Cria/atualiza instituições em lote (array JSON ou NDJSON).
+
+    Cada item traz `codigo`; se o código já existe no JSON (ou apareceu antes no lote) a
+    instituição é atualizada, senão é criada (nome, co_uf, co_municipio obrigatórios).
+    Códigos presentes só no banco são recusados com 409. Tudo é gravado em uma única
+    transação com `executemany`; a resposta traz o status de cada item.
+    """
+    try:
+        itens = _bulk_payload()
+    except ValueError:
+        return {"mensagem": "Corpo deve ser um array JSON ou NDJSON"}, 400
+    if not isinstance(itens, list) or not itens:
+        return {"mensagem": "Nenhum item enviado"}, 400
+    if len(itens) > BULK_MAX_ITEMS:
+        return {"mensagem": f"Máximo de {BULK_MAX_ITEMS} itens por lote"}, 413
+
+    campos = ('nome', 'co_uf', 'co_municipio', 'qt_mat_bas', 'qt_mat_prof', 'qt_mat_esp')
+    try:
+        _ensure_search_index()
+        _ensure_rollups()
+        conn = get_db()
+        cursor = conn.cursor()
+        with instituicoes_store.lock():
+            codigos_no_banco = {str(c) for c in _existing_values(
+                cursor, 'tb_instituicao', 'codigo',
+                {str(i['codigo']) for i in itens if isinstance(i, dict) and 'codigo' in i})}
+            pendentes = {}  # codigo -> instituição já alterada neste lote
+            inserir, atualizar, resultados = [], [], []
+
+            for indice, item in enumerate(itens):
+                if not isinstance(item, dict) or 'codigo' not in item:
+                    resultados.append({'indice': indice, 'status': 400, 'mensagem': 'Campo obrigatório: codigo'})
+                    continue
+                codigo = str(item['codigo'])
+                instituicao = pendentes.get(codigo) or instituicoes_store.get(codigo)
+
+                if instituicao is not None:
+                    instituicao.update({k: item[k] for k in campos if k in item})
+                    pendentes[codigo] = instituicao
+                    atualizar.append(codigo)
+                    resultados.append({'indice': indice, 'status': 200, 'codigo': instituicao['codigo']})
+                    continue
+
+                if not all(k in item for k in ['nome', 'co_uf', 'co_municipio']):
+                    resultados.append({'indice': indice, 'status': 400,
+                                       'mensagem': 'Campos obrigatórios: codigo, nome, co_uf, co_municipio'})
+                    continue
+                if codigo in codigos_no_banco:
+                    resultados.append({'indice': indice, 'status': 409, 'mensagem': 'Código de instituição já existe'})
+                    continue
+                nova_instituicao = {
+                    'codigo': item['codigo'],
+                    'nome': item['nome'],
+                    'co_uf': item.get('co_uf'),
+                    'co_municipio': item.get('co_municipio'),
+                    'qt_mat_bas': item.get('qt_mat_bas', 0),
+                    'qt_mat_prof': item.get('qt_mat_prof', 0),
+                    'qt_mat_esp': item.get('qt_mat_esp', 0)
+                }
+                pendentes[codigo] = nova_instituicao
+                inserir.append(codigo)
+                resultados.append({'indice': indice, 'status': 201, 'codigo': nova_instituicao['codigo']})
+
+            # Persistir em banco de dados (uma transação); cada código entra com seu estado final
+            novos = dict.fromkeys(inserir)
+            alterados = dict.fromkeys(c for c in atualizar if c not in novos)
+            try:
+                tocados = list(novos) + list(alterados)
+                antes = rollups.fetch_cadastro_rows(cursor, tocados)
+                ids = search.unindex(cursor, tocados)
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO tb_instituicao (codigo, nome, co_uf, co_municipio, qt_mat_bas, qt_mat_prof, qt_mat_esp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(str(pendentes[c]['codigo']), *(pendentes[c][k] for k in campos)) for c in novos])
+                cursor.executemany(
+                    "UPDATE tb_instituicao SET nome = ?, co_uf = ?, co_municipio = ?, qt_mat_bas = ?, qt_mat_prof = ?, qt_mat_esp = ? WHERE codigo = ?",
+                    [(*(pendentes[c][k] for k in campos), c) for c in alterados])
+                unidades = _apply_rollups(cursor, tocados, antes)
+                ids += search.index(cursor, tocados)
+                data_version.bump(cursor, 'tb_instituicao')
+                conn.commit()
+                _sync_cadastro(tocados, unidades, ids)
+                ranking_cache.invalidate()
+            except Exception as e:
+                conn.rollback()
+                logger.error('Erro ao gravar lote de instituições no DB: %s', e)
+                return {"mensagem": "Erro ao gravar no banco de dados"}, 500
+
+            # Persistir em JSON
+            if not _journal_put_many(instituicoes_store, list(pendentes.values())):
+                return {"mensagem": "Erro ao salvar instituições em JSON"}, 500
+
+        erros = sum(1 for r in resultados if r['status'] >= 400)
+        logger.info('Lote de instituições: %d criadas, %d atualizadas, %d erros', len(inserir), len(atualizar), erros)
+        return jsonify({'criados': len(inserir), 'atualizados': len(atualizar), 'erros': erros,
+                        'itens': resultados}), 200
+
+    except Exception as e:
+        logger.error('Erro ao processar lote de instituições: %s', e)
+        return {"mensagem": "Erro interno ao processar lote de instituições"}, 500
+
+
+def _populate_ranking_year(job, ano, csv_files):
+    """Popula `tb_instituicao_year` para `ano` a partir dos CSVs (executa em segundo plano)."""
+    table_name = 'tb_instituicao_year'
+
+    CANDIDATES = {
+        'co_entidade': ['CO_ENTIDADE', 'CO_ENTIDADE_ESCOLA', 'CO_ENTIDADE_MEC', 'COD_ENTIDADE'],
+        'no_entidade': ['NO_ENTIDADE', 'NO_ESCOLA', 'NOME_ENTIDADE'],
+        'no_uf': ['NO_UF'],
+        'sg_uf': ['SG_UF'],
+        'co_uf': ['CO_UF'],
+        'no_municipio': ['NO_MUNICIPIO'],
+        'co_municipio': ['CO_MUNICIPIO'],
+        'no_mesorregiao': ['NO_MESORREGIAO'],
+        'co_mesorregiao': ['CO_MESORREGIAO'],
+        'no_microrregiao': ['NO_MICRORREGIAO'],
+        'co_microrregiao': ['CO_MICRORREGIAO'],
+        'nu_ano_censo': ['NU_ANO_CENSO', 'NU_ANO'],
+        'no_regiao': ['NO_REGIAO'],
+        'co_regiao': ['CO_REGIAO'],
+        'qt_mat_bas': ['QT_MAT_BAS', 'NU_MATRICULAS_BASICA', 'QT_MATRICULAS_BAS'],
+        'qt_mat_prof': ['QT_MAT_PROF', 'NU_MATRICULAS_PROF'],
+        'qt_mat_eja': ['QT_MAT_EJA', 'NU_MATRICULAS_EJA'],
+        'qt_mat_esp': ['QT_MAT_ESP', 'NU_MATRICULAS_ESP'],
+        'qt_mat_fund': ['QT_MAT_FUND', 'NU_MATRICULAS_FUND'],
+        'qt_mat_inf': ['QT_MAT_INF', 'NU_MATRICULAS_INF'],
+        'qt_mat_med': ['QT_MAT_MED', 'NU_MATRICULAS_MED'],
+        'qt_mat_zr_na': ['QT_MAT_ZR_NA'],
+        'qt_mat_zr_rur': ['QT_MAT_ZR_RUR'],
+        'qt_mat_zr_urb': ['QT_MAT_ZR_URB'],
+        'qt_mat_total': ['QT_MAT_TOTAL', 'NU_MATRICULAS_TOTAL']
+    }
+
+    agg = {}
+    rows_scanned = 0
+    job.update(files_total=len(csv_files), files_done=0, rows_scanned=0)
+    for files_done, csv_file in enumerate(csv_files):
+        logger.info('Populando a partir do CSV: %s', csv_file)
+        job.update(current_file=csv_file)
+        with open(csv_file, 'r', encoding='latin1', errors='replace', newline='') as f:
+            reader = csv.reader(f, delimiter=';')
+            try:
+                header = next(reader)
+            except StopIteration:
+                continue
+            header = [h.strip() for h in header]
+
+            idx = {}
+            for key, cands in CANDIDATES.items():
+                found = None
+                for c in cands:
+                    if c in header:
+                        found = header.index(c)
+                        break
+                idx[key] = found
+
+            file_year = None
+            for y in (2022, 2023, 2024):
+                if str(y) in os.path.basename(csv_file):
+                    file_year = y
+                    break
+
+            for row in reader:
+                rows_scanned += 1
+                if rows_scanned % JOB_PROGRESS_EVERY == 0:
+                    job.update(rows_scanned=rows_scanned)
+
+                year_val = None
+                if idx['nu_ano_censo'] is not None and idx['nu_ano_censo'] < len(row):
+                    try:
+                        year_val = int(row[idx['nu_ano_censo']].strip())
+                    except Exception:
+                        year_val = None
+                if year_val is None:
+                    year_val = file_year
+
+                if year_val != ano:
+                    continue
+
+                def _get(k):
+                    i = idx.get(k)
+                    if i is None or i >= len(row):
+                        return ''
+                    return row[i].strip()
+
+                co_entidade = _get('co_entidade')
+                if not co_entidade:
+                    continue
+
+                ent = agg.get(co_entidade)
+                if ent is None:
+                    ent = {
+                        'co_entidade': co_entidade,
+                        'no_entidade': _get('no_entidade'),
+                        'no_uf': _get('no_uf'),
+                        'sg_uf': _get('sg_uf'),
+                        'co_uf': _safe_int(_get('co_uf')),
+                        'no_municipio': _get('no_municipio'),
+                        'co_municipio': _safe_int(_get('co_municipio')),
+                        'no_mesorregiao': _get('no_mesorregiao'),
+                        'co_mesorregiao': _safe_int(_get('co_mesorregiao')),
+                        'no_microrregiao': _get('no_microrregiao'),
+                        'co_microrregiao': _safe_int(_get('co_microrregiao')),
+                        'nu_ano_censo': ano,
+                        'no_regiao': _get('no_regiao'),
+                        'co_regiao': _safe_int(_get('co_regiao')),
+                        'qt_mat_bas': 0,
+                        'qt_mat_prof': 0,
+                        'qt_mat_eja': 0,
+                        'qt_mat_esp': 0,
+                        'qt_mat_fund': 0,
+                        'qt_mat_inf': 0,
+                        'qt_mat_med': 0,
+                        'qt_mat_zr_na': 0,
+                        'qt_mat_zr_rur': 0,
+                        'qt_mat_zr_urb': 0,
+                        'qt_mat_total': 0
+                    }
+                    agg[co_entidade] = ent
+
+                for field in ['qt_mat_bas','qt_mat_prof','qt_mat_eja','qt_mat_esp','qt_mat_fund','qt_mat_inf','qt_mat_med','qt_mat_zr_na','qt_mat_zr_rur','qt_mat_zr_urb']:
+                    val = 0
+                    if idx.get(field) is not None and idx[field] < len(row):
+                        try:
+                            val = int(row[idx[field]].strip()) if row[idx[field]].strip() != '' else 0
+                        except Exception:
+                            val = 0
+                    ent[field] = ent.get(field, 0) + val
+
+                if idx.get('qt_mat_total') is not None and idx['qt_mat_total'] < len(row):
+                    try:
+                        total = int(row[idx['qt_mat_total']].strip())
+                    except Exception:
+                        total = 0
+                else:
+                    total = sum(ent.get(f,0) for f in ['qt_mat_bas','qt_mat_prof','qt_mat_eja','qt_mat_esp','qt_mat_fund','qt_mat_inf','qt_mat_med'])
+                ent['qt_mat_total'] = total
+
+        job.update(files_done=files_done + 1, rows_scanned=rows_scanned)
+
+    to_insert = []
+    for ent in agg.values():
+        to_insert.append((
+            ent.get('co_entidade'), ent.get('no_entidade'), ent.get('no_uf'), ent.get('sg_uf'), ent.get('co_uf'),
+            ent.get('no_municipio'), ent.get('co_municipio'), ent.get('no_mesorregiao'), ent.get('co_mesorregiao'),
+            ent.get('no_microrregiao'), ent.get('co_microrregiao'), ent.get('nu_ano_censo'), ent.get('no_regiao'), ent.get('co_regiao'),
+            ent.get('qt_mat_bas'), ent.get('qt_mat_prof'), ent.get('qt_mat_eja'), ent.get('qt_mat_esp'), ent.get('qt_mat_fund'), ent.get('qt_mat_inf'), ent.get('qt_mat_med'),
+            ent.get('qt_mat_zr_na'), ent.get('qt_mat_zr_rur'), ent.get('qt_mat_zr_urb'), ent.get('qt_mat_total')
+        ))
+
+    insert_sql = f"""
+        INSERT OR REPLACE INTO {table_name} (
+            co_entidade, no_entidade, no_uf, sg_uf, co_uf, no_municipio, co_municipio,
+            no_mesorregiao, co_mesorregiao, no_microrregiao, co_microrregiao, nu_ano_censo,
+            no_regiao, co_regiao, qt_mat_bas, qt_mat_prof, qt_mat_eja, qt_mat_esp, qt_mat_fund,
+            qt_mat_inf, qt_mat_med, qt_mat_zr_na, qt_mat_zr_rur, qt_mat_zr_urb, qt_mat_total
+        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+    """
+    conn = db_pool.acquire()
+    try:
+        _ensure_rollups(conn)
+        conn.executemany(insert_sql, to_insert)
+        data_version.bump(conn, table_name)
+        conn.commit()
+        rollups.rebuild_year_rollups(conn, [ano])
+        if HAS_NUMPY and to_insert:
+            export_snapshot(DATABASE_NAME, COLUMNAR_DIR)
+        # Cache e snapshot já refletem o ano novo: só agora a versão final é publicada, para
+        # que nenhum ETag novo acompanhe um ranking antigo
+        ranking_cache.invalidate()
+        data_version.bump(conn, table_name)
+        conn.commit()
+    finally:
+        db_pool.release(conn)
+    if replica.enabled:
+        # A réplica copia o ano novo agora (e não na próxima conferência); o que entrou no
+        # cache enquanto isso foi lido da cópia antiga
+        replica.refresh()
+        ranking_cache.invalidate()
+    logger.info('Ranking %s materializado: %d instituições', ano, len(to_insert))
+    return {'rows_inserted': len(to_insert)}
+
+
+@app.get('/instituicoesensino/ranking/crescimento')
+@_conditional('tb_instituicao_year')
+def instituicoes_crescimento():
+    """Escolas que mais cresceram (ou encolheram) entre dois anos.
+
+    Parâmetros: `de` e `ate` (obrigatórios, 2022-2024, de < ate), `metric` (padrão
+    qt_mat_total), `limit` (padrão 10), `por` (absoluto ou percentual), `ordem` (desc =
+    maior crescimento, asc = maior queda) e `rank` (empates, como no ranking anual). Cada
+    item traz `valor_de`, `valor_ate`, `delta` e `delta_pct` (None se o valor inicial é 0).
+
+    As ordens de cada par de anos são pré-calculadas na exportação do snapshot colunar,
+    então a requisição é um fatiamento; sem snapshot, usa um self-join no SQLite.
+    """
+    try:
+        de = int(request.args['de'])
+        ate = int(request.args['ate'])
+        limit = int(request.args.get('limit', RANKING_LIMIT))
+    except KeyError:
+        return {"mensagem": "Informe os anos de e ate."}, 400
+    except ValueError:
+        return {"mensagem": "Os parâmetros de, ate e limit devem ser inteiros."}, 400
+    if not (2022 <= de < ate <= 2024):
+        return {"mensagem": "Anos inválidos. Informe 2022 <= de < ate <= 2024."}, 400
+    if limit < 1 or limit > RANKING_MAX_LIMIT:
+        return {"mensagem": f"limit deve estar entre 1 e {RANKING_MAX_LIMIT}."}, 400
+    metric = request.args.get('metric', DEFAULT_METRIC)
+    por = request.args.get('por', GROWTH_BASES[0])
+    ordem = request.args.get('ordem', GROWTH_ORDERS[0])
+    rank_method = request.args.get('rank', DEFAULT_RANK_METHOD)
+    if metric not in RANKING_METRICS:
+        return {"mensagem": f"Métrica inválida. Use uma de: {', '.join(RANKING_METRICS)}."}, 400
+    if por not in GROWTH_BASES or ordem not in GROWTH_ORDERS or rank_method not in RANK_METHODS:
+        return {"mensagem": f"Use por={'|'.join(GROWTH_BASES)}, ordem={'|'.join(GROWTH_ORDERS)} "
+                            f"e rank={'|'.join(RANK_METHODS)}."}, 400
+
+    cache_key = RankingCache.make_key(('crescimento', de, ate), limit,
+                                      {'metric': metric, 'por': por, 'ordem': ordem, 'rank': rank_method})
+    cached, generation = ranking_cache.get(cache_key)
+    if cached is not None:
+        return _payload_response(cached)
+
+    if RANKING_ENGINE == 'numpy' and columnar is not None and columnar.refresh() and columnar.has_growth(de, ate):
+        result = ranking_engine.growth(columnar, de, ate, metric, limit, por, ordem, rank_method)
+    else:
+        cur = get_read_db().cursor()
+        cur.execute(build_growth_query(metric, por, ordem), (ate, de, limit))
+        result = [dict(zip(GROWTH_COLUMNS, r)) for r in cur.fetchall()]
+        for item in result:
+            if item['delta_pct'] is not None:
+                item['delta_pct'] = round(item['delta_pct'], 2)
+        keys = [item['delta' if por == 'absoluto' else 'delta_pct'] for item in result]
+        for item, position in zip(result, assign_ranks(keys, rank_method)):
+            item['nu_ranking'] = position
+
+    return _cache_response(cache_key, result, generation)
+
+
 @app.get('/instituicoesensino/ranking/<int:ano>')
+@_conditional('tb_instituicao_year')
 def instituicoes_ranking(ano: int):
-    """Ranking top-10 por matrículas para o ano solicitado (2022-2024).
+    """Ranking top-N por matrículas para o ano solicitado (2022-2024).
+
+    Parâmetros opcionais: `metric` (qualquer coluna qt_mat_*, padrão qt_mat_total),
+    `limit` (padrão 10), `rank` (tratamento de empates em `nu_ranking`: ordinal,
+    competition ou dense; padrão ordinal) e os filtros `co_uf`, `co_municipio`,
+    `co_mesorregiao`, `co_microrregiao`.
+
+    Se o snapshot colunar cobre o ano, o top-N é calculado em NumPy sobre os arrays
+    mapeados em memória (helpers/ranking_engine.py). Senão, cada combinação é atendida
+    no SQLite por um índice composto (ver helpers/ranking_sql.py), sem ordenação em memória.
 
     Prefere ler a tabela agregada `tb_instituicao_year` no SQLite. Se não houver
-    dados para o ano, popula a tabela a partir dos arquivos CSV `microdados_ed_basica_*.csv`.
+    dados para o ano, agenda uma tarefa em segundo plano que popula a tabela a partir
+    dos arquivos CSV `microdados_ed_basica_*.csv` e responde 202 com o id da tarefa
+    (acompanhe em GET /jobs/<job_id>). Requisições simultâneas reaproveitam a mesma tarefa.
     """
+    global _ranking_table_ready
+
     logger.info('Solicitado ranking para ano: %s', ano)
 
     if ano < 2022 or ano > 2024:
         return {"mensagem": "Ano inválido. Informe entre 2022 e 2024."}, 400
 
+    metric = request.args.get('metric', DEFAULT_METRIC)
+    if metric not in RANKING_METRICS:
+        return {"mensagem": f"Métrica inválida. Use uma de: {', '.join(RANKING_METRICS)}."}, 400
+    try:
+        limit = int(request.args.get('limit', RANKING_LIMIT))
+        filters = {geo: int(request.args[geo]) for geo in GEO_FILTERS if request.args.get(geo)}
+    except ValueError:
+        return {"mensagem": "Os parâmetros limit e co_* devem ser inteiros."}, 400
+    if limit < 1 or limit > RANKING_MAX_LIMIT:
+        return {"mensagem": f"limit deve estar entre 1 e {RANKING_MAX_LIMIT}."}, 400
+    rank_method = request.args.get('rank', DEFAULT_RANK_METHOD)
+    if rank_method not in RANK_METHODS:
+        return {"mensagem": f"rank inválido. Use um de: {', '.join(RANK_METHODS)}."}, 400
+
+    cache_key = RankingCache.make_key(ano, limit, dict(filters, metric=metric, rank=rank_method))
+    cached, generation = ranking_cache.get(cache_key)
+    if cached is not None:
+        return _payload_response(cached)
+
+    if RANKING_ENGINE == 'numpy' and columnar is not None and columnar.refresh() and columnar.has_year(ano):
+        result = ranking_engine.rank(columnar, ano, metric, filters, limit, rank_method)
+        return _ranking_response(cache_key, result, generation)
+
     table_name = 'tb_instituicao_year'
-    conn = sqlite3.connect(DATABASE_NAME)
-    cur = conn.cursor()
-
-    cur.execute(f"""
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            co_entidade TEXT,
-            no_entidade TEXT,
-            no_uf TEXT,
-            sg_uf TEXT,
-            co_uf INTEGER,
-            no_municipio TEXT,
-            co_municipio INTEGER,
-            no_mesorregiao TEXT,
-            co_mesorregiao INTEGER,
-            no_microrregiao TEXT,
-            co_microrregiao INTEGER,
-            nu_ano_censo INTEGER,
-            no_regiao TEXT,
-            co_regiao INTEGER,
-            qt_mat_bas INTEGER,
-            qt_mat_prof INTEGER,
-            qt_mat_eja INTEGER,
-            qt_mat_esp INTEGER,
-            qt_mat_fund INTEGER,
-            qt_mat_inf INTEGER,
-            qt_mat_med INTEGER,
-            qt_mat_zr_na INTEGER,
-            qt_mat_zr_rur INTEGER,
-            qt_mat_zr_urb INTEGER,
-            qt_mat_total INTEGER,
-            PRIMARY KEY (co_entidade, nu_ano_censo)
-        )
-    """)
-    conn.commit()
-
-    cur.execute(f"SELECT COUNT(1) FROM {table_name} WHERE nu_ano_censo = ?", (ano,))
-    cnt = cur.fetchone()[0]
-    if cnt == 0:
+
+    if not _ranking_table_ready:
+        conn = get_db()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                co_entidade TEXT NOT NULL,
+                no_entidade TEXT,
+                no_uf TEXT,
+                sg_uf TEXT,
+                co_uf INTEGER,
+                no_municipio TEXT,
+                co_municipio INTEGER,
+                no_mesorregiao TEXT,
+                co_mesorregiao INTEGER,
+                no_microrregiao TEXT,
+                co_microrregiao INTEGER,
+                nu_ano_censo INTEGER NOT NULL,
+                no_regiao TEXT,
+                co_regiao INTEGER,
+                qt_mat_bas INTEGER,
+                qt_mat_prof INTEGER,
+                qt_mat_eja INTEGER,
+                qt_mat_esp INTEGER,
+                qt_mat_fund INTEGER,
+                qt_mat_inf INTEGER,
+                qt_mat_med INTEGER,
+                qt_mat_zr_na INTEGER,
+                qt_mat_zr_rur INTEGER,
+                qt_mat_zr_urb INTEGER,
+                qt_mat_total INTEGER,
+                UNIQUE (co_entidade, nu_ano_censo)
+            )
+        """)
+        create_ranking_indexes(conn)
+        _ranking_table_ready = True
+
+    cur = get_read_db().cursor()
+    cur.execute(f"SELECT 1 FROM {table_name} WHERE nu_ano_censo = ? LIMIT 1", (ano,))
+    if cur.fetchone() is None:
         # Populate from CSVs
         csv_files = glob.glob(CSV_GLOB)
         if not csv_files:
             logger.warning('Nenhum arquivo CSV encontrado para popular tabela %s', table_name)
-            conn.close()
             return jsonify([]), 200
 
-        CANDIDATES = {
-            'co_entidade': ['CO_ENTIDADE', 'CO_ENTIDADE_ESCOLA', 'CO_ENTIDADE_MEC', 'COD_ENTIDADE'],
-            'no_entidade': ['NO_ENTIDADE', 'NO_ESCOLA', 'NOME_ENTIDADE'],
-            'no_uf': ['NO_UF'],
-            'sg_uf': ['SG_UF'],
-            'co_uf': ['CO_UF'],
-            'no_municipio': ['NO_MUNICIPIO'],
-            'co_municipio': ['CO_MUNICIPIO'],
-            'no_mesorregiao': ['NO_MESORREGIAO'],
-            'co_mesorregiao': ['CO_MESORREGIAO'],
-            'no_microrregiao': ['NO_MICRORREGIAO'],
-            'co_microrregiao': ['CO_MICRORREGIAO'],
-            'nu_ano_censo': ['NU_ANO_CENSO', 'NU_ANO'],
-            'no_regiao': ['NO_REGIAO'],
-            'co_regiao': ['CO_REGIAO'],
-            'qt_mat_bas': ['QT_MAT_BAS', 'NU_MATRICULAS_BASICA', 'QT_MATRICULAS_BAS'],
-            'qt_mat_prof': ['QT_MAT_PROF', 'NU_MATRICULAS_PROF'],
-            'qt_mat_eja': ['QT_MAT_EJA', 'NU_MATRICULAS_EJA'],
-            'qt_mat_esp': ['QT_MAT_ESP', 'NU_MATRICULAS_ESP'],
-            'qt_mat_fund': ['QT_MAT_FUND', 'NU_MATRICULAS_FUND'],
-            'qt_mat_inf': ['QT_MAT_INF', 'NU_MATRICULAS_INF'],
-            'qt_mat_med': ['QT_MAT_MED', 'NU_MATRICULAS_MED'],
-            'qt_mat_zr_na': ['QT_MAT_ZR_NA'],
-            'qt_mat_zr_rur': ['QT_MAT_ZR_RUR'],
-            'qt_mat_zr_urb': ['QT_MAT_ZR_URB'],
-            'qt_mat_total': ['QT_MAT_TOTAL', 'NU_MATRICULAS_TOTAL']
-        }
-
-        agg = {}
-        for csv_file in csv_files:
-            logger.info('Populando a partir do CSV: %s', csv_file)
-            with open(csv_file, 'r', encoding='latin1', errors='replace', newline='') as f:
-                reader = csv.reader(f, delimiter=';')
-                try:
-                    header = next(reader)
-                except StopIteration:
-                    continue
-                header = [h.strip() for h in header]
-
-                idx = {}
-                for key, cands in CANDIDATES.items():
-                    found = None
-                    for c in cands:
-                        if c in header:
-                            found = header.index(c)
-                            break
-                    idx[key] = found
-
-                file_year = None
-                for y in (2022, 2023, 2024):
-                    if str(y) in os.path.basename(csv_file):
-                        file_year = y
-                        break
-
-                for row in reader:
-                    year_val = None
-                    if idx['nu_ano_censo'] is not None and idx['nu_ano_censo'] < len(row):
-                        try:
-                            year_val = int(row[idx['nu_ano_censo']].strip())
-                        except Exception:
-                            year_val = None
-                    if year_val is None:
-                        year_val = file_year
-
-                    if year_val != ano:
-                        continue
+        job_key = ('ranking', ano)
+        last_job = ranking_jobs.latest(job_key)
+        if last_job is not None and last_job.status == JOB_DONE and not last_job.result['rows_inserted']:
+            # Os CSVs já foram varridos e não há dados para este ano
+            return jsonify([]), 200
 
-                    def _get(k):
-                        i = idx.get(k)
-                        if i is None or i >= len(row):
-                            return ''
-                        return row[i].strip()
+        job = ranking_jobs.submit(job_key, _populate_ranking_year, ano, csv_files)
+        status_url = url_for('job_status', job_id=job.id)
+        logger.info('Ranking %s em materialização (tarefa %s)', ano, job.id)
+        return jsonify({
+            "mensagem": f"Ranking de {ano} em processamento. Consulte o status da tarefa.",
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": status_url
+        }), 202, {'Location': status_url}
+
+    sql, params = build_ranking_query(metric, filters)
+    cur.execute(sql, (ano, *params, limit))
+    rows = cur.fetchall()
 
-                    co_entidade = _get('co_entidade')
-                    if not co_entidade:
-                        continue
+    result = [dict(zip(RANKING_COLUMNS, r)) for r in rows]
+    for item, position in zip(result, assign_ranks([item[metric] for item in result], rank_method)):
+        item['nu_ranking'] = position
+    return _ranking_response(cache_key, result, generation)
 
-                    ent = agg.get(co_entidade)
-                    if ent is None:
-                        ent = {
-                            'co_entidade': co_entidade,
-                            'no_entidade': _get('no_entidade'),
-                            'no_uf': _get('no_uf'),
-                            'sg_uf': _get('sg_uf'),
-                            'co_uf': _safe_int(_get('co_uf')),
-                            'no_municipio': _get('no_municipio'),
-                            'co_municipio': _safe_int(_get('co_municipio')),
-                            'no_mesorregiao': _get('no_mesorregiao'),
-                            'co_mesorregiao': _safe_int(_get('co_mesorregiao')),
-                            'no_microrregiao': _get('no_microrregiao'),
-                            'co_microrregiao': _safe_int(_get('co_microrregiao')),
-                            'nu_ano_censo': ano,
-                            'no_regiao': _get('no_regiao'),
-                            'co_regiao': _safe_int(_get('co_regiao')),
-                            'qt_mat_bas': 0,
-                            'qt_mat_prof': 0,
-                            'qt_mat_eja': 0,
-                            'qt_mat_esp': 0,
-                            'qt_mat_fund': 0,
-                            'qt_mat_inf': 0,
-                            'qt_mat_med': 0,
-                            'qt_mat_zr_na': 0,
-                            'qt_mat_zr_rur': 0,
-                            'qt_mat_zr_urb': 0,
-                            'qt_mat_total': 0
-                        }
-                        agg[co_entidade] = ent
-
-                    for field in ['qt_mat_bas','qt_mat_prof','qt_mat_eja','qt_mat_esp','qt_mat_fund','qt_mat_inf','qt_mat_med','qt_mat_zr_na','qt_mat_zr_rur','qt_mat_zr_urb']:
-                        val = 0
-                        if idx.get(field) is not None and idx[field] < len(row):
-                            try:
-                                val = int(row[idx[field]].strip()) if row[idx[field]].strip() != '' else 0
-                            except Exception:
-                                val = 0
-                        ent[field] = ent.get(field, 0) + val
-
-                    if idx.get('qt_mat_total') is not None and idx['qt_mat_total'] < len(row):
-                        try:
-                            total = int(row[idx['qt_mat_total']].strip())
-                        except Exception:
-                            total = 0
-                    else:
-                        total = sum(ent.get(f,0) for f in ['qt_mat_bas','qt_mat_prof','qt_mat_eja','qt_mat_esp','qt_mat_fund','qt_mat_inf','qt_mat_med'])
-                    ent['qt_mat_total'] = total
-
-        to_insert = []
-        for ent in agg.values():
-            to_insert.append((
-                ent.get('co_entidade'), ent.get('no_entidade'), ent.get('no_uf'), ent.get('sg_uf'), ent.get('co_uf'),
-                ent.get('no_municipio'), ent.get('co_municipio'), ent.get('no_mesorregiao'), ent.get('co_mesorregiao'),
-                ent.get('no_microrregiao'), ent.get('co_microrregiao'), ent.get('nu_ano_censo'), ent.get('no_regiao'), ent.get('co_regiao'),
-                ent.get('qt_mat_bas'), ent.get('qt_mat_prof'), ent.get('qt_mat_eja'), ent.get('qt_mat_esp'), ent.get('qt_mat_fund'), ent.get('qt_mat_inf'), ent.get('qt_mat_med'),
-                ent.get('qt_mat_zr_na'), ent.get('qt_mat_zr_rur'), ent.get('qt_mat_zr_urb'), ent.get('qt_mat_total')
-            ))
-
-        insert_sql = f"""
-            INSERT OR REPLACE INTO {table_name} (
-                co_entidade, no_entidade, no_uf, sg_uf, co_uf, no_municipio, co_municipio,
-                no_mesorregiao, co_mesorregiao, no_microrregiao, co_microrregiao, nu_ano_censo,
-                no_regiao, co_regiao, qt_mat_bas, qt_mat_prof, qt_mat_eja, qt_mat_esp, qt_mat_fund,
-                qt_mat_inf, qt_mat_med, qt_mat_zr_na, qt_mat_zr_rur, qt_mat_zr_urb, qt_mat_total
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        """
-        cur.executemany(insert_sql, to_insert)
-        conn.commit()
-
-    cur.execute(f"SELECT no_entidade, co_entidade, no_uf, sg_uf, co_uf, no_municipio, co_municipio, no_mesorregiao, co_mesorregiao, no_microrregiao, co_microrregiao, nu_ano_censo, no_regiao, co_regiao, qt_mat_bas, qt_mat_prof, qt_mat_eja, qt_mat_esp, qt_mat_fund, qt_mat_inf, qt_mat_med, qt_mat_zr_na, qt_mat_zr_rur, qt_mat_zr_urb, qt_mat_total FROM {table_name} WHERE nu_ano_censo = ? ORDER BY qt_mat_total DESC LIMIT 10", (ano,))
-    rows = cur.fetchall()
-    conn.close()
-
-    result = []
-    for i, r in enumerate(rows, start=1):
-        (no_entidade, co_entidade, no_uf, sg_uf, co_uf, no_municipio, co_municipio, no_mesorregiao, co_mesorregiao, no_microrregiao, co_microrregiao, nu_ano_censo, no_regiao, co_regiao, qt_mat_bas, qt_mat_prof, qt_mat_eja, qt_mat_esp, qt_mat_fund, qt_mat_inf, qt_mat_med, qt_mat_zr_na, qt_mat_zr_rur, qt_mat_zr_urb, qt_mat_total) = r
-        item = {
-            'no_entidade': no_entidade,
-            'co_entidade': co_entidade,
-            'no_uf': no_uf,
-            'sg_uf': sg_uf,
-            'co_uf': co_uf,
-            'no_municipio': no_municipio,
-            'co_municipio': co_municipio,
-            'no_mesorregiao': no_mesorregiao,
-            'co_mesorregiao': co_mesorregiao,
-            'no_microrregiao': no_microrregiao,
-            'co_microrregiao': co_microrregiao,
-            'nu_ano_censo': nu_ano_censo,
-            'no_regiao': no_regiao,
-            'co_regiao': co_regiao,
-            'qt_mat_bas': qt_mat_bas,
-            'qt_mat_prof': qt_mat_prof,
-            'qt_mat_eja': qt_mat_eja,
-            'qt_mat_esp': qt_mat_esp,
-            'qt_mat_fund': qt_mat_fund,
-            'qt_mat_inf': qt_mat_inf,
-            'qt_mat_med': qt_mat_med,
-            'qt_mat_zr_na': qt_mat_zr_na,
-            'qt_mat_zr_rur': qt_mat_zr_rur,
-            'qt_mat_zr_urb': qt_mat_zr_urb,
-            'qt_mat_total': qt_mat_total,
-            'nu_ranking': i
-        }
-        result.append(item)
 
+def _ranking_response(cache_key, result, generation):
+    """Valida (se houver marshmallow), guarda no cache e responde o ranking."""
     if HAS_MARSHMALLOW and RankingItemSchema is not None:
         schema = RankingItemSchema(many=True)
         try:
@@ -720,6 +1571,58 @@ def instituicoes_ranking(ano: int):
         except Exception as e:
             logger.warning('Validação do schema falhou: %s', e)
 
+    return _cache_response(cache_key, result, generation)
+
+
+def _cache_response(cache_key, result, generation):
+    """Serializa `result` uma vez e guarda no cache o corpo, comprimido sob demanda por codec.
+
+    `generation` é a do `ranking_cache.get` que deu miss: se o cache foi invalidado durante
+    o cálculo, o resultado é servido a esta requisição mas não é guardado.
+    """
+    payload = CompressedPayload(jsonify(result).get_data())
+    ranking_cache.set(cache_key, payload, generation)
+    return _payload_response(payload)
+
+
+def _payload_response(payload):
+    return compressor.attach(Response(payload.body, mimetype='application/json'), payload)
+
+
+@app.get('/agregados/<nivel>/<ano>')
+@_conditional('tb_agregado')
+def agregados(nivel, ano):
+    """Somas de matrículas (qt_mat_*) e número de escolas por nível geográfico e ano.
+
+    `nivel`: uf, mesorregiao, microrregiao ou municipio. `ano`: ano do censo ou
+    `cadastro` (instituições da API, só uf/municipio e qt_mat_bas/prof/esp). Parâmetro
+    opcional `codigo` devolve só aquela unidade. Lê a tabela materializada `tb_agregado`
+    pela chave primária (ver helpers/rollups.py).
+    """
+    if nivel not in rollups.LEVELS:
+        return {"mensagem": f"Nível inválido. Use um de: {', '.join(rollups.LEVELS)}."}, 400
+    if ano == 'cadastro':
+        ano = rollups.CADASTRO
+        if nivel not in rollups.CADASTRO_LEVELS:
+            return {"mensagem": f"O cadastro só é agregado por: {', '.join(rollups.CADASTRO_LEVELS)}."}, 400
+    else:
+        try:
+            ano = int(ano)
+        except ValueError:
+            return {"mensagem": "Ano inválido. Informe o ano do censo ou 'cadastro'."}, 400
+    codigo = request.args.get('codigo')
+    try:
+        codigo = int(codigo) if codigo else None
+    except ValueError:
+        return {"mensagem": "O parâmetro codigo deve ser inteiro."}, 400
+
+    _ensure_rollups()
+    cur = get_read_db().cursor()
+    params = (nivel, ano) if codigo is None else (nivel, ano, codigo)
+    cur.execute(rollups.rollup_query(codigo), params)
+    result = [dict(zip(rollups.ROLLUP_COLUMNS, r)) for r in cur.fetchall()]
+    if codigo is not None and not result:
+        return {"mensagem": "Unidade não encontrada"}, 404
     return jsonify(result), 200
 
 
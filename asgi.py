@@ -0,0 +1,31 @@
+"""
+Entrada ASGI da API (as mesmas rotas de app.py, ver helpers/asgi.py).
+
+Conexões ficam no laço de eventos; os handlers rodam em até ASGI_THREADS threads, o mesmo
+número de conexões do pool do SQLite por padrão. `GET /status/asgi` (app.py) mostra a
+ocupação dessas threads.
+
+    uvicorn asgi:application --workers 4      (ou hypercorn asgi:application)
+    python asgi.py                            (servidor asyncio embutido, desenvolvimento)
+"""
+import logging
+import os
+
+from app import app, DB_POOL_SIZE
+from helpers.asgi import AsgiBridge, serve
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', DB_POOL_SIZE))
+ASGI_HOST = os.environ.get('ASGI_HOST', '127.0.0.1')
+ASGI_PORT = int(os.environ.get('ASGI_PORT', 8000))
+
+application = AsgiBridge(app, max_threads=ASGI_THREADS)
+
+
+if __name__ == '__main__':
+    # Handler próprio: o logger do app já tem o seu, e um basicConfig duplicaria as linhas dele
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    asgi_logger = logging.getLogger('helpers.asgi')
+    asgi_logger.setLevel(logging.INFO)
+    asgi_logger.addHandler(log_handler)
+    serve(application, ASGI_HOST, ASGI_PORT)
@@ -0,0 +1,34 @@
+"""
+Configuração do gunicorn equivalente a server.py:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Workers gthread com o app pré-carregado no mestre; SIGHUP troca os workers e SIGTERM
+para com o mesmo prazo de graceful_timeout. (O gunicorn fecha o socket do worker ao
+drenar, então /readyz não chega a responder 503 nesse modo.)
+"""
+import gc
+import os
+
+from server import BIND, GRACEFUL_TIMEOUT, REQUEST_TIMEOUT, WEB_THREADS, WEB_WORKERS, preload
+from server import post_fork as warm_worker
+
+bind = BIND
+workers = WEB_WORKERS
+worker_class = 'gthread'
+threads = WEB_THREADS or int(os.environ.get('DB_POOL_SIZE', 8))
+preload_app = True
+graceful_timeout = GRACEFUL_TIMEOUT
+timeout = REQUEST_TIMEOUT * 2
+keepalive = 2
+
+
+def when_ready(server):
+    # Com preload_app o app já foi importado; mapeia o snapshot e congela o heap antes do fork
+    preload()
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    warm_worker()
@@ -0,0 +1,341 @@
+"""
+Modo ASGI da API: as mesmas rotas do app Flask servidas por um laço de eventos.
+
+`AsgiBridge` adapta o app WSGI ao protocolo ASGI. O laço de eventos cuida das conexões
+(leitura do corpo da requisição, keep-alive, envio da resposta), e só o handler (rota +
+SQLite) roda num `ThreadPoolExecutor` de tamanho fixo. Assim, milhares de conexões ociosas
+ou clientes lentos não ocupam threads: elas só são usadas enquanto há trabalho de verdade,
+e requisições além do limite esperam na fila do executor. Respostas em streaming (NDJSON)
+são lidas do iterador WSGI um pedaço por vez no executor e enviadas conforme o cliente
+consome.
+
+`serve` é um servidor HTTP/1.1 mínimo em asyncio (keep-alive, corpo por Content-Length,
+resposta com Content-Length ou chunked) para desenvolvimento e para o teste de carga; em
+produção use um servidor ASGI completo (`uvicorn asgi:application`).
+"""
+import asyncio
+import io
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote_to_bytes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THREADS = 8
+MAX_HEADER_BYTES = 65536
+MAX_BODY_BYTES = 64 * 1024 * 1024
+KEEPALIVE_TIMEOUT = 60  # segundos sem nova requisição antes de fechar a conexão
+
+
+class AsgiBridge:
+    """Aplicação ASGI que executa um app WSGI num pool limitado de threads."""
+
+    def __init__(self, wsgi_app, max_threads=DEFAULT_THREADS):
+        self.wsgi_app = wsgi_app
+        self.max_threads = max_threads
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='asgi')
+        self._lock = threading.Lock()
+        self.in_flight = 0  # requisições já recebidas e ainda não respondidas
+        self.running = 0  # handlers ocupando uma thread agora
+        # Apps Flask ficam sabendo da ponte por `extensions` (é o que a rota /status/asgi lê)
+        extensions = getattr(wsgi_app, 'extensions', None)
+        if extensions is not None:
+            extensions['asgi_bridge'] = self
+
+    def stats(self):
+        with self._lock:
+            return {'threads': self.max_threads, 'running': self.running,
+                    'waiting': max(self.in_flight - self.running, 0)}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Tipo de conexão ASGI não suportado: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        # O corpo é lido no laço de eventos: um upload lento não segura uma thread
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        environ = build_environ(scope, b''.join(chunks))
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.in_flight += 1
+        app_iter = None
+        try:
+            status, headers, body, app_iter = await loop.run_in_executor(self.executor, self._start, environ)
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            while app_iter is not None:
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+                body, app_iter = await loop.run_in_executor(self.executor, self._next, app_iter)
+            await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            # Cliente desconectou no meio do streaming: fecha o iterador (devolve a conexão do banco)
+            if app_iter is not None and hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    def _start(self, environ):
+        """Roda o handler até o primeiro pedaço do corpo (na thread do executor)."""
+        with self._lock:
+            self.running += 1
+        try:
+            response = {}
+
+            def start_response(status, headers, exc_info=None):
+                response['status'] = int(status.split(' ', 1)[0])
+                response['headers'] = [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers]
+
+            app_iter = self.wsgi_app(environ, start_response)
+            body, app_iter = self._next(app_iter, running=False)
+            length = dict(response['headers']).get(b'content-length')
+            if app_iter is not None and length is not None and int(length) == len(body):
+                # Corpo completo no primeiro pedaço: fecha aqui e evita outra ida ao executor
+                rest, app_iter = self._next(app_iter, running=False)
+                body += rest
+            return response['status'], response['headers'], body, app_iter
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _next(self, app_iter, running=True):
+        """Próximo pedaço não vazio do corpo; devolve (pedaço, iterador ou None se acabou)."""
+        if running:
+            with self._lock:
+                self.running += 1
+        try:
+            iterator = app_iter if hasattr(app_iter, '__next__') else iter(app_iter)
+            for chunk in iterator:
+                if chunk:
+                    return chunk, iterator
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+            return b'', None
+        except BaseException:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+            raise
+        finally:
+            if running:
+                with self._lock:
+                    self.running -= 1
+
+
+def build_environ(scope, body):
+    """Environ WSGI (PEP 3333) a partir do scope ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+# ===== Servidor HTTP/1.1 mínimo (desenvolvimento e teste de carga) =====
+
+async def _handle_connection(application, reader, writer):
+    server = writer.get_extra_info('sockname')[:2]
+    client = (writer.get_extra_info('peername') or ('', 0))[:2]
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                    ConnectionError):
+                return
+            request_line, *header_lines = head.decode('latin1').split('\r\n')
+            try:
+                method, target, version = request_line.split(' ', 2)
+            except ValueError:
+                await _simple_response(writer, HTTPStatus.BAD_REQUEST)
+                return
+            headers = []
+            for line in header_lines:
+                if line:
+                    name, _, value = line.partition(':')
+                    headers.append((name.strip().lower().encode('latin1'), value.strip().encode('latin1')))
+            fields = {k: v for k, v in headers}
+            if b'transfer-encoding' in fields:
+                await _simple_response(writer, HTTPStatus.LENGTH_REQUIRED)
+                return
+            length = int(fields.get(b'content-length', b'0') or 0)
+            if length > MAX_BODY_BYTES:
+                await _simple_response(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                return
+            body = await reader.readexactly(length) if length else b''
+
+            http_version = version.split('/', 1)[-1]
+            connection = fields.get(b'connection', b'').lower()
+            keep_alive = connection != b'close' and (http_version != '1.0' or connection == b'keep-alive')
+            path, _, query = target.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': http_version,
+                'method': method.upper(), 'scheme': 'http',
+                'path': unquote_to_bytes(path).decode('utf-8', 'replace'), 'raw_path': path.encode('latin1'),
+                'query_string': query.encode('latin1'), 'root_path': '', 'headers': headers,
+                'server': server, 'client': client,
+            }
+            sent_body = False
+
+            async def receive():
+                nonlocal sent_body
+                if not sent_body:
+                    sent_body = True
+                    return {'type': 'http.request', 'body': body, 'more_body': False}
+                return {'type': 'http.disconnect'}
+
+            state = {}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    state['status'] = message['status']
+                    state['headers'] = message.get('headers', [])
+                    state['chunked'] = not any(k == b'content-length' for k, _ in state['headers'])
+                    if state['chunked'] and http_version == '1.0':
+                        state['close'] = True
+                    return
+                if 'started' not in state:
+                    state['started'] = True
+                    lines = [f"HTTP/1.1 {state['status']} {_reason(state['status'])}"]
+                    lines += [f"{k.decode('latin1')}: {v.decode('latin1')}" for k, v in state['headers']]
+                    if state['chunked'] and not state.get('close'):
+                        lines.append('Transfer-Encoding: chunked')
+                    if not keep_alive or state.get('close'):
+                        lines.append('Connection: close')
+                    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin1'))
+                data = message.get('body', b'')
+                if method.upper() == 'HEAD':
+                    data = b''
+                if state['chunked'] and not state.get('close'):
+                    if data:
+                        writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+                    if not message.get('more_body'):
+                        writer.write(b'0\r\n\r\n')
+                elif data:
+                    writer.write(data)
+                await writer.drain()
+
+            try:
+                await application(scope, receive, send)
+            except Exception:
+                if 'started' not in state:
+                    await _simple_response(writer, HTTPStatus.INTERNAL_SERVER_ERROR)
+                return
+            if not keep_alive or state.get('close'):
+                return
+    except asyncio.CancelledError:
+        pass  # servidor parando: a conexão é só fechada
+    finally:
+        writer.close()
+
+
+def _reason(status):
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ''
+
+
+async def _simple_response(writer, status):
+    writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+                 .encode('latin1'))
+    await writer.drain()
+
+
+async def start_server(application, host='127.0.0.1', port=8000):
+    """Abre o socket e devolve o `asyncio.Server` (porta real em `sockets[0]`)."""
+    return await asyncio.start_server(lambda r, w: _handle_connection(application, r, w), host, port,
+                                      limit=MAX_HEADER_BYTES, backlog=2048)
+
+
+def serve(application, host='127.0.0.1', port=8000):
+    """Serve `application` até Ctrl+C."""
+    async def main():
+        server = await start_server(application, host, port)
+        logger.info('Servindo ASGI em http://%s:%d', host, server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def serve_in_thread(application, host='127.0.0.1', port=0):
+    """Sobe o servidor numa thread com laço próprio; devolve (porta, função que o para)."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    holder = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        holder['server'] = loop.run_until_complete(start_server(application, host, port))
+        ready.set()
+        loop.run_forever()
+        # Conexões keep-alive ainda abertas: cancela antes de fechar o laço
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+
+    def stop():
+        def close():
+            holder['server'].close()
+            loop.stop()
+        loop.call_soon_threadsafe(close)
+        thread.join()
+
+    return holder['server'].sockets[0].getsockname()[1], stop
@@ -0,0 +1,313 @@
+"""
+Snapshot colunar de `tb_instituicao_year` em arquivos `.npy`, um diretório por ano.
+
+Layout (`<banco>.columnar/`):
+
+    CURRENT                      nome da versão atual (trocado de forma atômica)
+    v<timestamp>/manifest.json   anos, linhas por ano e tipo de cada coluna
+    v<timestamp>/<ano>/<col>.npy          inteiros (int64, NULL = -1) ou códigos (int32)
+    v<timestamp>/<ano>/<col>.dict.npy     dicionário das colunas de texto (NULL = código -1)
+    v<timestamp>/<ano>/<métrica>.order.npy   linhas em ordem de ranking (métrica desc, id asc)
+    v<timestamp>/<ano>/<geo>.rows.npy        linhas agrupadas pelo código geográfico (id asc no grupo)
+    v<timestamp>/<ano>/<geo>.sorted.npy      códigos geográficos nessa ordem agrupada
+    v<timestamp>/crescimento/<de>-<ate>/rows_de.npy, rows_ate.npy
+                                  linhas de cada ano de uma mesma escola (join por co_entidade)
+    v<timestamp>/crescimento/<de>-<ate>/<métrica>.abs.order.npy, <métrica>.pct.order.npy
+                                  posições do par em ordem de variação absoluta/percentual desc
+
+As ordens pré-calculadas fazem o papel dos índices compostos do SQLite (ver
+helpers/ranking_sql.py): o top-N nacional vira um fatiamento. Com filtro geográfico, um
+`searchsorted` acha o grupo e o top-k sai de um `argpartition` só sobre ele (ver
+helpers/ranking_engine.py); assim a exportação grava uma ordem por coluna geográfica, e
+não uma por métrica x coluna geográfica.
+
+O servidor abre os arquivos com `np.load(mmap_mode='r')`: as páginas ficam no page cache
+do sistema e são compartilhadas por todos os workers, e o código de ranking/agregação lê
+os arrays diretamente, sem cópia. Cada exportação grava uma versão nova e só então
+aponta `CURRENT` para ela, então leitores nunca veem um snapshot pela metade.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from helpers.ranking_sql import TABLE, RANKING_COLUMNS, RANKING_METRICS, GEO_FILTERS
+
+NULL_INT = -1
+NULL_CODE = -1
+STRING_COLUMNS = ('no_entidade', 'co_entidade', 'no_uf', 'sg_uf', 'no_municipio', 'no_mesorregiao',
+                  'no_microrregiao', 'no_regiao')
+# O ano é implícito no diretório
+SNAPSHOT_COLUMNS = tuple(c for c in RANKING_COLUMNS if c != 'nu_ano_censo')
+KEEP_VERSIONS = 2
+# Versões com outro layout ficam indisponíveis (a API cai no SQL) até a próxima exportação
+SNAPSHOT_FORMAT = 2
+
+
+def columnar_dir(db_path):
+    """Diretório do snapshot colunar de um banco (`censoescolar.db` -> `censoescolar.columnar`)."""
+    return os.path.splitext(db_path)[0] + '.columnar'
+
+
+def _encode_strings(values):
+    codes = np.full(len(values), NULL_CODE, dtype=np.int32)
+    present = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+    if present.any():
+        dictionary, inverse = np.unique(np.array(values, dtype=object)[present].astype(str), return_inverse=True)
+        codes[present] = inverse
+    else:
+        dictionary = np.array([], dtype='<U1')
+    return codes, dictionary
+
+
+def _encode_ints(values):
+    return np.fromiter((NULL_INT if v is None else v for v in values), dtype=np.int64, count=len(values))
+
+
+def _save_orders(year_dir, ints, n):
+    """Ordens de ranking nacionais e agrupamento geográfico (desempate pelo id, como no SQL)."""
+    row_ids = np.arange(n)
+    for geo in GEO_FILTERS:
+        rows = np.argsort(ints[geo], kind='stable')
+        np.save(os.path.join(year_dir, f"{geo}.rows.npy"), rows.astype(np.int32))
+        np.save(os.path.join(year_dir, f"{geo}.sorted.npy"), ints[geo][rows])
+    for metric in RANKING_METRICS:
+        np.save(os.path.join(year_dir, f"{metric}.order.npy"),
+                np.lexsort((row_ids, -ints[metric])).astype(np.int32))
+
+
+def growth_deltas(de_values, ate_values):
+    """Variação absoluta e percentual (NaN quando o valor inicial é 0) entre dois anos."""
+    delta = ate_values - de_values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.where(de_values > 0, delta * 100.0 / de_values, np.nan)
+    return delta, pct
+
+
+def _save_growth(pair_dir, entidades_de, entidades_ate, ints_de, ints_ate):
+    """Pré-calcula o ranking de crescimento de um par de anos (desempate pelo id no ano final)."""
+    _, rows_de, rows_ate = np.intersect1d(entidades_de, entidades_ate, assume_unique=True, return_indices=True)
+    by_id = np.argsort(rows_ate, kind='stable')
+    rows_de, rows_ate = rows_de[by_id].astype(np.int32), rows_ate[by_id].astype(np.int32)
+    np.save(os.path.join(pair_dir, 'rows_de.npy'), rows_de)
+    np.save(os.path.join(pair_dir, 'rows_ate.npy'), rows_ate)
+    positions = np.arange(len(rows_ate))
+    for metric in RANKING_METRICS:
+        de_values, ate_values = ints_de[metric][rows_de], ints_ate[metric][rows_ate]
+        # NULL em qualquer um dos anos fica fora do ranking
+        valid = (de_values != NULL_INT) & (ate_values != NULL_INT)
+        delta, pct = growth_deltas(de_values, ate_values)
+        keep = positions[valid]
+        order = keep[np.lexsort((keep, -delta[keep]))]
+        np.save(os.path.join(pair_dir, f"{metric}.abs.order.npy"), order.astype(np.int32))
+        keep = positions[valid & ~np.isnan(pct)]
+        order = keep[np.lexsort((keep, -pct[keep]))]
+        np.save(os.path.join(pair_dir, f"{metric}.pct.order.npy"), order.astype(np.int32))
+
+
+def export_snapshot(db_path, root=None, keep=KEEP_VERSIONS):
+    """Exporta `tb_instituicao_year` para uma nova versão do snapshot e a torna a atual.
+
+    Devolve o manifesto gravado.
+    """
+    root = root or columnar_dir(db_path)
+    version = f"v{time.time_ns()}"
+    target = os.path.join(root, version)
+    os.makedirs(target)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        years = [r[0] for r in conn.execute(f"SELECT DISTINCT nu_ano_censo FROM {TABLE} ORDER BY 1")]
+        manifest = {'version': version, 'format': SNAPSHOT_FORMAT, 'created_at': time.time(),
+                    'years': {}, 'growth_pairs': [],
+                    'columns': {c: ('string' if c in STRING_COLUMNS else 'int') for c in SNAPSHOT_COLUMNS}}
+        entidades, year_ints = {}, {}
+        for ano in years:
+            rows = conn.execute(
+                f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM {TABLE} WHERE nu_ano_censo = ? ORDER BY id", (ano,)
+            ).fetchall()
+            year_dir = os.path.join(target, str(ano))
+            os.makedirs(year_dir)
+            ints = {}
+            for i, col in enumerate(SNAPSHOT_COLUMNS):
+                values = [r[i] for r in rows]
+                if col in STRING_COLUMNS:
+                    codes, dictionary = _encode_strings(values)
+                    np.save(os.path.join(year_dir, f"{col}.npy"), codes)
+                    np.save(os.path.join(year_dir, f"{col}.dict.npy"), dictionary)
+                    if col == 'co_entidade':
+                        entidades[ano] = np.array(values, dtype=object).astype(str)
+                else:
+                    ints[col] = _encode_ints(values)
+                    np.save(os.path.join(year_dir, f"{col}.npy"), ints[col])
+            _save_orders(year_dir, ints, len(rows))
+            year_ints[ano] = ints
+            manifest['years'][str(ano)] = len(rows)
+
+        for i, de in enumerate(years):
+            for ate in years[i + 1:]:
+                pair = f"{de}-{ate}"
+                pair_dir = os.path.join(target, 'crescimento', pair)
+                os.makedirs(pair_dir)
+                _save_growth(pair_dir, entidades[de], entidades[ate], year_ints[de], year_ints[ate])
+                manifest['growth_pairs'].append(pair)
+    except BaseException:
+        conn.close()
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+    conn.close()
+
+    with open(os.path.join(target, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    tmp = os.path.join(root, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, 'CURRENT'))
+    _prune_versions(root, keep)
+    return manifest
+
+
+def _prune_versions(root, keep):
+    """Remove versões antigas (no Windows, as ainda mapeadas por algum worker ficam para depois)."""
+    versions = sorted(d for d in os.listdir(root) if d.startswith('v') and os.path.isdir(os.path.join(root, d)))
+    for old in versions[:-keep]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+
+class ColumnarSnapshot:
+    """Leitura do snapshot colunar via mmap; recarrega sozinho quando `CURRENT` muda."""
+
+    def __init__(self, root):
+        self.root = root
+        self.version = None
+        self.manifest = None
+        self._arrays = {}
+        self._current_stamp = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Confere `CURRENT` (um stat) e troca de versão se outra exportação terminou."""
+        path = os.path.join(self.root, 'CURRENT')
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return self.available
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp == self._current_stamp:
+            return self.available
+        with self._lock:
+            if stamp == self._current_stamp:
+                return self.available
+            with open(path, 'r', encoding='utf-8') as f:
+                version = f.read().strip()
+            with open(os.path.join(self.root, version, 'manifest.json'), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.version = version
+            self.manifest = manifest
+            self._arrays = {}
+            self._current_stamp = stamp
+        return True
+
+    @property
+    def available(self):
+        return self.manifest is not None and self.manifest.get('format') == SNAPSHOT_FORMAT
+
+    def years(self):
+        return sorted(int(a) for a in self.manifest['years']) if self.available else []
+
+    def has_year(self, ano):
+        return self.available and str(ano) in self.manifest['years']
+
+    def has_growth(self, de, ate):
+        return self.available and f"{de}-{ate}" in self.manifest.get('growth_pairs', ())
+
+    def growth(self, de, ate, name):
+        """Arrays do ranking de crescimento de/ate (`rows_de`, `rows_ate`, `<métrica>.abs.order`...)."""
+        return self._load(os.path.join('crescimento', f"{de}-{ate}"), f"{name}.npy")
+
+    def preload(self):
+        """Mapeia de uma vez todos os arrays da versão atual; devolve quantos.
+
+        Chamado pelo servidor prefork antes do fork, para que os workers herdem os
+        mapeamentos em vez de abrir cada arquivo na primeira requisição.
+        """
+        if not self.refresh():
+            return 0
+        base = os.path.join(self.root, self.version)
+        count = 0
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                if filename.endswith('.npy'):
+                    self._load(os.path.relpath(dirpath, base), filename)
+                    count += 1
+        return count
+
+    def _load(self, ano, filename):
+        key = (self.version, str(ano), filename)
+        arr = self._arrays.get(key)
+        if arr is None:
+            path = os.path.join(self.root, self.version, str(ano), filename)
+            # ndarray (e não np.memmap) sobre o mesmo mapeamento: sem cópia e sem o custo da subclasse
+            arr = np.asarray(np.load(path, mmap_mode='r', allow_pickle=False))
+            self._arrays[key] = arr
+        return arr
+
+    def column(self, ano, name):
+        """Array (mmap, somente leitura) da coluna; para texto, os códigos do dicionário."""
+        return self._load(ano, f"{name}.npy")
+
+    def dictionary(self, ano, name):
+        return self._load(ano, f"{name}.dict.npy")
+
+    def order(self, ano, metric):
+        """Índices das linhas em ordem de ranking por `metric` (desc; empates pelo id)."""
+        return self._load(ano, f"{metric}.order.npy")
+
+    def geo_rows(self, ano, geo):
+        """Índices das linhas agrupados pelo código geográfico `geo` (id crescente em cada grupo)."""
+        return self._load(ano, f"{geo}.rows.npy")
+
+    def geo_range(self, ano, geo, code):
+        """Fatia [lo, hi) de `geo_rows(ano, geo)` com as linhas do código `code`."""
+        keys = self._load(ano, f"{geo}.sorted.npy")
+        return int(np.searchsorted(keys, code, 'left')), int(np.searchsorted(keys, code, 'right'))
+
+    def decode(self, ano, name, idx):
+        """Valores da coluna de texto `name` nas linhas `idx`, como lista de str/None."""
+        codes = self.column(ano, name)[idx]
+        dictionary = self.dictionary(ano, name)
+        if not len(dictionary):
+            return [None] * len(codes)
+        values = dictionary[codes].tolist()
+        if codes.min(initial=0) == NULL_CODE:
+            values = [None if c == NULL_CODE else v for c, v in zip(codes.tolist(), values)]
+        return values
+
+    def rows(self, ano, idx, columns=RANKING_COLUMNS):
+        """Linhas `idx` do ano como dicts (mesmas chaves do ranking em SQL)."""
+        idx = np.asarray(idx, dtype=np.intp)
+        values = []
+        for name in columns:
+            if name == 'nu_ano_censo':
+                values.append([ano] * len(idx))
+            elif name in STRING_COLUMNS:
+                values.append(self.decode(ano, name, idx))
+            else:
+                col = self.column(ano, name)[idx].tolist()
+                values.append([None if v == NULL_INT else v for v in col] if NULL_INT in col else col)
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+    def stats(self):
+        return {
+            'available': self.available,
+            'root': self.root,
+            'version': self.version,
+            'years': self.manifest['years'] if self.available else {},
+            'growth_pairs': self.manifest.get('growth_pairs', []) if self.available else [],
+            'mapped_arrays': len(self._arrays),
+        }
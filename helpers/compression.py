@@ -0,0 +1,130 @@
+"""
+Compressão das respostas negociada por `Accept-Encoding` (gzip; zstd e brotli se os pacotes
+`zstandard` / `brotli` estiverem instalados).
+
+Um `after_request` comprime as respostas 200 de tipo textual (JSON, texto) a partir de
+`min_size` bytes, no codec de maior `q` aceito pelo cliente (em empate, zstd > br > gzip), e
+acrescenta `Vary: Accept-Encoding`. Como cada codificação é uma representação diferente, o
+ETag forte ganha o sufixo `-<codec>`; `etag_variants` dá ao GET condicional a lista de ETags
+que um cliente pode ter guardado. Respostas em streaming (NDJSON) e arquivos
+(`send_file`) não são tocados.
+
+Corpos reaproveitados entre requisições (os rankings em cache) são guardados como
+`CompressedPayload`: o JSON é serializado uma vez e cada codificação é comprimida na
+primeira vez em que é pedida e guardada junto.
+"""
+import gzip
+
+from flask import request
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024  # bytes; abaixo disso o cabeçalho gzip não compensa
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript')
+
+
+def available_encodings():
+    """Codecs disponíveis, na ordem de preferência do servidor."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+def compress(data, encoding, level):
+    if encoding == 'gzip':
+        # mtime=0: mesma entrada, mesmos bytes (o ETag forte continua válido entre processos)
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    raise ValueError(f"Codificação não suportada: {encoding}")
+
+
+class CompressedPayload:
+    """Corpo JSON serializado uma vez, com as versões comprimidas guardadas sob demanda."""
+
+    __slots__ = ('body', '_encoded')
+
+    def __init__(self, body):
+        self.body = body
+        self._encoded = {}
+
+    def encoded(self, encoding, level):
+        data = self._encoded.get(encoding)
+        if data is None:
+            # Corrida entre threads só comprime duas vezes o mesmo corpo
+            data = self._encoded[encoding] = compress(self.body, encoding, level)
+        return data
+
+
+class Compressor:
+    """Configuração da compressão; `enabled=False` não instala nada."""
+
+    def __init__(self, enabled=True, min_size=DEFAULT_MIN_SIZE, levels=None, encodings=None):
+        self.enabled = enabled
+        self.min_size = min_size
+        self.levels = dict(DEFAULT_LEVELS, **(levels or {}))
+        self.encodings = [e for e in (encodings or available_encodings()) if e in available_encodings()]
+
+    def negotiate(self, accept_encodings):
+        """Codec escolhido para o `Accept-Encoding` do cliente, ou None (identity)."""
+        if not self.enabled or not accept_encodings:
+            return None
+        return accept_encodings.best_match(self.encodings)
+
+    def etag_variants(self, etag):
+        """ETags possíveis de uma mesma versão: sem compressão e um por codec."""
+        return [etag] + [f"{etag}-{encoding}" for encoding in self.encodings] if self.enabled else [etag]
+
+    def attach(self, response, payload):
+        """Associa a `response` o payload pré-comprimido do qual ela foi criada."""
+        response.compressed_payload = payload
+        return response
+
+    def compress_response(self, response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+        mimetype = response.mimetype or ''
+        if mimetype not in COMPRESSIBLE_TYPES and not mimetype.startswith('text/'):
+            return response
+        payload = getattr(response, 'compressed_payload', None)
+        body = payload.body if payload is not None else response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+        level = self.levels[encoding]
+        data = payload.encoded(encoding, level) if payload is not None else compress(body, encoding, level)
+        if len(data) >= len(body):
+            return response
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
+
+
+def init_app(app, compressor):
+    """Instala o hook de compressão (só se estiver ligada)."""
+    app.extensions['compression'] = compressor
+    if compressor.enabled:
+        app.after_request(compressor.compress_response)
@@ -0,0 +1,138 @@
+"""
+Versão dos dados por tabela (`tb_data_version`), base do GET condicional (ETag / 304).
+
+Toda escrita incrementa a versão das tabelas que alterou na mesma transação (`bump`): as
+rotas de escrita da API, a carga do ranking sob demanda e os scripts de importação. Como o
+contador mora no próprio banco, vale para todos os processos e sobrevive a reinícios; a
+linha `_epoch` (aleatória, gravada na criação do banco) diferencia um banco recriado do
+anterior, cujas versões recomeçariam do zero.
+
+Na leitura, cada processo guarda as versões em memória e só relê a tabela quando o
+`PRAGMA data_version` da sua conexão muda (isto é, quando outra conexão fez commit). Assim
+a checagem de `If-None-Match` custa um PRAGMA, sem consultar as tabelas de dados.
+"""
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+
+TABLE = 'tb_data_version'
+EPOCH = '_epoch'
+
+DDL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+        tabela TEXT PRIMARY KEY,
+        versao INTEGER NOT NULL DEFAULT 0,
+        atualizado_em INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+_BUMP_SQL = f"""
+    INSERT INTO {TABLE} (tabela, versao, atualizado_em) VALUES (?, 1, ?)
+    ON CONFLICT(tabela) DO UPDATE SET versao = versao + 1, atualizado_em = excluded.atualizado_em
+"""
+
+
+def ensure(cursor):
+    """Cria tb_data_version e a época do banco, se ainda não existirem."""
+    cursor.execute(DDL)
+    cursor.execute(f"INSERT OR IGNORE INTO {TABLE} (tabela, versao) VALUES (?, ?)",
+                   (EPOCH, random.getrandbits(62)))
+
+
+def bump(cursor, *tabelas):
+    """Incrementa a versão de `tabelas`, na transação de quem chama (o commit é dele).
+
+    Num banco anterior a tb_data_version a tabela é criada na primeira escrita.
+    """
+    agora = int(time.time())
+    params = [(tabela, agora) for tabela in tabelas]
+    try:
+        cursor.executemany(_BUMP_SQL, params)
+    except sqlite3.OperationalError as e:
+        if 'no such table' not in str(e):
+            raise
+        # Só o comando falhou: a transação de quem chama continua aberta
+        ensure(cursor)
+        cursor.executemany(_BUMP_SQL, params)
+
+
+def bump_db(db_path, *tabelas):
+    """`bump` numa conexão própria, para scripts que não têm uma transação aberta."""
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure(conn)
+        bump(conn.cursor(), *tabelas)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class DataVersions:
+    """Leitura das versões com cache por processo, revalidado pelo `PRAGMA data_version`."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._data_version = None
+        self._rows = {}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        ensure(conn)
+        conn.commit()
+        return conn
+
+    def _refresh(self):
+        if self._conn is None:
+            self._conn = self._connect()
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._rows = {t: (v, ts) for t, v, ts in
+                          self._conn.execute(f"SELECT tabela, versao, atualizado_em FROM {TABLE}")}
+            self._data_version = data_version
+
+    def rows(self):
+        """`{tabela: (versao, atualizado_em)}` de todas as tabelas, ou None se o banco não puder ser lido."""
+        with self._lock:
+            try:
+                self._refresh()
+            except sqlite3.Error:
+                return None
+            return dict(self._rows)
+
+    def get(self, tabelas):
+        """`(versões, last_modified)` de `tabelas`, ou None se o banco não puder ser lido.
+
+        `versões` inclui a época do banco; `last_modified` é o maior `atualizado_em` (Unix,
+        em segundos) entre as tabelas, ou None se nenhuma foi escrita ainda.
+        """
+        with self._lock:
+            try:
+                self._refresh()
+            except sqlite3.Error:
+                return None
+            rows = self._rows
+        return versions_for(rows, tabelas)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._data_version = None
+
+
+def versions_for(rows, tabelas):
+    """`(versões, last_modified)` de `tabelas` a partir das linhas de tb_data_version (ver DataVersions.get)."""
+    versions = (rows.get(EPOCH, (0, 0))[0],) + tuple(rows.get(t, (0, 0))[0] for t in tabelas)
+    last_modified = max((rows.get(t, (0, 0))[1] for t in tabelas), default=0)
+    return versions, last_modified or None
+
+
+def make_etag(versions, *parts):
+    """ETag forte: muda sempre que a versão de alguma tabela ou a representação (`parts`) muda."""
+    key = '|'.join(map(str, versions + parts))
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest()
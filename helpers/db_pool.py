@@ -0,0 +1,135 @@
+"""
+Pool de conexões SQLite reaproveitadas entre requisições.
+
+Cada processo (worker) mantém uma pilha LIFO de conexões já configuradas com as
+PRAGMAs desejadas (WAL, busy_timeout, mmap_size, cache_size...). A conexão é
+emprestada no início da requisição e devolvida no teardown do app context, o que
+preserva o cache de páginas e de statements preparados entre requisições.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+
+from flask import current_app, g
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_CACHED_STATEMENTS = 256
+
+# PRAGMAs aplicadas uma única vez, quando a conexão é criada.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 268435456,
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+}
+
+
+class ConnectionPool:
+    """Pool LIFO de conexões SQLite com contadores de hit/miss."""
+
+    def __init__(self, database, pragmas=None, max_size=DEFAULT_POOL_SIZE,
+                 cached_statements=DEFAULT_CACHED_STATEMENTS, factory=None, uri=False):
+        self.database = database
+        self.uri = uri  # `database` é uma URI file: (ex.: a réplica em memória de helpers/replica.py)
+        self.factory = factory  # subclasse de sqlite3.Connection (ex.: medição de SQL em helpers/metrics.py)
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.max_size = max_size
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self.closed = False
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def _connect(self):
+        # check_same_thread=False: a conexão é usada por uma requisição por vez,
+        # mas pode ser devolvida ao pool e reutilizada por outra thread.
+        conn = sqlite3.connect(self.database, check_same_thread=False,
+                               cached_statements=self.cached_statements, uri=self.uri,
+                               factory=self.factory or sqlite3.Connection)
+        for name, value in self.pragmas.items():
+            try:
+                conn.execute(f"PRAGMA {name} = {value}")
+            except sqlite3.Error as e:
+                logger.warning('PRAGMA %s = %s falhou: %s', name, value, e)
+        return conn
+
+    def acquire(self):
+        """Empresta uma conexão do pool, criando uma nova se não houver ociosa."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.misses += 1
+            return self._connect()
+        with self._lock:
+            self.hits += 1
+        return conn
+
+    def release(self, conn):
+        """Devolve a conexão ao pool, descartando transações pendentes."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning('Conexão descartada após erro no rollback: %s', e)
+            conn.close()
+            return
+        if self.closed:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            with self._lock:
+                self.discarded += 1
+            conn.close()
+
+    def close_all(self):
+        """Fecha todas as conexões ociosas."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+    def close(self):
+        """Fecha as conexões ociosas e as emprestadas quando forem devolvidas."""
+        self.closed = True
+        self.close_all()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'database': self.database,
+                'max_size': self.max_size,
+                'idle': self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'discarded': self.discarded,
+            }
+
+
+def init_app(app, pool):
+    """Registra o pool no app Flask e devolve as conexões no teardown do app context."""
+    app.extensions['db_pool'] = pool
+
+    @app.teardown_appcontext
+    def _release_db(exc):
+        conn = g.pop('db_conn', None)
+        if conn is not None:
+            pool.release(conn)
+
+
+def get_db():
+    """Conexão do pool vinculada ao app context atual."""
+    if 'db_conn' not in g:
+        g.db_conn = current_app.extensions['db_pool'].acquire()
+    return g.db_conn
@@ -0,0 +1,262 @@
+"""
+Executor de tarefas em segundo plano com de-duplicação por chave.
+
+Usado para trabalhos longos disparados por requisições HTTP (ex.: popular
+`tb_instituicao_year` a partir dos CSVs). A requisição recebe o id da tarefa e
+acompanha o progresso por uma rota de status, em vez de segurar a thread do worker.
+
+O estado das tarefas mora no banco (`tb_job`), não na memória do processo: com vários
+workers (prefork/gunicorn), `/jobs/<id>` responde em qualquer um deles, e o índice único
+parcial sobre as tarefas ativas garante uma só por chave entre todos os processos. A
+tarefa roda no worker que a criou, que renova `heartbeat_at` (lease) enquanto ela está
+ativa. Se o worker morre no meio, o lease expira e a linha órfã é marcada como falha
+quando alguém pede a mesma chave de novo. O lease não depende de pid: funciona com pids
+reutilizados e com workers em máquinas diferentes compartilhando o banco.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_MAX_FINISHED = 100
+DEFAULT_LEASE_SECONDS = 30  # sem heartbeat por mais que isso, a tarefa ativa é órfã
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+TABLE = 'tb_job'
+
+DDL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+        id TEXT PRIMARY KEY,
+        chave TEXT NOT NULL,
+        status TEXT NOT NULL,
+        progresso TEXT NOT NULL DEFAULT '{{}}',
+        resultado TEXT,
+        erro TEXT,
+        pid INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        heartbeat_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tb_job_ativa ON {TABLE}(chave) WHERE status IN ('{PENDING}', '{RUNNING}');
+"""
+
+_COLUMNS = 'id, chave, status, progresso, resultado, erro, pid, created_at, started_at, finished_at, heartbeat_at'
+
+
+class Job:
+    """Estado e progresso de uma tarefa (uma linha de tb_job)."""
+
+    def __init__(self, key, runner=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = PENDING
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.pid = os.getpid()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.heartbeat_at = self.created_at
+        self._runner = runner
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls(None)
+        (job.id, chave, job.status, progresso, resultado, job.error, job.pid,
+         job.created_at, job.started_at, job.finished_at, job.heartbeat_at) = row
+        job.key = tuple(json.loads(chave))
+        job.progress = json.loads(progresso)
+        job.result = json.loads(resultado) if resultado is not None else None
+        return job
+
+    @property
+    def active(self):
+        return self.status in (PENDING, RUNNING)
+
+    def update(self, **progress):
+        """Atualiza os contadores de progresso (chamado pela própria tarefa) e os grava no banco."""
+        with self._lock:
+            self.progress.update(progress)
+            snapshot = json.dumps(self.progress)
+        if self._runner is not None:
+            self._runner._write(self.id, progresso=snapshot, heartbeat_at=time.time())
+
+    def to_dict(self):
+        with self._lock:
+            progress = dict(self.progress)
+        end = self.finished_at or time.time()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+        rows = progress.get('rows_scanned')
+        if rows is not None:
+            progress['rows_per_s'] = round(rows / elapsed, 1) if elapsed else 0.0
+        return {
+            'job_id': self.id,
+            'key': list(self.key) if isinstance(self.key, tuple) else self.key,
+            'status': self.status,
+            'progress': progress,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'heartbeat_at': self.heartbeat_at,
+            'elapsed_s': round(elapsed, 3),
+        }
+
+
+class JobRunner:
+    """Executa tarefas em um pool de threads; uma tarefa ativa por chave em todos os processos."""
+
+    def __init__(self, db_path, max_workers=DEFAULT_MAX_WORKERS, max_finished=DEFAULT_MAX_FINISHED,
+                 lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.db_path = db_path
+        self._max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._ready = False
+        self._lock = threading.Lock()
+        self._owned = set()  # tarefas ativas deste processo, cujo lease o heartbeat renova
+        self.max_finished = max_finished
+        self.lease_seconds = lease_seconds
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        if not self._ready:
+            conn.executescript(DDL)
+            if 'heartbeat_at' not in {r[1] for r in conn.execute(f"PRAGMA table_info({TABLE})")}:
+                conn.execute(f"ALTER TABLE {TABLE} ADD COLUMN heartbeat_at REAL")
+            self._ready = True
+        return conn
+
+    def _pool(self):
+        # Threads não atravessam o fork: cada processo cria o seu executor e o seu heartbeat
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='job')
+                self._pid = os.getpid()
+                self._owned = set()
+                threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True).start()
+            return self._executor
+
+    def _heartbeat(self):
+        """Renova o lease das tarefas deste processo a cada terço do prazo."""
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.lease_seconds / 3)
+            with self._lock:
+                owned = list(self._owned)
+            if not owned:
+                continue
+            try:
+                conn = self._connect()
+                try:
+                    conn.execute(f"UPDATE {TABLE} SET heartbeat_at = ? WHERE id IN ({', '.join('?' * len(owned))})",
+                                 (time.time(), *owned))
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                logger.warning('Falha ao renovar o lease das tarefas %s', owned, exc_info=True)
+
+    def _write(self, job_id, **fields):
+        conn = self._connect()
+        try:
+            conn.execute(f"UPDATE {TABLE} SET {', '.join(f'{c} = ?' for c in fields)} WHERE id = ?",
+                         (*fields.values(), job_id))
+        finally:
+            conn.close()
+
+    def _fetch(self, where, params=(), limit=None):
+        conn = self._connect()
+        try:
+            sql = f"SELECT {_COLUMNS} FROM {TABLE} WHERE {where} ORDER BY created_at DESC"
+            if limit is not None:
+                sql += f" LIMIT {int(limit)}"
+            return [Job.from_row(r) for r in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Agenda `fn(job, *args, **kwargs)`; se já houver tarefa ativa para `key` (em qualquer
+        processo), devolve-a."""
+        chave = json.dumps(list(key) if isinstance(key, tuple) else [key])
+        job = Job(key, runner=self)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(f"SELECT {_COLUMNS} FROM {TABLE} WHERE chave = ? AND status IN (?, ?)",
+                               (chave, PENDING, RUNNING)).fetchone()
+            if row is not None:
+                current = Job.from_row(row)
+                silence = time.time() - (current.heartbeat_at or current.created_at)
+                if silence <= self.lease_seconds:
+                    conn.execute("COMMIT")
+                    return current
+                conn.execute(f"UPDATE {TABLE} SET status = ?, erro = ?, finished_at = ? WHERE id = ?",
+                             (FAILED, f'lease expirado: sem heartbeat há {silence:.0f} s (pid {current.pid})',
+                              time.time(), current.id))
+            conn.execute(f"INSERT INTO {TABLE} (id, chave, status, pid, created_at, heartbeat_at) "
+                         f"VALUES (?, ?, ?, ?, ?, ?)",
+                         (job.id, chave, job.status, job.pid, job.created_at, job.heartbeat_at))
+            self._prune(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        pool = self._pool()
+        with self._lock:
+            self._owned.add(job.id)
+        pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._write(job.id, status=job.status, started_at=job.started_at, heartbeat_at=job.started_at)
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = DONE
+        except Exception as e:
+            logger.exception('Tarefa %s (%s) falhou', job.id, job.key)
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            self._write(job.id, status=job.status, resultado=json.dumps(job.result), erro=job.error,
+                        progresso=json.dumps(job.progress), finished_at=job.finished_at)
+            with self._lock:
+                self._owned.discard(job.id)
+
+    def _prune(self, conn):
+        conn.execute(f"DELETE FROM {TABLE} WHERE status IN (?, ?) AND id NOT IN "
+                     f"(SELECT id FROM {TABLE} WHERE status IN (?, ?) ORDER BY finished_at DESC LIMIT ?)",
+                     (DONE, FAILED, DONE, FAILED, self.max_finished))
+
+    def get(self, job_id):
+        found = self._fetch("id = ?", (job_id,))
+        return found[0] if found else None
+
+    def latest(self, key):
+        """Tarefa mais recente para a chave (ativa ou finalizada), se ainda registrada."""
+        chave = json.dumps(list(key) if isinstance(key, tuple) else [key])
+        found = self._fetch("chave = ?", (chave,), limit=1)
+        return found[0] if found else None
+
+    def list(self):
+        return self._fetch("1", limit=self.max_finished)
@@ -0,0 +1,247 @@
+"""
+Espelho JSON com journal append-only (JSON lines) e compactação periódica.
+
+Em vez de reescrever `data/*.json` inteiro a cada escrita, cada operação vira uma
+linha anexada a `<arquivo>.journal` (O(1)). O estado atual = snapshot (`<arquivo>`,
+no formato de lista JSON de sempre) + replay do journal. A cada `compact_every`
+operações o estado é gravado de volta no snapshot e o journal é zerado.
+
+A primeira linha do journal é um cabeçalho com a geração (`{"op": "generation", ...}`),
+incrementada a cada compactação. É ela que avisa os outros processos de que o snapshot
+mudou e o journal recomeçou; inode e tamanho do arquivo não bastam (o inode pode ser
+reutilizado e o journal novo pode crescer além do offset antigo antes da próxima leitura).
+Journal sem cabeçalho (anterior a este formato, ou ainda não compactado) é a geração 0.
+
+Escritas são serializadas por um lock de arquivo (`<arquivo>.lock`), válido entre
+processos; antes de cada operação o processo aplica as linhas que outros processos
+anexaram desde a última leitura, então nenhuma atualização é perdida.
+"""
+import io
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_COMPACT_EVERY = 1000
+
+
+class _FileLock:
+    """Lock exclusivo entre processos (flock no POSIX, msvcrt.locking no Windows)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+
+    def acquire(self):
+        self._fh = open(self.path, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+        else:
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_LOCK, 1)
+
+    def release(self):
+        if fcntl is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        else:
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        self._fh.close()
+        self._fh = None
+
+
+class JsonJournal:
+    """Coleção de dicts indexada por `key_field`, persistida em snapshot + journal."""
+
+    def __init__(self, snapshot_path, key_field, unique_fields=(), compact_every=DEFAULT_COMPACT_EVERY,
+                 fsync=False):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + '.journal'
+        self.key_field = key_field
+        self.unique_fields = tuple(unique_fields)
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._file_lock = _FileLock(snapshot_path + '.lock')
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._items = {}
+        self._unique = {f: {} for f in self.unique_fields}
+        self._max_id = 0
+        self._generation = None
+        self._offset = 0
+        self._pending = 0
+        dirname = os.path.dirname(snapshot_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+    # ----- sincronização com o disco -----
+
+    @staticmethod
+    def _read_header(f):
+        """(geração, tamanho do cabeçalho) do journal aberto em `f`."""
+        line = f.readline()
+        if line.endswith(b'\n'):
+            entry = json.loads(line)
+            if entry.get('op') == 'generation':
+                return entry['generation'], len(line)
+        return 0, 0
+
+    def _reload(self):
+        self._items = {}
+        self._unique = {f: {} for f in self.unique_fields}
+        self._max_id = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                for item in json.load(f):
+                    self._apply_put(item)
+        self._generation = None
+        self._offset = 0
+        self._pending = 0
+
+    def _sync(self):
+        """Aplica ao estado em memória o que outros processos anexaram ao journal."""
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            f = io.BytesIO()
+        with f:
+            generation, header_size = self._read_header(f)
+            if generation != self._generation:
+                # Primeira leitura, ou o journal foi compactado por outro processo
+                self._reload()
+                self._generation = generation
+                self._offset = header_size
+            f.seek(self._offset)
+            data = f.read()
+        if not data:
+            return
+        # Ignora uma última linha incompleta (escrita interrompida)
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+                self._pending += 1
+        self._offset += end
+
+    @contextmanager
+    def lock(self):
+        """Seção crítica entre threads e processos, com o estado já sincronizado."""
+        with self._lock:
+            if self._depth == 0:
+                self._file_lock.acquire()
+            self._depth += 1
+            try:
+                if self._depth == 1:
+                    self._sync()
+                yield self
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._file_lock.release()
+
+    # ----- estado em memória -----
+
+    def _apply(self, entry):
+        if entry['op'] == 'put':
+            self._apply_put(entry['item'])
+        elif entry['op'] == 'delete':
+            self._apply_delete(str(entry['key']))
+
+    def _apply_put(self, item):
+        key = str(item[self.key_field])
+        old = self._items.get(key)
+        if old is not None:
+            for f in self.unique_fields:
+                self._unique[f].pop(old.get(f), None)
+        self._items[key] = item
+        for f in self.unique_fields:
+            if item.get(f) is not None:
+                self._unique[f][item[f]] = key
+        if self._max_id is not None and key.isdigit():
+            self._max_id = max(self._max_id, int(key))
+
+    def _apply_delete(self, key):
+        old = self._items.pop(key, None)
+        if old is not None:
+            for f in self.unique_fields:
+                self._unique[f].pop(old.get(f), None)
+            if key.isdigit() and int(key) == self._max_id:
+                # Removeu o maior id: recalculado no próximo next_id
+                self._max_id = None
+
+    def _append(self, *entries):
+        lines = ''.join(json.dumps(e, ensure_ascii=False, separators=(',', ':')) + '\n' for e in entries)
+        with open(self.journal_path, 'ab') as f:
+            f.write(lines.encode('utf-8'))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            self._offset = f.tell()
+        self._pending += len(entries)
+        if self._pending >= self.compact_every:
+            self.compact()
+
+    # ----- API -----
+
+    def get(self, key):
+        with self.lock():
+            item = self._items.get(str(key))
+            return dict(item) if item is not None else None
+
+    def find(self, field, value):
+        """Chave do item com `field == value` (apenas campos em `unique_fields`)."""
+        with self.lock():
+            return self._unique[field].get(value)
+
+    def next_id(self):
+        """Próximo id inteiro (maior id + 1), como no arquivo JSON original."""
+        with self.lock():
+            if self._max_id is None:
+                self._max_id = max([int(k) for k in self._items if k.isdigit()] + [0])
+            return self._max_id + 1
+
+    def put(self, item):
+        with self.lock():
+            self._apply_put(item)
+            self._append({'op': 'put', 'item': item})
+
+    def put_many(self, items):
+        """Como `put`, mas anexa todos os itens ao journal em uma única escrita."""
+        with self.lock():
+            for item in items:
+                self._apply_put(item)
+            self._append(*({'op': 'put', 'item': item} for item in items))
+
+    def delete(self, key):
+        with self.lock():
+            self._apply_delete(str(key))
+            self._append({'op': 'delete', 'key': key})
+
+    def export(self):
+        """Estado atual no formato do arquivo JSON original (lista de dicts)."""
+        with self.lock():
+            return [dict(item) for item in self._items.values()]
+
+    def compact(self):
+        """Grava o estado no snapshot (formato original, indent=2) e zera o journal."""
+        with self.lock():
+            tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(list(self._items.values()), f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.snapshot_path)
+            # Journal novo com a geração seguinte: sinaliza a compactação aos demais processos
+            generation = (self._generation or 0) + 1
+            header = json.dumps({'op': 'generation', 'generation': generation}) + '\n'
+            tmp = f"{self.journal_path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(header.encode('utf-8'))
+            os.replace(tmp, self.journal_path)
+            self._generation = generation
+            self._offset = len(header)
+            self._pending = 0
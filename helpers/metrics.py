@@ -0,0 +1,245 @@
+"""
+Métricas da API no formato texto do Prometheus (`GET /metrics`).
+
+- Requisições: histograma de latência por rota (o template da regra, ex.
+  `/instituicoesensino/<codigo>`), método e status, medido do `before_request` ao
+  `after_request` (em respostas NDJSON, até o início do streaming).
+- SQL: as conexões do pool usam um cursor que mede cada `execute`/`executemany` por texto
+  normalizado (literais viram `?`, listas de placeholders `(?, ?, ...)` viram `(?...)`), soma o
+  tempo gasto nos `fetch*` e conta as linhas devolvidas.
+
+Desligadas (padrão), nada disso é instalado: nenhum hook no Flask e as conexões são
+`sqlite3.Connection` comuns, então o custo é zero. As métricas são por processo; com
+vários workers, cada um expõe as suas.
+"""
+import functools
+import re
+import sqlite3
+import threading
+import time
+
+from flask import g, request
+
+# Limites dos buckets em segundos (mesma escala dos clientes oficiais do Prometheus)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_QUERIES = 500  # SQLs normalizados distintos acompanhados; os demais vão para OTHER_QUERY
+NORMALIZE_CACHE_SIZE = 2048  # textos brutos com a normalização memorizada (LRU)
+OTHER_QUERY = '<outras>'
+
+_WS_RE = re.compile(r'\s+')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+def normalize_sql(sql):
+    """Texto do SQL sem espaços extras nem literais, para agrupar execuções da mesma consulta."""
+    sql = _WS_RE.sub(' ', sql).strip()
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('(?...)', sql)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Histogram:
+    """Histograma com labels: contagens por bucket, soma e total de observações."""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [contagem por bucket..., soma, total]
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """Contador com labels."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Metrics:
+    """Registro das métricas do processo; `enabled=False` não instala nada."""
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._normalize = functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(normalize_sql)
+        self._keys = set()
+        self.requests = Histogram('http_request_duration_seconds', 'Latência das requisições HTTP.',
+                                  ('route', 'method', 'status'), buckets)
+        self.queries = Histogram('sqlite_query_duration_seconds',
+                                 'Tempo de execute/executemany por SQL normalizado.', ('query',), buckets)
+        self.fetch_seconds = Counter('sqlite_query_fetch_seconds_total',
+                                     'Tempo gasto nos fetch* após o execute, por SQL normalizado.', ('query',))
+        self.rows = Counter('sqlite_query_rows_total', 'Linhas devolvidas, por SQL normalizado.', ('query',))
+        self._collectors = []
+
+    # ----- coleta -----
+
+    def observe_request(self, route, method, status, seconds):
+        with self._lock:
+            self.requests.observe((route, method, str(status)), seconds)
+
+    def query_key(self, sql):
+        """Label do SQL: o texto normalizado, ou OTHER_QUERY depois de MAX_QUERIES distintos."""
+        key = self._normalize(sql)
+        if key in self._keys:
+            return key
+        with self._lock:
+            if len(self._keys) < MAX_QUERIES:
+                self._keys.add(key)
+                return key
+        return OTHER_QUERY
+
+    def observe_query(self, key, seconds):
+        with self._lock:
+            self.queries.observe((key,), seconds)
+
+    def observe_fetch(self, key, seconds, rows):
+        with self._lock:
+            self.fetch_seconds.inc((key,), seconds)
+            self.rows.inc((key,), rows)
+
+    def add_collector(self, fn):
+        """Registra `fn() -> [(nome, help, tipo, {labels_tuple: valor}, label_names)]`, lido a cada /metrics."""
+        self._collectors.append(fn)
+
+    # ----- exposição -----
+
+    def render(self):
+        with self._lock:
+            lines = self.requests.render() + self.queries.render() + self.fetch_seconds.render() + self.rows.render()
+        for collect in self._collectors:
+            for name, help_text, kind, values, label_names in collect():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(label_names, labels)} {value:g}" for labels, value in values.items()]
+        return '\n'.join(lines) + '\n'
+
+    # ----- SQLite -----
+
+    def connection_factory(self):
+        """Subclasse de sqlite3.Connection cujos cursores medem o SQL neste registro."""
+        metrics = self
+
+        class TimedCursor(sqlite3.Cursor):
+            _key = None
+
+            def execute(self, sql, *args):
+                self._key = metrics.query_key(sql)
+                started = time.perf_counter()
+                try:
+                    return super().execute(sql, *args)
+                finally:
+                    metrics.observe_query(self._key, time.perf_counter() - started)
+
+            def executemany(self, sql, *args):
+                self._key = metrics.query_key(sql)
+                started = time.perf_counter()
+                try:
+                    return super().executemany(sql, *args)
+                finally:
+                    metrics.observe_query(self._key, time.perf_counter() - started)
+
+            def _fetch(self, fn, *args):
+                started = time.perf_counter()
+                rows = fn(*args)
+                if self._key is not None:
+                    n = len(rows) if isinstance(rows, list) else int(rows is not None)
+                    metrics.observe_fetch(self._key, time.perf_counter() - started, n)
+                return rows
+
+            def fetchone(self):
+                return self._fetch(super().fetchone)
+
+            def fetchmany(self, *args):
+                return self._fetch(super().fetchmany, *args)
+
+            def fetchall(self):
+                return self._fetch(super().fetchall)
+
+            def __next__(self):
+                row = super().__next__()
+                if self._key is not None:
+                    metrics.observe_fetch(self._key, 0.0, 1)
+                return row
+
+        class TimedConnection(sqlite3.Connection):
+            def cursor(self, factory=TimedCursor):
+                return super().cursor(factory)
+
+            # Os atalhos da conexão criam o cursor em C, sem passar por cursor()
+            def execute(self, sql, *args):
+                return self.cursor().execute(sql, *args)
+
+            def executemany(self, sql, *args):
+                return self.cursor().executemany(sql, *args)
+
+        return TimedConnection
+
+
+def init_app(app, metrics):
+    """Instala os hooks de latência por rota (só se as métricas estiverem ligadas)."""
+    app.extensions['metrics'] = metrics
+    if not metrics.enabled:
+        return
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else '<sem rota>'
+            metrics.observe_request(rule, request.method, response.status_code, time.perf_counter() - started)
+        return response
@@ -0,0 +1,242 @@
+"""
+Servidor WSGI prefork (POSIX): um processo mestre e N workers com M threads cada.
+
+O mestre abre o socket, roda o `preload` (importa o app e mapeia os dados somente
+leitura) e só então faz `fork` dos workers: o código, os módulos e os arrays mapeados são
+herdados e compartilhados copy-on-write. `gc.freeze()` antes do fork tira esses objetos
+das coletas do GC, que do contrário tocariam (e copiariam) as páginas em cada worker.
+O mestre não abre conexões SQLite: cada worker cria as suas depois do fork.
+
+Cada worker atende o socket herdado com um pool fixo de `threads` threads. As conexões
+são HTTP/1.0 (uma requisição por conexão, como os workers síncronos do gunicorn) e têm
+`request_timeout`, então um cliente lento não prende uma thread indefinidamente.
+
+Sinais do mestre:
+    SIGTERM / SIGINT  parada graciosa: cada worker chama `on_drain` (/readyz passa a 503) e
+                      continua atendendo por `readiness_grace` segundos, para o balanceador
+                      ver o 503 e tirá-lo do pool; depois para de aceitar conexões, termina
+                      as requisições em andamento (até `graceful_timeout`) e sai. Um segundo
+                      sinal no worker pula o que falta da espera
+    SIGHUP            recarga graciosa só dos dados: roda o `preload` de novo no mestre (ex.:
+                      snapshot colunar novo), sobe uma geração nova de workers e para a
+                      antiga como acima. O código não é recarregado: os módulos já importados
+                      no mestre são herdados pelos workers novos; para trocar o código,
+                      reinicie o mestre
+Workers que morrem sem ter sido parados são substituídos.
+"""
+import gc
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_THREADS = 8
+DEFAULT_GRACEFUL_TIMEOUT = 30  # segundos para os workers terminarem as requisições em andamento
+DEFAULT_READINESS_GRACE = 5  # segundos atendendo com /readyz em 503 antes de parar de aceitar conexões
+DEFAULT_REQUEST_TIMEOUT = 30  # segundos de inatividade do socket durante uma requisição
+LISTEN_BACKLOG = 2048
+RESPAWN_DELAY = 1.0  # evita laço apertado se o worker morre na inicialização
+
+
+class _RequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.0'  # sem keep-alive: a thread é liberada ao fim de cada resposta
+    timeout = DEFAULT_REQUEST_TIMEOUT
+
+
+class ThreadPoolWSGIServer(BaseWSGIServer):
+    """Servidor werkzeug sobre um socket já aberto, com um pool fixo de threads."""
+
+    multithread = True
+
+    def __init__(self, fd, app, threads=DEFAULT_THREADS, request_timeout=DEFAULT_REQUEST_TIMEOUT):
+        handler = type('RequestHandler', (_RequestHandler,), {'timeout': request_timeout})
+        sock = socket.socket(fileno=os.dup(fd))
+        host, port = sock.getsockname()[:2]
+        sock.close()
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self):
+        """Para de aceitar conexões e espera as requisições em andamento."""
+        self.shutdown()
+        self.pool.shutdown(wait=True)
+
+
+class PreforkServer:
+    """Processo mestre: preload, fork dos workers, supervisão e sinais."""
+
+    def __init__(self, app, host='127.0.0.1', port=8000, workers=DEFAULT_WORKERS, threads=DEFAULT_THREADS,
+                 preload=None, on_drain=None, graceful_timeout=DEFAULT_GRACEFUL_TIMEOUT,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT, post_fork=None, readiness_grace=DEFAULT_READINESS_GRACE):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.preload = preload
+        self.on_drain = on_drain  # chamado no worker ao receber SIGTERM (ex.: readiness 503)
+        self.post_fork = post_fork  # chamado no worker antes de atender (ex.: réplica em memória)
+        self.graceful_timeout = graceful_timeout
+        self.readiness_grace = readiness_grace
+        self.request_timeout = request_timeout
+        self.sock = None
+        self._children = {}  # pid -> geração
+        self._stopping = {}  # pid -> instante do SIGTERM
+        self._generation = 0
+        self._signals = []
+
+    # ----- mestre -----
+
+    def bind(self):
+        self.sock = socket.socket(socket.AF_INET6 if ':' in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(LISTEN_BACKLOG)
+        self.sock.set_inheritable(True)
+        self.port = self.sock.getsockname()[1]
+        return self.port
+
+    def _preload(self):
+        gc.unfreeze()
+        if self.preload is not None:
+            self.preload()
+        gc.collect()
+        gc.freeze()
+
+    def run(self):
+        if self.sock is None:
+            self.bind()
+        self._preload()
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, lambda signum, frame: self._signals.append(signum))
+        logger.info('Mestre %d escutando em http://%s:%d (%d workers x %d threads)',
+                    os.getpid(), self.host, self.port, self.workers, self.threads)
+        self._spawn_generation()
+        try:
+            self._supervise()
+        finally:
+            self.sock.close()
+
+    def _spawn_generation(self):
+        self._generation += 1
+        for _ in range(self.workers):
+            self._spawn()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._worker_main()
+            except BaseException:
+                logger.exception('Worker %d falhou', os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = self._generation
+        return pid
+
+    def _stop(self, pids):
+        now = time.monotonic()
+        for pid in pids:
+            if pid in self._children and pid not in self._stopping:
+                self._stopping[pid] = now
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            generation = self._children.pop(pid, None)
+            stopped = self._stopping.pop(pid, None) is not None
+            if generation == self._generation and not stopped:
+                logger.warning('Worker %d saiu inesperadamente (status %d); subindo outro', pid, status)
+                time.sleep(RESPAWN_DELAY)
+                self._spawn()
+
+    def _supervise(self):
+        shutting_down = False
+        while True:
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum == signal.SIGHUP and not shutting_down:
+                    logger.info('SIGHUP: recarregando os workers')
+                    old = list(self._children)
+                    self._preload()
+                    self._spawn_generation()
+                    self._stop(old)
+                elif signum in (signal.SIGTERM, signal.SIGINT):
+                    logger.info('Parada graciosa (%d workers)', len(self._children))
+                    shutting_down = True
+                    self._stop(list(self._children))
+            self._reap()
+            if shutting_down and not self._children:
+                return
+            now = time.monotonic()
+            for pid, since in list(self._stopping.items()):
+                # O prazo conta a partir do fim da espera de readiness do worker
+                if now - since > self.readiness_grace + self.graceful_timeout:
+                    logger.warning('Worker %d não terminou em %ss; SIGKILL', pid, self.graceful_timeout)
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                    self._stopping[pid] = float('inf')
+            time.sleep(0.2)
+
+    # ----- worker -----
+
+    def _worker_main(self):
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        if self.post_fork is not None:
+            self.post_fork()
+        server = ThreadPoolWSGIServer(self.sock.fileno(), self.app, self.threads, self.request_timeout)
+        draining = threading.Event()
+        skip_grace = threading.Event()
+
+        def drain():
+            skip_grace.wait(self.readiness_grace)
+            server.drain()
+
+        def on_term(signum, frame):
+            if draining.is_set():
+                skip_grace.set()
+                return
+            draining.set()
+            if self.on_drain is not None:
+                self.on_drain()
+            # shutdown() espera o serve_forever sair: não pode rodar na thread dele
+            threading.Thread(target=drain, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, on_term)
+        signal.signal(signal.SIGINT, on_term)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        server.serve_forever()
+        server.pool.shutdown(wait=True)
@@ -0,0 +1,248 @@
+"""
+Profiling sob demanda de requisições (cProfile), gravado num ring buffer em disco.
+
+Com o profiler ligado, uma requisição é perfilada se trouxer o cabeçalho `X-Profile`
+(igual ao token configurado, quando houver) ou se for sorteada pela taxa de amostragem.
+O middleware WSGI envolve o app inteiro (roteamento, handler, `schema.load`, `jsonify`)
+e também a geração do corpo da resposta: o corpo é repassado ao servidor pedaço a pedaço,
+com o profiler ligado só enquanto cada pedaço é produzido, e o perfil é fechado no `close()`
+do WSGI. Respostas em streaming (NDJSON) continuam saindo aos poucos, sem serem acumuladas;
+a duração registrada vai até o fim do envio. Grava, por requisição, no diretório
+configurado:
+
+    <id>.pstats     estatísticas do cProfile (abrir com `python -m pstats` ou snakeviz)
+    <id>.collapsed  pilhas "a;b;c <µs>" para flamegraph.pl / speedscope (aproximadas a
+                    partir do grafo de chamadas do cProfile)
+    <id>.json       metadados (rota, status, duração) e as funções mais caras
+
+Só os `keep` perfis mais recentes são mantidos. Desligado, o middleware não é
+instalado e não há custo algum.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_KEEP = 50
+HEADER = 'HTTP_X_PROFILE'
+TOP_FUNCTIONS = 15
+MAX_STACK_DEPTH = 64
+EXTENSIONS = ('pstats', 'collapsed', 'json')
+
+_SLUG_RE = re.compile(r'[^A-Za-z0-9]+')
+
+
+def _func_name(func):
+    filename, line, name = func
+    if filename == '~':  # built-ins
+        return name
+    # Pasta + arquivo: distingue o app.py do projeto do flask/app.py
+    short = os.path.join(os.path.basename(os.path.dirname(filename)), os.path.basename(filename))
+    return f"{short}:{line}({name})"
+
+
+def collapsed_stacks(stats):
+    """Pilhas no formato "collapsed" a partir do grafo caller -> callee do cProfile.
+
+    O cProfile não guarda pilhas completas: o tempo de cada função é distribuído entre
+    os caminhos na proporção do tempo acumulado de cada aresta (como flameprof/gprof2dot).
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    roots = [func for func, (_, _, _, _, callers) in stats.stats.items() if not callers]
+    lines = {}
+
+    def walk(func, budget, path):
+        _, _, tt, ct, _ = stats.stats[func]
+        if ct <= 0 or budget <= 0:
+            return
+        fraction = min(1.0, budget / ct)
+        stack = path + (_func_name(func),)
+        key = ';'.join(stack)
+        lines[key] = lines.get(key, 0) + tt * fraction
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        for child, edge_ct in callees.get(func, ()):
+            if child != func and _func_name(child) not in path:
+                walk(child, edge_ct * fraction, stack)
+
+    for root in roots:
+        walk(root, stats.stats[root][3], ())
+    return [f"{stack} {int(round(seconds * 1e6))}" for stack, seconds in lines.items() if seconds * 1e6 >= 1]
+
+
+def top_functions(stats, n=TOP_FUNCTIONS):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:n]
+    return [{'funcao': _func_name(func), 'chamadas': nc, 'tempo_proprio_ms': round(tt * 1000, 3),
+             'tempo_acumulado_ms': round(ct * 1000, 3)} for func, (_, nc, tt, ct, _) in rows]
+
+
+class RequestProfiler:
+    """Middleware WSGI que perfila requisições escolhidas e mantém os últimos `keep` perfis."""
+
+    def __init__(self, profile_dir, sample_rate=0.0, token=None, keep=DEFAULT_KEEP, enabled=False):
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate
+        self.token = token
+        self.keep = keep
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def wants(self, environ):
+        header = environ.get(HEADER)
+        if header is not None:
+            return header == self.token if self.token else header not in ('', '0')
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def wrap(self, wsgi_app):
+        def middleware(environ, start_response):
+            if not self.wants(environ):
+                return wsgi_app(environ, start_response)
+            captured = {}
+
+            def capture(status, headers, exc_info=None):
+                captured['status'] = int(status.split(' ', 1)[0])
+                return start_response(status, headers, exc_info)
+
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                app_iter = wsgi_app(environ, capture)
+            finally:
+                profiler.disable()
+            return _ProfiledBody(self, profiler, app_iter, environ, captured, started)
+
+        return middleware
+
+    # ----- ring buffer em disco -----
+
+    def _new_id(self, environ):
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        slug = _SLUG_RE.sub('-', environ.get('PATH_INFO', '')).strip('-')[:60] or 'raiz'
+        return f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}-{seq:05d}-{environ.get('REQUEST_METHOD', 'GET')}-{slug}"
+
+    def save(self, profiler, environ, status, elapsed):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profile_id = self._new_id(environ)
+        base = os.path.join(self.profile_dir, profile_id)
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(base + '.pstats')
+        with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+            f.write('\n'.join(collapsed_stacks(stats)) + '\n')
+        meta = {
+            'id': profile_id,
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO'),
+            'query': environ.get('QUERY_STRING', ''),
+            'status': status,
+            'duration_ms': round(elapsed * 1000, 3),
+            'created_at': datetime.now().isoformat(timespec='milliseconds'),
+            'top': top_functions(stats),
+        }
+        # O .json é gravado por último: é ele que torna o perfil visível na listagem
+        tmp = f"{base}.json.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, base + '.json')
+        self.prune()
+        return profile_id
+
+    def prune(self):
+        """Apaga os perfis mais antigos além de `keep`."""
+        ids = self.ids()
+        for profile_id in ids[self.keep:]:
+            for ext in EXTENSIONS:
+                try:
+                    os.remove(os.path.join(self.profile_dir, f"{profile_id}.{ext}"))
+                except FileNotFoundError:
+                    pass
+
+    def ids(self):
+        """Ids dos perfis gravados, do mais recente para o mais antigo."""
+        try:
+            names = [n[:-5] for n in os.listdir(self.profile_dir) if n.endswith('.json')]
+        except FileNotFoundError:
+            return []
+        paths = {n: os.path.join(self.profile_dir, n + '.json') for n in names}
+        mtimes = {}
+        for n, p in paths.items():
+            try:
+                mtimes[n] = os.stat(p).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        return sorted(mtimes, key=lambda n: (mtimes[n], n), reverse=True)
+
+    def list(self, limit=None):
+        items = []
+        for profile_id in self.ids()[:limit]:
+            try:
+                with open(os.path.join(self.profile_dir, profile_id + '.json'), encoding='utf-8') as f:
+                    items.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        return items
+
+    def path(self, profile_id, ext):
+        """Caminho de um arquivo do perfil, ou None se o id/extensão não existir."""
+        if ext not in EXTENSIONS or os.path.basename(profile_id) != profile_id:
+            return None
+        path = os.path.join(self.profile_dir, f"{profile_id}.{ext}")
+        return path if os.path.exists(path) else None
+
+
+class _ProfiledBody:
+    """Corpo da resposta que liga o profiler enquanto cada pedaço é gerado; grava no `close()`."""
+
+    def __init__(self, owner, profiler, app_iter, environ, captured, started):
+        self._owner = owner
+        self._profiler = profiler
+        self._app_iter = app_iter
+        self._iter = iter(app_iter)
+        self._environ = environ
+        self._captured = captured
+        self._started = started
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._profiler.enable()
+        try:
+            return next(self._iter)
+        finally:
+            self._profiler.disable()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._profiler.enable()
+        try:
+            if hasattr(self._app_iter, 'close'):
+                self._app_iter.close()
+        finally:
+            self._profiler.disable()
+            elapsed = time.perf_counter() - self._started
+            try:
+                self._owner.save(self._profiler, self._environ, self._captured.get('status'), elapsed)
+            except OSError:
+                pass  # perfil perdido não deve derrubar a requisição
+
+
+def init_app(app, profiler):
+    """Instala o middleware (só se o profiler estiver ligado)."""
+    app.extensions['profiler'] = profiler
+    if profiler.enabled:
+        app.wsgi_app = profiler.wrap(app.wsgi_app)
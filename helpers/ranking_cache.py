@@ -0,0 +1,142 @@
+"""
+Cache em memória (LRU + TTL) para os rankings de `tb_instituicao_year`.
+
+Os dados de 2022-2024 só mudam após uma importação, então o resultado do ranking
+pode ser servido da memória. A invalidação é explícita: as rotas de escrita limpam
+o cache local e os scripts de migração (outros processos) trocam um arquivo de
+carimbo ao lado do banco, que cada worker confere com um `stat` no máximo a cada
+`stamp_check_interval` segundos.
+
+Cada limpeza avança a geração do cache. `get` devolve a geração junto com o valor, e
+quem calculou o ranking após um miss a repassa ao `set`: se o cache foi limpo durante o
+cálculo, o valor (lido antes da escrita) é descartado em vez de ficar até o TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_TTL = 300  # segundos
+DEFAULT_STAMP_CHECK_INTERVAL = 0.5  # segundos entre os `stat` do carimbo
+
+STAMP_SUFFIX = '.ranking-stamp'
+
+
+def stamp_path_for(db_path):
+    """Caminho do arquivo de carimbo de invalidação associado ao banco."""
+    return db_path + STAMP_SUFFIX
+
+
+def touch_stamp(db_path):
+    """Sinaliza a todos os processos que os rankings de `db_path` estão obsoletos.
+
+    O arquivo é substituído atomicamente, então o inode muda a cada chamada mesmo
+    que o relógio do sistema de arquivos tenha baixa resolução.
+    """
+    path = stamp_path_for(db_path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp, path)
+
+
+def _read_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+class RankingCache:
+    """Cache LRU com TTL indexado por (ano, N, filtros)."""
+
+    def __init__(self, db_path, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL,
+                 stamp_check_interval=DEFAULT_STAMP_CHECK_INTERVAL):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stamp_check_interval = stamp_check_interval
+        self._stamp_path = stamp_path_for(db_path)
+        self._stamp = _read_stamp(self._stamp_path)
+        self._stamp_checked_at = time.monotonic()
+        self._generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.discarded = 0
+
+    @staticmethod
+    def make_key(ano, limit, filters=None):
+        return (ano, limit, tuple(sorted((filters or {}).items())))
+
+    def _clear(self):
+        self._data.clear()
+        self._generation += 1
+        self.invalidations += 1
+
+    def _check_stamp(self):
+        now = time.monotonic()
+        if now - self._stamp_checked_at < self.stamp_check_interval:
+            return
+        self._stamp_checked_at = now
+        stamp = _read_stamp(self._stamp_path)
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._clear()
+
+    def get(self, key):
+        """Devolve `(valor, geração)`; o valor é None se ausente/expirado.
+
+        Num miss, passe a geração ao `set` junto com o valor calculado.
+        """
+        with self._lock:
+            self._check_stamp()
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, self._generation
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None, self._generation
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value, self._generation
+
+    def set(self, key, value, generation):
+        """Guarda `value`, salvo se o cache foi limpo desde o `get` que devolveu `generation`."""
+        with self._lock:
+            self._check_stamp()
+            if generation != self._generation:
+                self.discarded += 1
+                return False
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            return True
+
+    def invalidate(self):
+        """Limpa o cache local e avisa os demais processos."""
+        with self._lock:
+            self._clear()
+            touch_stamp(self.db_path)
+            self._stamp = _read_stamp(self._stamp_path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'stamp_check_interval': self.stamp_check_interval,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'discarded': self.discarded,
+            }
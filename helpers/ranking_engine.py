@@ -0,0 +1,105 @@
+"""
+Ranking top-k em NumPy sobre o snapshot colunar (ver helpers/columnar.py).
+
+Sem filtro, o top-k é um fatiamento da ordem nacional pré-calculada na exportação. Com
+filtro geográfico, um `searchsorted` acha as linhas do grupo e há dois caminhos, como os
+planos de um banco: grupo pequeno (município) -> `top_k` seleciona as k maiores do grupo
+com `np.argpartition`, ordenando só os candidatos; grupo grande (UF) -> percorre a ordem
+nacional em blocos descartando as outras linhas, o que acha k linhas após ~k*N/grupo
+posições, sem copiar o grupo inteiro. Tudo roda
+direto sobre os arrays mapeados em memória, sem passar pelo SQLite. A ordem é a mesma do
+SQL (métrica decrescente; empates pela ordem de inserção, i.e. pelo id da linha), e as
+posições com empate seguem `assign_ranks` (ver helpers/ranking_sql.py).
+"""
+import numpy as np
+
+SCAN_MIN_CHUNK = 256  # posições da ordem nacional lidas no primeiro bloco da varredura
+
+from helpers.columnar import growth_deltas
+from helpers.ranking_sql import DEFAULT_RANK_METHOD, GROWTH_ENTITY_COLUMNS, assign_ranks
+
+
+def top_k(values, k, mask=None):
+    """Índices das `k` linhas de maior valor, em ordem (valor desc, índice asc)."""
+    rows = np.flatnonzero(mask) if mask is not None else None
+    vals = values[rows] if rows is not None else values
+    n = len(vals)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        # Limiar do k-ésimo maior; entram todos os empatados nele para desempatar pelo índice
+        threshold = vals[np.argpartition(vals, n - k)[n - k:]].min()
+        candidates = np.flatnonzero(vals >= threshold)
+    else:
+        candidates = np.arange(n)
+    order = candidates[np.lexsort((candidates, -vals[candidates]))][:k]
+    return rows[order] if rows is not None else order
+
+
+def _scan_order(snapshot, ano, order, filters, limit, chunk):
+    """Primeiras `limit` linhas de `order` que atendem aos filtros, lendo blocos crescentes."""
+    found, total, pos = [], 0, 0
+    while total < limit and pos < len(order):
+        idx = order[pos:pos + chunk]
+        for geo, code in filters.items():
+            idx = idx[snapshot.column(ano, geo)[idx] == code]
+        found.append(idx)
+        total += len(idx)
+        pos += chunk
+        chunk *= 2
+    return np.concatenate(found)[:limit] if found else np.empty(0, dtype=np.intp)
+
+
+def ranked_rows(snapshot, ano, metric, filters, limit):
+    """Índices do top-`limit`: ordem nacional pré-calculada ou `top_k` no grupo filtrado."""
+    order = snapshot.order(ano, metric)
+    if not filters:
+        return order[:limit]
+    # Parte do grupo do filtro mais seletivo; os demais filtros só conferem esse grupo
+    ranges = {geo: snapshot.geo_range(ano, geo, code) for geo, code in filters.items()}
+    geo = min(ranges, key=lambda g: ranges[g][1] - ranges[g][0])
+    lo, hi = ranges[geo]
+    size = hi - lo
+    if size == 0 or limit <= 0:
+        return np.empty(0, dtype=np.intp)
+    if size * size >= limit * len(order):
+        # Grupo grande: varrer ~limit*N/size posições da ordem nacional custa menos que o grupo
+        return _scan_order(snapshot, ano, order, filters, limit, max(SCAN_MIN_CHUNK, 2 * limit * len(order) // size))
+    rows = snapshot.geo_rows(ano, geo)[lo:hi]
+    mask = None
+    for other, code in filters.items():
+        if other != geo:
+            match = snapshot.column(ano, other)[rows] == code
+            mask = match if mask is None else mask & match
+    # `rows` está em id crescente, então o desempate por posição é o desempate pelo id
+    return rows[top_k(snapshot.column(ano, metric)[rows], limit, mask)]
+
+
+def rank(snapshot, ano, metric, filters, limit, method=DEFAULT_RANK_METHOD):
+    """Top-`limit` de `metric` no ano, como a lista de dicts devolvida pela API."""
+    values = snapshot.column(ano, metric)
+    idx = ranked_rows(snapshot, ano, metric, filters, limit)
+    items = snapshot.rows(ano, idx)
+    for item, position in zip(items, assign_ranks(values[idx].tolist(), method)):
+        item['nu_ranking'] = position
+    return items
+
+
+def growth(snapshot, de, ate, metric, limit, por='absoluto', ordem='desc', method=DEFAULT_RANK_METHOD):
+    """Top-`limit` do crescimento de `metric` entre `de` e `ate` (ordens pré-calculadas)."""
+    order = snapshot.growth(de, ate, f"{metric}.{'abs' if por == 'absoluto' else 'pct'}.order")
+    positions = order[:limit] if ordem == 'desc' else order[::-1][:limit]
+    rows_de = snapshot.growth(de, ate, 'rows_de')[positions]
+    rows_ate = snapshot.growth(de, ate, 'rows_ate')[positions]
+    de_values = snapshot.column(de, metric)[rows_de]
+    ate_values = snapshot.column(ate, metric)[rows_ate]
+    delta, pct = growth_deltas(de_values, ate_values)
+
+    items = snapshot.rows(ate, rows_ate, columns=GROWTH_ENTITY_COLUMNS)
+    pct = [None if np.isnan(p) else round(p, 2) for p in pct.tolist()]
+    for item, a, b, d, p in zip(items, de_values.tolist(), ate_values.tolist(), delta.tolist(), pct):
+        item.update(valor_de=a, valor_ate=b, delta=d, delta_pct=p)
+    keys = [item['delta' if por == 'absoluto' else 'delta_pct'] for item in items]
+    for item, position in zip(items, assign_ranks(keys, method)):
+        item['nu_ranking'] = position
+    return items
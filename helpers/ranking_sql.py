@@ -0,0 +1,117 @@
+"""
+Consultas de ranking sobre `tb_instituicao_year` e os índices compostos que as atendem.
+
+Cada combinação suportada (métrica x filtro geográfico opcional) tem um índice
+`(nu_ano_censo, [filtro,] métrica DESC)`, de modo que o `ORDER BY métrica DESC LIMIT N`
+vira uma varredura ordenada do índice, sem passo de ordenação (sem "TEMP B-TREE").
+
+Empates na posição (`nu_ranking`), comuns a este caminho e ao helpers/ranking_engine.py:
+    ordinal      1, 2, 3, 4   (posição na lista; comportamento original)
+    competition  1, 2, 2, 4   (empatados dividem a posição e a seguinte é pulada)
+    dense        1, 2, 2, 3   (empatados dividem a posição, sem pular)
+"""
+
+TABLE = 'tb_instituicao_year'
+
+RANKING_METRICS = (
+    'qt_mat_total', 'qt_mat_bas', 'qt_mat_prof', 'qt_mat_eja', 'qt_mat_esp', 'qt_mat_fund',
+    'qt_mat_inf', 'qt_mat_med', 'qt_mat_zr_na', 'qt_mat_zr_rur', 'qt_mat_zr_urb',
+)
+GEO_FILTERS = ('co_uf', 'co_municipio', 'co_mesorregiao', 'co_microrregiao')
+DEFAULT_METRIC = 'qt_mat_total'
+RANK_METHODS = ('ordinal', 'competition', 'dense')
+DEFAULT_RANK_METHOD = 'ordinal'
+
+# Ranking de crescimento entre dois anos: base da variação e sentido da ordenação
+GROWTH_BASES = ('absoluto', 'percentual')
+GROWTH_ORDERS = ('desc', 'asc')
+GROWTH_ENTITY_COLUMNS = ('co_entidade', 'no_entidade', 'sg_uf', 'co_uf', 'no_municipio', 'co_municipio')
+GROWTH_COLUMNS = GROWTH_ENTITY_COLUMNS + ('valor_de', 'valor_ate', 'delta', 'delta_pct')
+
+# Colunas devolvidas em cada item do ranking (mesma ordem do SELECT)
+RANKING_COLUMNS = (
+    'no_entidade', 'co_entidade', 'no_uf', 'sg_uf', 'co_uf', 'no_municipio', 'co_municipio',
+    'no_mesorregiao', 'co_mesorregiao', 'no_microrregiao', 'co_microrregiao', 'nu_ano_censo',
+    'no_regiao', 'co_regiao', 'qt_mat_bas', 'qt_mat_prof', 'qt_mat_eja', 'qt_mat_esp', 'qt_mat_fund',
+    'qt_mat_inf', 'qt_mat_med', 'qt_mat_zr_na', 'qt_mat_zr_rur', 'qt_mat_zr_urb', 'qt_mat_total',
+)
+
+
+def ranking_indexes():
+    """Lista de (nome, colunas) dos índices compostos do ranking."""
+    indexes = []
+    for metric in RANKING_METRICS:
+        indexes.append((f"idx_rank_{metric}", f"nu_ano_censo, {metric} DESC"))
+        for geo in GEO_FILTERS:
+            indexes.append((f"idx_rank_{metric}_{geo}", f"nu_ano_censo, {geo}, {metric} DESC"))
+    return indexes
+
+
+def create_ranking_indexes(conn):
+    """Cria (se necessário) todos os índices do ranking."""
+    for name, columns in ranking_indexes():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE}({columns})")
+    conn.commit()
+
+
+def build_ranking_query(metric, filters):
+    """SQL e parâmetros do top-N; `filters` é um dict {coluna geográfica: código}.
+
+    `metric` e as chaves de `filters` precisam estar nas listas acima (são interpoladas
+    no SQL). Execute com `(ano, *params, limit)`.
+    """
+    if metric not in RANKING_METRICS:
+        raise ValueError(f"métrica não suportada: {metric}")
+    where = ["nu_ano_censo = ?"]
+    params = []
+    for geo in GEO_FILTERS:
+        if geo in filters:
+            where.append(f"{geo} = ?")
+            params.append(filters[geo])
+    sql = (f"SELECT {', '.join(RANKING_COLUMNS)} FROM {TABLE} "
+           f"WHERE {' AND '.join(where)} ORDER BY {metric} DESC LIMIT ?")
+    return sql, params
+
+
+def build_growth_query(metric, por='absoluto', ordem='desc'):
+    """SQL do ranking de crescimento (self-join por co_entidade). Execute com `(ate, de, limit)`.
+
+    Colunas na ordem de GROWTH_COLUMNS. Em `percentual` ficam de fora as escolas com valor
+    inicial 0. Empates seguem o id da linha no ano final (crescente em `desc`, decrescente em
+    `asc`), como no snapshot colunar.
+    """
+    if metric not in RANKING_METRICS:
+        raise ValueError(f"métrica não suportada: {metric}")
+    key = 'delta' if por == 'absoluto' else 'delta_pct'
+    direction, tie = ('DESC', 'ASC') if ordem == 'desc' else ('ASC', 'DESC')
+    where = ["a.nu_ano_censo = ?", f"a.{metric} IS NOT NULL", f"b.{metric} IS NOT NULL"]
+    if por == 'percentual':
+        where.append(f"a.{metric} > 0")
+    sql = (f"SELECT {', '.join('b.' + c for c in GROWTH_ENTITY_COLUMNS)}, a.{metric}, b.{metric}, "
+           f"b.{metric} - a.{metric} AS delta, "
+           f"CASE WHEN a.{metric} > 0 THEN (b.{metric} - a.{metric}) * 100.0 / a.{metric} END AS delta_pct "
+           f"FROM {TABLE} a JOIN {TABLE} b ON b.co_entidade = a.co_entidade AND b.nu_ano_censo = ? "
+           f"WHERE {' AND '.join(where)} ORDER BY {key} {direction}, b.id {tie} LIMIT ?")
+    return sql
+
+
+def explain_ranking_query(conn, metric, filters, ano=2024, limit=10):
+    """Plano (EXPLAIN QUERY PLAN) do ranking, como lista de strings."""
+    sql, params = build_ranking_query(metric, filters)
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", (ano, *params, limit)).fetchall()
+    return [r[-1] for r in rows]
+
+
+def assign_ranks(sorted_values, method=DEFAULT_RANK_METHOD):
+    """Posições (`nu_ranking`) para valores já em ordem decrescente."""
+    if method not in RANK_METHODS:
+        raise ValueError(f"método de ranking não suportado: {method}")
+    ranks = []
+    for i, value in enumerate(sorted_values):
+        if i > 0 and method != 'ordinal' and value == sorted_values[i - 1]:
+            ranks.append(ranks[-1])
+        elif method == 'dense':
+            ranks.append(ranks[-1] + 1 if ranks else 1)
+        else:
+            ranks.append(i + 1)
+    return ranks
@@ -0,0 +1,283 @@
+"""
+Réplica de leitura em memória de `censoescolar.db` (modo opcional, READ_REPLICA=1).
+
+Na primeira leitura de cada processo o banco é copiado com a API de backup do SQLite para
+um banco em memória compartilhado (`file:...?mode=memory&cache=shared`), e as rotas de
+leitura passam a usar conexões dele (`get_read_db`): a latência não depende mais do disco
+nem disputa com uma importação em andamento. O backup lê um snapshot do WAL e não bloqueia
+quem escreve.
+
+As escritas continuam indo para o disco. Logo após o commit, as rotas de escrita da API
+chamam `sync`, que copia do disco (anexado como `disk` à conexão de escrita da réplica) só
+as linhas alteradas e a versão da tabela em tb_data_version. Escritas de outros processos
+(migrações, outros workers) e da carga do ranking aparecem como versões diferentes no
+disco: uma thread confere as versões a cada `refresh_interval` segundos e, se preciso, monta
+uma geração nova da réplica; as leituras continuam na geração antiga até a troca.
+
+Os ETags saem das versões gravadas na própria réplica (`get`, mesmo contrato de
+DataVersions.get), então nunca anunciam um dado que a réplica ainda não tem. Cada processo
+tem a sua cópia: a memória usada é o tamanho do banco vezes o número de workers.
+"""
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g
+
+from helpers.data_version import EPOCH, TABLE as VERSIONS_TABLE, DataVersions, versions_for
+from helpers.db_pool import ConnectionPool, DEFAULT_POOL_SIZE, get_db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 1.0  # segundos entre as conferências das versões do disco
+# Durante uma importação longa as versões mudam a cada chunk: entre duas cópias espera-se
+# pelo menos este múltiplo da duração da última, o que limita a CPU gasta copiando
+REBUILD_SPACING = 4
+# read_uncommitted: no cache compartilhado, leitores não seguram locks de tabela e o `sync`
+# não espera por eles (vê no máximo as poucas linhas de uma escrita pela metade)
+READER_PRAGMAS = {'query_only': 1, 'read_uncommitted': 1, 'temp_store': 'MEMORY'}
+
+
+def _version_rows(conn, schema):
+    try:
+        return {t: (v, ts) for t, v, ts in
+                conn.execute(f"SELECT tabela, versao, atualizado_em FROM {schema}.{VERSIONS_TABLE}")}
+    except sqlite3.OperationalError:
+        return {}
+
+
+def _versions(rows):
+    return {t: v for t, (v, _) in rows.items()}
+
+
+class _Generation:
+    """Uma cópia em memória: a conexão de escrita (que mantém o banco vivo) e o pool de leitura."""
+
+    def __init__(self, uri, writer, pool, rows, seconds):
+        self.uri = uri
+        self.writer = writer
+        self.pool = pool
+        self.rows = rows  # tb_data_version da cópia
+        self.seconds = seconds
+        self.built_at = time.time()
+
+    def close(self):
+        self.pool.close()
+        self.writer.close()
+
+
+class ReadReplica:
+    """Cópia em memória do banco para as rotas de leitura; `enabled=False` não instala nada."""
+
+    def __init__(self, db_path, pool_size=DEFAULT_POOL_SIZE, refresh_interval=DEFAULT_REFRESH_INTERVAL,
+                 factory=None, on_build=None, enabled=True):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.refresh_interval = refresh_interval
+        self.factory = factory
+        self.on_build = on_build  # chamado com a conexão de escrita de cada cópia nova (ex.: índices)
+        self.enabled = enabled
+        self._lock = threading.RLock()  # cópia e sync (demorados: as leituras não passam por ele)
+        self._swap_lock = threading.Lock()  # troca de geração x empréstimo de conexão
+        self._gen = None
+        self._pid = None
+        self._disk = None
+        self._wake = threading.Event()
+        self._names = itertools.count(1)
+        self._tables = {}
+        self.builds = 0
+        self.syncs = 0
+        self.sync_errors = 0
+
+    # ----- gerações -----
+
+    def _current(self):
+        gen = self._gen
+        if gen is not None and self._pid == os.getpid():
+            return gen
+        with self._lock:
+            if self._gen is None or self._pid != os.getpid():
+                # Conexões SQLite não atravessam o fork: cada processo faz a sua cópia
+                self._pid = os.getpid()
+                self._gen = None
+                self._disk = DataVersions(self.db_path)
+                self._swap(self._build())
+                threading.Thread(target=self._watch, name='read-replica', daemon=True).start()
+            return self._gen
+
+    def _build(self):
+        started = time.perf_counter()
+        uri = f"file:replica-{os.getpid()}-{next(self._names)}?mode=memory&cache=shared"
+        writer = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None)
+        try:
+            disk = sqlite3.connect(self.db_path)
+            try:
+                disk.backup(writer)
+            finally:
+                disk.close()
+            if self.on_build is not None:
+                self.on_build(writer)
+            writer.execute("ATTACH DATABASE ? AS disk", (f"file:{os.path.abspath(self.db_path)}?mode=ro",))
+            rows = _version_rows(writer, 'main')
+        except Exception:
+            writer.close()
+            raise
+        pool = ConnectionPool(uri, pragmas=READER_PRAGMAS, max_size=self.pool_size, factory=self.factory, uri=True)
+        gen = _Generation(uri, writer, pool, rows, time.perf_counter() - started)
+        logger.info('Réplica de leitura %s copiada em %.3fs', uri, gen.seconds)
+        return gen
+
+    def _swap(self, gen):
+        with self._swap_lock:
+            old, self._gen = self._gen, gen
+            self.builds += 1
+            if old is not None:
+                # As conexões ainda emprestadas fecham ao voltar para o pool; a cópia antiga
+                # é liberada quando a última delas fecha
+                old.close()
+
+    def refresh(self):
+        """Monta uma cópia nova se as versões do disco diferem das da réplica. True se trocou."""
+        if not self.enabled:
+            return False
+        self._current()
+        with self._lock:
+            disk = self._disk.rows()
+            if disk is None or _versions(disk) == _versions(self._gen.rows):
+                return False
+            self._swap(self._build())
+        return True
+
+    def _watch(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wake.wait(max(self.refresh_interval, REBUILD_SPACING * self._gen.seconds))
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Falha ao atualizar a réplica de leitura')
+
+    def warm(self):
+        """Faz a cópia deste processo já (ex.: no worker, logo após o fork)."""
+        if self.enabled:
+            self._current()
+
+    # ----- escrita -----
+
+    def _table(self, conn, tabela):
+        """Chave e colunas copiadas de `tabela`; sem chave primária (ex.: FTS5) a chave é o rowid."""
+        if tabela not in self._tables:
+            info = list(conn.execute(f"PRAGMA main.table_info({tabela})"))
+            key = ', '.join(c for _, c in sorted((r[5], r[1]) for r in info if r[5]))
+            columns = [r[1] for r in info]
+            self._tables[tabela] = (key, ', '.join(columns)) if key else ('rowid', ', '.join(['rowid'] + columns))
+        return self._tables[tabela]
+
+    def sync(self, changes):
+        """Copia do disco as linhas de uma escrita já commitada neste processo.
+
+        `changes`: `{tabela: (where, params)}` com o filtro das linhas tocadas (None copia a
+        tabela toda). A versão de cada tabela só é copiada se o disco estiver uma
+        escrita à frente da réplica; senão outra escrita ficou no meio e a thread de
+        atualização é acordada para refazer a cópia.
+        """
+        if not self.enabled or self._gen is None or self._pid != os.getpid():
+            return
+        stale = False
+        with self._lock:
+            gen = self._gen
+            conn = gen.writer
+            updated = {}
+            try:
+                conn.execute("BEGIN")
+                disk = _version_rows(conn, 'disk')  # a transação fixa o snapshot do disco
+                if disk.get(EPOCH) != gen.rows.get(EPOCH):
+                    raise sqlite3.DatabaseError('banco em disco recriado')
+                for tabela, filtro in changes.items():
+                    where, params = filtro or (None, ())
+                    where, params = where or '1', tuple(params)
+                    key, columns = self._table(conn, tabela)
+                    conn.execute(f"DELETE FROM main.{tabela} WHERE {where} AND ({key}) NOT IN "
+                                 f"(SELECT {key} FROM disk.{tabela} WHERE {where})", params + params)
+                    conn.execute(f"INSERT OR REPLACE INTO main.{tabela} ({columns}) "
+                                 f"SELECT {columns} FROM disk.{tabela} WHERE {where}", params)
+                    local, atual = gen.rows.get(tabela, (0, 0)), disk.get(tabela, (0, 0))
+                    if atual[0] == local[0] + 1:
+                        updated[tabela] = atual
+                    elif atual[0] != local[0]:
+                        stale = True
+                conn.executemany(f"INSERT OR REPLACE INTO main.{VERSIONS_TABLE} (tabela, versao, atualizado_em) "
+                                 f"VALUES (?, ?, ?)", [(t, v, ts) for t, (v, ts) in updated.items()])
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self.sync_errors += 1
+                logger.warning('Sync da réplica de leitura falhou (%s); refazendo a cópia', e)
+                stale, updated = True, {}
+            gen.rows.update(updated)
+            self.syncs += 1
+        if stale:
+            self._wake.set()
+
+    # ----- leitura -----
+
+    def acquire(self):
+        """`(pool, conexão)` da cópia atual (criada na primeira chamada do processo).
+
+        A conexão deve voltar para esse `pool`, mesmo que a geração já tenha sido trocada.
+        """
+        self._current()
+        with self._swap_lock:
+            pool = self._gen.pool
+            return pool, pool.acquire()
+
+    def get(self, tabelas):
+        """`(versões, last_modified)` de `tabelas` na réplica, ou None se o banco não puder ser lido."""
+        try:
+            gen = self._current()
+        except sqlite3.Error:
+            return None
+        return versions_for(gen.rows, tabelas)
+
+    def stats(self):
+        gen = self._gen if self._pid == os.getpid() else None
+        return {
+            'enabled': self.enabled,
+            'database': gen.uri if gen else None,
+            'built_at': gen.built_at if gen else None,
+            'build_seconds': round(gen.seconds, 3) if gen else None,
+            'versions': _versions(gen.rows) if gen else None,
+            'builds': self.builds,
+            'syncs': self.syncs,
+            'sync_errors': self.sync_errors,
+            'pool': gen.pool.stats() if gen else None,
+        }
+
+
+def init_app(app, replica):
+    """Registra a réplica e devolve as conexões de leitura no teardown (só se estiver ligada)."""
+    app.extensions['read_replica'] = replica
+    if not replica.enabled:
+        return
+
+    @app.teardown_appcontext
+    def _release_read_db(exc):
+        borrowed = g.pop('read_db', None)
+        if borrowed is not None:
+            pool, conn = borrowed
+            pool.release(conn)
+
+
+def get_read_db():
+    """Conexão para leitura vinculada ao app context: da réplica se ligada, senão a do pool do disco."""
+    replica = current_app.extensions.get('read_replica')
+    if replica is None or not replica.enabled:
+        return get_db()
+    if 'read_db' not in g:
+        g.read_db = replica.acquire()
+    return g.read_db[1]
@@ -0,0 +1,172 @@
+"""
+Agregações geográficas materializadas (`tb_agregado`): por nível (UF, mesorregião,
+microrregião, município), ano e código, a soma de cada coluna `qt_mat_*` e o número de escolas.
+
+Os anos do censo vêm de `tb_instituicao_year` e são recalculados em bloco (`GROUP BY`) pelas
+migrações. O cadastro editável pela API (`tb_instituicao`, sem ano) fica em
+`nu_ano_censo = 0` (CADASTRO), nos níveis que a tabela tem (UF e município) e nas colunas
+qt_mat_bas/prof/esp; as rotas de escrita o atualizam de forma incremental, somando a
+diferença entre o estado antigo e o novo de cada instituição. Toda escrita incrementa a
+versão de `tb_agregado` (helpers/data_version.py) na mesma transação. Bancos criados antes
+da tabela (ou com ela vazia) a ganham, já preenchida, no primeiro uso (`ensure`).
+"""
+from collections import defaultdict
+
+from helpers.data_version import bump
+from helpers.ranking_sql import RANKING_METRICS
+
+TABLE = 'tb_agregado'
+
+# nível -> (coluna do código, coluna do nome) em tb_instituicao_year
+LEVELS = {
+    'uf': ('co_uf', 'no_uf'),
+    'mesorregiao': ('co_mesorregiao', 'no_mesorregiao'),
+    'microrregiao': ('co_microrregiao', 'no_microrregiao'),
+    'municipio': ('co_municipio', 'no_municipio'),
+}
+
+CADASTRO = 0
+CADASTRO_LEVELS = ('uf', 'municipio')
+CADASTRO_METRICS = ('qt_mat_bas', 'qt_mat_prof', 'qt_mat_esp')
+# Colunas de tb_instituicao lidas para calcular as diferenças
+CADASTRO_FIELDS = ('co_uf', 'no_uf', 'co_municipio', 'no_municipio') + CADASTRO_METRICS
+
+ROLLUP_COLUMNS = ('codigo', 'nome', 'qt_escolas') + RANKING_METRICS
+
+DDL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+        nivel TEXT NOT NULL,
+        nu_ano_censo INTEGER NOT NULL,
+        codigo INTEGER NOT NULL,
+        nome TEXT,
+        qt_escolas INTEGER NOT NULL DEFAULT 0,
+        {', '.join(f'{m} INTEGER' for m in RANKING_METRICS)},
+        PRIMARY KEY (nivel, nu_ano_censo, codigo)
+) WITHOUT ROWID
+"""
+
+
+def _has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def rebuild_year_rollups(conn, anos=None):
+    """Recalcula em bloco as agregações dos anos do censo (todos, se `anos` for None)."""
+    where, params = "nu_ano_censo > ?", [CADASTRO]
+    if anos:
+        where = f"nu_ano_censo IN ({','.join('?' * len(anos))})"
+        params = list(anos)
+    sums = ', '.join(f"SUM({m})" for m in RANKING_METRICS)
+    conn.execute(f"DELETE FROM {TABLE} WHERE {where}", params)
+    for nivel, (code, name) in LEVELS.items():
+        conn.execute(
+            f"INSERT INTO {TABLE} (nivel, nu_ano_censo, {', '.join(ROLLUP_COLUMNS)}) "
+            f"SELECT ?, nu_ano_censo, {code}, MAX({name}), COUNT(*), {sums} FROM tb_instituicao_year "
+            f"WHERE {where} AND {code} IS NOT NULL GROUP BY nu_ano_censo, {code}",
+            [nivel, *params])
+    bump(conn, TABLE)
+    conn.commit()
+
+
+def rebuild_cadastro_rollups(conn):
+    """Recalcula em bloco as agregações do cadastro (`tb_instituicao`)."""
+    sums = ', '.join(f"SUM({m})" for m in CADASTRO_METRICS)
+    conn.execute(f"DELETE FROM {TABLE} WHERE nu_ano_censo = ?", (CADASTRO,))
+    for nivel in CADASTRO_LEVELS:
+        code, name = LEVELS[nivel]
+        conn.execute(
+            f"INSERT INTO {TABLE} (nivel, nu_ano_censo, codigo, nome, qt_escolas, {', '.join(CADASTRO_METRICS)}) "
+            f"SELECT ?, ?, {code}, MAX({name}), COUNT(*), {sums} FROM tb_instituicao "
+            f"WHERE {code} IS NOT NULL GROUP BY {code}",
+            (nivel, CADASTRO))
+    bump(conn, TABLE)
+    conn.commit()
+
+
+def _missing(conn, where, source):
+    """True se `source` tem linhas mas tb_agregado não tem nenhuma em `where`."""
+    if conn.execute(f"SELECT 1 FROM {TABLE} WHERE {where} LIMIT 1").fetchone():
+        return False
+    return conn.execute(f"SELECT 1 FROM {source} LIMIT 1").fetchone() is not None
+
+
+def ensure(conn):
+    """Cria e preenche as agregações que faltam. True se recalculou alguma.
+
+    Pega o banco anterior à tabela e também a tabela criada vazia pelo schema.sql (ex.:
+    `initdb.py` rodado de novo sobre um banco já migrado).
+    """
+    conn.execute(DDL)
+    built = False
+    if _missing(conn, f"nu_ano_censo = {CADASTRO}", 'tb_instituicao'):
+        rebuild_cadastro_rollups(conn)
+        built = True
+    if _has_table(conn, 'tb_instituicao_year') and _missing(conn, f"nu_ano_censo > {CADASTRO}", 'tb_instituicao_year'):
+        rebuild_year_rollups(conn)
+        built = True
+    return built
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def apply_cadastro_deltas(cursor, changes):
+    """Atualiza as agregações do cadastro a partir de pares (antes, depois).
+
+    Cada lado é um dict com CADASTRO_FIELDS (ou None para inserção/remoção). Roda na
+    transação de quem chama, que faz o commit junto com a escrita em `tb_instituicao`.
+    Devolve as unidades `(nivel, codigo)` tocadas.
+    """
+    deltas = defaultdict(lambda: [None, 0] + [0] * len(CADASTRO_METRICS))
+    for old, new in changes:
+        for row, sign in ((old, -1), (new, 1)):
+            if row is None:
+                continue
+            for nivel in CADASTRO_LEVELS:
+                code, name = LEVELS[nivel]
+                if row.get(code) is None:
+                    continue
+                entry = deltas[(nivel, _as_int(row[code]))]
+                if sign > 0 and row.get(name):
+                    entry[0] = row[name]
+                entry[1] += sign
+                for i, metric in enumerate(CADASTRO_METRICS):
+                    entry[2 + i] += sign * _as_int(row.get(metric))
+    if not deltas:
+        return []
+    metrics = ', '.join(CADASTRO_METRICS)
+    updates = ', '.join(f"{m} = COALESCE({m}, 0) + excluded.{m}" for m in CADASTRO_METRICS)
+    cursor.executemany(
+        f"INSERT INTO {TABLE} (nivel, nu_ano_censo, codigo, nome, qt_escolas, {metrics}) "
+        f"VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(CADASTRO_METRICS))}) "
+        f"ON CONFLICT(nivel, nu_ano_censo, codigo) DO UPDATE SET "
+        f"nome = COALESCE(excluded.nome, nome), qt_escolas = qt_escolas + excluded.qt_escolas, {updates}",
+        [(nivel, CADASTRO, codigo, *entry) for (nivel, codigo), entry in deltas.items()])
+    cursor.execute(f"DELETE FROM {TABLE} WHERE nu_ano_censo = ? AND qt_escolas <= 0", (CADASTRO,))
+    bump(cursor, TABLE)
+    return list(deltas)
+
+
+def fetch_cadastro_rows(cursor, codigos):
+    """Estado atual (CADASTRO_FIELDS) das instituições `codigos`, por código."""
+    found = {}
+    codigos = [str(c) for c in codigos]
+    for i in range(0, len(codigos), 500):
+        chunk = codigos[i:i + 500]
+        cursor.execute(f"SELECT codigo, {', '.join(CADASTRO_FIELDS)} FROM tb_instituicao "
+                       f"WHERE codigo IN ({','.join('?' * len(chunk))})", chunk)
+        for r in cursor.fetchall():
+            found[r[0]] = dict(zip(CADASTRO_FIELDS, r[1:]))
+    return found
+
+
+def rollup_query(codigo=None):
+    """SQL da consulta por (nível, ano[, código]) — busca pela chave primária."""
+    sql = f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM {TABLE} WHERE nivel = ? AND nu_ano_censo = ?"
+    if codigo is not None:
+        sql += " AND codigo = ?"
+    return sql + " ORDER BY codigo"
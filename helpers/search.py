@@ -0,0 +1,112 @@
+"""
+Busca textual de instituições (`GET /instituicoesensino/busca?q=`): índice FTS5
+`tb_instituicao_fts` sobre o nome da escola (NO_ENTIDADE nas importações) e o município.
+
+O tokenizer `unicode61 remove_diacritics 2` tira os acentos e ignora maiúsculas no índice e
+na consulta, então "sao joao" encontra "SÃO JOÃO"; `unaccent` faz a mesma normalização em
+Python para montar a expressão MATCH. O rowid do índice é o `id` de tb_instituicao e a
+ordem é a do BM25, com o nome pesando mais que o município.
+
+Como as agregações do cadastro (helpers/rollups.py), o índice é reconstruído em bloco no fim
+das migrações (`rebuild`) e mantido pelas rotas de escrita na mesma transação: `unindex`
+antes da escrita e `index` depois.
+"""
+import re
+import unicodedata
+
+from helpers.data_version import bump
+
+TABLE = 'tb_instituicao_fts'
+
+DDL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+        nome, no_municipio, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+)
+"""
+
+WEIGHTS = (10.0, 1.0)  # bm25 por coluna: nome, no_municipio
+MAX_TERMS = 8
+IN_CHUNK = 500  # códigos por consulta IN
+
+_TERM = re.compile(r'\w+')
+
+
+def unaccent(text):
+    """Minúsculas e sem diacríticos ("São João" -> "sao joao")."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def match_query(text):
+    """Expressão MATCH para o texto digitado, ou None se não houver termos.
+
+    Cada termo vai entre aspas (o cliente não injeta operadores do FTS5) e todos são
+    obrigatórios; o último vale como prefixo, para a busca enquanto se digita.
+    """
+    terms = _TERM.findall(unaccent(text or ''))[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{t}"' for t in terms) + '*'
+
+
+def search_query(where=()):
+    """SQL da busca, com os filtros extras `where` sobre tb_instituicao.
+
+    Execute com `(match, *params, limit, offset)`; a última coluna é o BM25 (menor = melhor).
+    """
+    weights = ', '.join(map(str, WEIGHTS))
+    sql = (f"SELECT i.codigo, i.nome, i.no_municipio, i.co_municipio, i.sg_uf, bm25({TABLE}, {weights}) AS score "
+           f"FROM {TABLE} JOIN tb_instituicao i ON i.id = {TABLE}.rowid WHERE {TABLE} MATCH ?")
+    for clause in where:
+        sql += f" AND i.{clause}"
+    return sql + " ORDER BY score LIMIT ? OFFSET ?"
+
+
+def rebuild(conn):
+    """Reconstrói o índice a partir de tb_instituicao (fim das migrações)."""
+    conn.execute(DDL)
+    conn.execute(f"DELETE FROM {TABLE}")
+    conn.execute(f"INSERT INTO {TABLE} (rowid, nome, no_municipio) SELECT id, nome, no_municipio FROM tb_instituicao")
+    conn.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    bump(conn, 'tb_instituicao')
+    conn.commit()
+
+
+def ensure(conn):
+    """Reconstrói o índice se ele não cobre tb_instituicao. True se reconstruiu.
+
+    Pega o banco anterior ao índice e também a tabela criada vazia pelo schema.sql (ex.:
+    `initdb.py` rodado de novo sobre um banco já migrado): basta o número de linhas do
+    índice diferir do de tb_instituicao.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (TABLE,)).fetchone():
+        indexed = conn.execute(f"SELECT count(*) FROM {TABLE}").fetchone()[0]
+        if indexed == conn.execute("SELECT count(*) FROM tb_instituicao").fetchone()[0]:
+            return False
+    rebuild(conn)
+    return True
+
+
+def _rows(cursor, codigos):
+    codigos = [str(c) for c in codigos]
+    rows = []
+    for i in range(0, len(codigos), IN_CHUNK):
+        chunk = codigos[i:i + IN_CHUNK]
+        cursor.execute(f"SELECT id, nome, no_municipio FROM tb_instituicao "
+                       f"WHERE codigo IN ({','.join('?' * len(chunk))})", chunk)
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def unindex(cursor, codigos):
+    """Tira do índice as instituições `codigos` (antes da escrita); devolve os ids."""
+    ids = [r[0] for r in _rows(cursor, codigos)]
+    cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = ?", [(i,) for i in ids])
+    return ids
+
+
+def index(cursor, codigos):
+    """Indexa o estado atual das instituições `codigos` (depois da escrita); devolve os ids."""
+    rows = _rows(cursor, codigos)
+    cursor.executemany(f"INSERT INTO {TABLE} (rowid, nome, no_municipio) VALUES (?, ?, ?)", rows)
+    return [r[0] for r in rows]
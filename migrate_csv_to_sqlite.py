@@ -9,16 +9,51 @@ Notes:
 - Attempts to detect column names; if CSV uses different names adjust the `CANDIDATE_COLUMNS` mapping.
 - It will insert only if the `codigo` (entity code) does not already exist for that year.
 - Calculates qt_mat_total automatically during migration.
+- Each chunk is transformed column-wise (vectorized); `--legacy` keeps the old row-by-row
+  path (iterrows + per-row SELECTs) so both can be compared through the rows/s report.
+- Several files (e.g. 2022, 2023 and 2024) can be given at once:
+    python migrate_csv_to_sqlite.py --csv microdados_ed_basica_2022.csv microdados_ed_basica_2023.csv microdados_ed_basica_2024.csv --workers 3
+  Files are parsed in a process pool and the row batches go through a bounded queue to a
+  single writer process, the only one holding a write connection to SQLite.
+- Imports are resumable: `tb_import_manifest` records each file (size, content hash) and the
+  byte/row offset of the last committed chunk, in the same transaction as the chunk rows.
+  Re-running on an imported file is a no-op and an interrupted run seeks straight to the
+  last checkpoint. `--force` ignores the manifest and reads the file from the start.
+  A file is only marked done after the refreshes below succeed; a resumed run always
+  redoes them, even when it has no new rows to insert.
+- After a load the geographic rollups (`tb_agregado`: sums per UF / mesorregiao /
+  microrregiao / municipio and year) are rebuilt in bulk with one GROUP BY per level.
+- Every committed chunk bumps the per-table data version (`tb_data_version`) that the API
+  turns into ETags, so clients revalidating with If-None-Match see the new rows.
+- New schools are added to the full-text search index (`tb_instituicao_fts`, FTS5) in one
+  bulk rebuild at the end of the load.
 """
 
 import argparse
+import hashlib
+import io
+import itertools
+import multiprocessing
 import sqlite3
 import os
+import time
+from datetime import datetime
 import pandas as pd
 
+from helpers.columnar import export_snapshot
+from helpers.data_version import bump as bump_version, bump_db as bump_version_db
+from helpers.ranking_cache import touch_stamp
+from helpers.ranking_sql import create_ranking_indexes
+from helpers.rollups import rebuild_cadastro_rollups, rebuild_year_rollups
+from helpers.search import rebuild as rebuild_search
+
 DEFAULT_DB = "censoescolar.db"
 DEFAULT_CSV = "microdados_ed_basica_2024.csv"
 DEFAULT_CHUNK = 200000
+DEFAULT_QUEUE_SIZE = 4  # batches em trânsito entre os parsers e o writer
+HASH_SAMPLE_BYTES = 1 << 20  # bytes do início e do fim do arquivo usados no hash de conteúdo
+MANIFEST_RUNNING = 'running'
+MANIFEST_DONE = 'done'
 
 # Candidate column names that might exist in different CSV versions.
 CANDIDATE_COLUMNS = {
@@ -49,6 +84,38 @@ CANDIDATE_COLUMNS = {
     'qt_mat_total': ['QT_MAT_TOTAL', 'NU_MATRICULAS_TOTAL']
 }
 
+YEARS = (2022, 2023, 2024)
+
+STR_FIELDS = ['nome', 'no_uf', 'sg_uf', 'no_municipio', 'no_mesorregiao', 'no_microrregiao', 'no_regiao']
+INT_FIELDS = ['co_uf', 'co_municipio', 'co_mesorregiao', 'co_microrregiao', 'co_regiao',
+              'qt_mat_bas', 'qt_mat_prof', 'qt_mat_eja', 'qt_mat_esp', 'qt_mat_fund', 'qt_mat_inf',
+              'qt_mat_med', 'qt_mat_zr_na', 'qt_mat_zr_rur', 'qt_mat_zr_urb']
+# Campos somados quando o CSV não traz QT_MAT_TOTAL
+TOTAL_PARTS = ['qt_mat_bas', 'qt_mat_prof', 'qt_mat_eja', 'qt_mat_esp', 'qt_mat_fund', 'qt_mat_inf', 'qt_mat_med']
+
+# Ordem das colunas nos INSERTs abaixo
+INST_FIELDS = ['codigo', 'nome', 'co_uf', 'no_uf', 'sg_uf', 'co_municipio', 'no_municipio',
+               'qt_mat_bas', 'qt_mat_prof', 'qt_mat_esp']
+YEAR_FIELDS = ['codigo', 'nome', 'co_uf', 'no_uf', 'sg_uf', 'co_municipio', 'no_municipio',
+               'co_mesorregiao', 'no_mesorregiao', 'co_microrregiao', 'no_microrregiao', 'co_regiao', 'no_regiao',
+               'nu_ano_censo', 'qt_mat_bas', 'qt_mat_prof', 'qt_mat_eja', 'qt_mat_esp', 'qt_mat_fund',
+               'qt_mat_inf', 'qt_mat_med', 'qt_mat_zr_na', 'qt_mat_zr_rur', 'qt_mat_zr_urb', 'qt_mat_total']
+
+INSERT_INST_SQL = """
+    INSERT OR IGNORE INTO tb_instituicao
+    (codigo, nome, co_uf, no_uf, sg_uf, co_municipio, no_municipio, qt_mat_bas, qt_mat_prof, qt_mat_esp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_YEAR_SQL = """
+    INSERT OR IGNORE INTO tb_instituicao_year
+    (co_entidade, no_entidade, co_uf, no_uf, sg_uf, co_municipio, no_municipio,
+     co_mesorregiao, no_mesorregiao, co_microrregiao, no_microrregiao, co_regiao, no_regiao,
+     nu_ano_censo, qt_mat_bas, qt_mat_prof, qt_mat_eja, qt_mat_esp, qt_mat_fund, qt_mat_inf, qt_mat_med,
+     qt_mat_zr_na, qt_mat_zr_rur, qt_mat_zr_urb, qt_mat_total)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
 
 def find_column(columns, candidates):
     for c in candidates:
@@ -57,6 +124,19 @@ def find_column(columns, candidates):
     return None
 
 
+def map_columns(columns):
+    """Mapeia cada campo de CANDIDATE_COLUMNS para a coluna encontrada no CSV (ou None)."""
+    return {key: find_column(columns, candidates) for key, candidates in CANDIDATE_COLUMNS.items()}
+
+
+def detect_file_year(csv_file):
+    """Detecta o ano do censo pelo nome do arquivo CSV."""
+    for y in YEARS:
+        if str(y) in os.path.basename(csv_file):
+            return y
+    return None
+
+
 def load_schema(db_path: str, schema_file: str = 'schema.sql'):
     conn = sqlite3.connect(db_path)
     with open(schema_file, 'r', encoding='utf-8') as f:
@@ -64,19 +144,11 @@ def load_schema(db_path: str, schema_file: str = 'schema.sql'):
     conn.close()
 
 
-def migrate_csv(csv_file: str, db_path: str, chunk_size: int = DEFAULT_CHUNK,
-                filter_nordeste=False, sep=';', fast=False, dry_run=False,
-                encoding='latin1'):
-
-    if not os.path.exists(csv_file):
-        raise FileNotFoundError(f"CSV file not found: {csv_file}")
-
+def prepare_database(db_path: str):
+    """Aplica o schema e garante a tabela tb_instituicao_year."""
     load_schema(db_path)
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Criar tabela tb_instituicao_year se não existir
-    cursor.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS tb_instituicao_year (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             co_entidade TEXT NOT NULL,
@@ -108,218 +180,606 @@ def migrate_csv(csv_file: str, db_path: str, chunk_size: int = DEFAULT_CHUNK,
         )
     """)
     conn.commit()
+    conn.close()
+
+
+def ensure_ranking_indexes(db_path: str):
+    """Cria os índices compostos do ranking após a carga (em bulk na primeira importação)."""
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    create_ranking_indexes(conn)
+    conn.close()
+    print(f"Ranking indexes ready ({time.perf_counter() - started:.2f}s)")
+
+
+# ===== Manifesto de importação (checkpoints) =====
+
+def file_fingerprint(csv_file):
+    """(tamanho, hash) do arquivo. O hash cobre o tamanho e o primeiro/último MiB, o que
+    identifica um CSV de microdados sem reler gigabytes a cada execução."""
+    size = os.path.getsize(csv_file)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(csv_file, 'rb') as f:
+        digest.update(f.read(HASH_SAMPLE_BYTES))
+        if size > HASH_SAMPLE_BYTES:
+            f.seek(max(HASH_SAMPLE_BYTES, size - HASH_SAMPLE_BYTES))
+            digest.update(f.read(HASH_SAMPLE_BYTES))
+    return size, digest.hexdigest()
+
+
+def manifest_start(conn, csv_file, force=False):
+    """Registra (ou retoma) a importação de `csv_file` no manifesto.
+
+    Devolve (content_hash, byte_offset, row_offset, status); com status `done` não há nada
+    a fazer. Com `force` o checkpoint é zerado e o arquivo é relido desde o início.
+    """
+    size, content_hash = file_fingerprint(csv_file)
+    now = datetime.now().isoformat(timespec='seconds')
+    row = conn.execute(
+        "SELECT byte_offset, row_offset, status FROM tb_import_manifest WHERE content_hash = ?",
+        (content_hash,)).fetchone()
+    if row is None or force:
+        conn.execute(
+            "INSERT OR REPLACE INTO tb_import_manifest "
+            "(content_hash, path, size, byte_offset, row_offset, status, started_at, updated_at) "
+            "VALUES (?, ?, ?, 0, 0, ?, ?, ?)",
+            (content_hash, os.path.abspath(csv_file), size, MANIFEST_RUNNING, now, now))
+        conn.commit()
+        return content_hash, 0, 0, MANIFEST_RUNNING
+    byte_offset, row_offset, status = row
+    if status != MANIFEST_DONE:
+        conn.execute("UPDATE tb_import_manifest SET path = ?, status = ?, updated_at = ? WHERE content_hash = ?",
+                     (os.path.abspath(csv_file), MANIFEST_RUNNING, now, content_hash))
+        conn.commit()
+    return content_hash, byte_offset, row_offset, status
+
+
+def manifest_checkpoint(cursor, content_hash, byte_offset, row_offset):
+    """Avança o checkpoint; chamado na mesma transação que grava as linhas do chunk."""
+    cursor.execute(
+        "UPDATE tb_import_manifest SET byte_offset = ?, row_offset = ?, updated_at = ? WHERE content_hash = ?",
+        (byte_offset, row_offset, datetime.now().isoformat(timespec='seconds'), content_hash))
+
+
+def manifest_finish(conn, content_hash):
+    conn.execute("UPDATE tb_import_manifest SET status = ?, updated_at = ? WHERE content_hash = ?",
+                 (MANIFEST_DONE, datetime.now().isoformat(timespec='seconds'), content_hash))
+    conn.commit()
+
+
+def read_csv_chunks(csv_file, chunk_size, sep=';', encoding='latin1', start_offset=0):
+    """Lê o CSV em chunks de `chunk_size` linhas a partir do byte `start_offset`.
+
+    Gera (DataFrame, offset em bytes logo após o chunk). As linhas são separadas aqui, e não
+    pelo pandas, para conhecer o offset exato de cada fronteira de chunk e poder retomar
+    com um seek; assume um registro por linha, como nos microdados do Censo.
+    """
+    with open(csv_file, 'rb') as f:
+        header = f.readline()
+        columns = pd.read_csv(io.BytesIO(header), sep=sep, nrows=0, encoding=encoding,
+                              encoding_errors='replace').columns.tolist()
+        offset = max(start_offset, len(header))
+        f.seek(offset)
+        while True:
+            data = b''.join(itertools.islice(f, chunk_size))
+            if not data:
+                break
+            offset += len(data)
+            chunk = pd.read_csv(io.BytesIO(data), sep=sep, header=None, names=columns, dtype=str,
+                                low_memory=True, encoding=encoding, encoding_errors='replace')
+            yield chunk, offset
+
+
+def export_columnar(db_path: str):
+    """Regrava o snapshot colunar (.npy por ano) lido pela API via mmap."""
+    started = time.perf_counter()
+    manifest = export_snapshot(db_path)
+    print(f"Columnar snapshot {manifest['version']} written: {manifest['years']} "
+          f"({time.perf_counter() - started:.2f}s)")
+
+
+def refresh_rollups(db_path: str):
+    """Recalcula em bloco as agregações geográficas (tb_agregado) após a carga."""
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    rebuild_year_rollups(conn)
+    rebuild_cadastro_rollups(conn)
+    conn.close()
+    print(f"Geographic rollups ready ({time.perf_counter() - started:.2f}s)")
+
+
+def refresh_search_index(db_path: str):
+    """Reconstrói em bloco o índice de busca (tb_instituicao_fts) após a carga."""
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    rebuild_search(conn)
+    conn.close()
+    print(f"Search index ready ({time.perf_counter() - started:.2f}s)")
+
+
+def refresh_derived(db_path: str, instituicoes: bool, anos: bool):
+    """Recalcula o que deriva das tabelas carregadas: rollups, índice de busca, índices de
+    ranking e snapshot colunar. `instituicoes`/`anos` dizem quais tabelas receberam linhas."""
+    if instituicoes or anos:
+        refresh_rollups(db_path)
+    if instituicoes:
+        refresh_search_index(db_path)
+    # Rankings em cache nos workers da API ficam obsoletos após a importação
+    if anos:
+        ensure_ranking_indexes(db_path)
+        export_columnar(db_path)
+        touch_stamp(db_path)
+        # Último bump, depois do snapshot e do carimbo: ETag novo nunca acompanha ranking antigo
+        bump_version_db(db_path, 'tb_instituicao_year')
+
+
+def bump_chunk_versions(cursor, insert_rows, insert_rows_year):
+    """Incrementa a versão dos dados (ETags da API) das tabelas em que o chunk gravou."""
+    tables = [t for t, rows in (('tb_instituicao', insert_rows), ('tb_instituicao_year', insert_rows_year)) if rows]
+    if tables:
+        bump_version(cursor, *tables)
+
+
+def load_existing_keys(cursor):
+    """Chaves já presentes no banco, para o anti-join do caminho vetorizado."""
+    cursor.execute("SELECT codigo FROM tb_instituicao")
+    codigos = {r[0] for r in cursor.fetchall()}
+    cursor.execute("SELECT co_entidade, nu_ano_censo FROM tb_instituicao_year")
+    year_keys = set(cursor.fetchall())
+    return codigos, year_keys
+
+
+def transform_chunk(chunk, mapping, file_year):
+    """Normaliza um chunk do CSV coluna a coluna.
+
+    Devolve um DataFrame com os campos de YEAR_FIELDS (ano ainda como float, NaN quando
+    não é possível determiná-lo) e a quantidade de linhas descartadas por não ter código.
+    """
+    codigo = chunk[mapping['codigo']]
+    valid = codigo.notna()
+    skipped = int((~valid).sum())
+    chunk = chunk[valid]
+
+    out = pd.DataFrame(index=chunk.index)
+    out['codigo'] = chunk[mapping['codigo']].astype(str)
+
+    for field in STR_FIELDS:
+        col = mapping[field]
+        if col:
+            out[field] = chunk[col].fillna('').astype(str).str.strip()
+        else:
+            out[field] = ''
+
+    for field in INT_FIELDS:
+        col = mapping[field]
+        if col:
+            out[field] = pd.to_numeric(chunk[col], errors='coerce').fillna(0).astype('int64')
+        else:
+            out[field] = 0
+
+    # Ano do censo: coluna NU_ANO_CENSO quando válida (2022-2024), senão o ano do arquivo
+    if mapping['nu_ano_censo']:
+        ano = pd.to_numeric(chunk[mapping['nu_ano_censo']], errors='coerce')
+        ano = ano.where(ano.between(YEARS[0], YEARS[-1]))
+    else:
+        ano = pd.Series(float('nan'), index=chunk.index)
+    if file_year:
+        ano = ano.fillna(file_year)
+    out['nu_ano_censo'] = ano
+
+    computed_total = out[TOTAL_PARTS].sum(axis=1)
+    if mapping['qt_mat_total']:
+        raw_total = chunk[mapping['qt_mat_total']]
+        total = pd.to_numeric(raw_total, errors='coerce').fillna(0).astype('int64')
+        out['qt_mat_total'] = total.where(raw_total.notna(), computed_total)
+    else:
+        out['qt_mat_total'] = computed_total
+
+    return out, skipped
+
+
+def select_new_rows(df, existing_codigos, existing_year_keys):
+    """Anti-join contra as chaves existentes; devolve as tuplas a inserir em cada tabela."""
+    inst = df[~df['codigo'].isin(existing_codigos)].drop_duplicates('codigo')
+
+    year = df[df['nu_ano_censo'].notna()].copy()
+    year['nu_ano_censo'] = year['nu_ano_censo'].astype('int64')
+    keys = pd.MultiIndex.from_arrays([year['codigo'], year['nu_ano_censo']])
+    year = year[~keys.isin(existing_year_keys)].drop_duplicates(['codigo', 'nu_ano_censo'])
+
+    existing_codigos.update(inst['codigo'])
+    existing_year_keys.update(zip(year['codigo'], year['nu_ano_censo'].tolist()))
+
+    insert_rows = list(inst[INST_FIELDS].itertuples(index=False, name=None))
+    insert_rows_year = list(year[YEAR_FIELDS].itertuples(index=False, name=None))
+    return insert_rows, insert_rows_year
+
+
+def filter_chunk_nordeste(chunk, co_uf_col):
+    """Mantém apenas CO_UF 21..29 (Nordeste)."""
+    try:
+        chunk[co_uf_col] = pd.to_numeric(chunk[co_uf_col], errors='coerce')
+        return chunk[chunk[co_uf_col].between(21, 29, inclusive='both')]
+    except Exception:
+        return chunk[chunk[co_uf_col].astype(str).str.startswith(tuple(str(x) for x in range(21, 30)))]
+
+
+def safe_int(val):
+    """Converte valor para inteiro de forma segura."""
+    if pd.isna(val) or val == '' or val is None:
+        return 0
+    try:
+        return int(float(str(val).strip()))
+    except (ValueError, TypeError):
+        return 0
+
+
+def safe_str(val):
+    """Converte valor para string de forma segura."""
+    if pd.isna(val) or val is None:
+        return ''
+    return str(val).strip()
+
+
+def transform_chunk_rows(chunk, mapping, file_year, cursor):
+    """Caminho antigo (linha a linha, com SELECT de duplicidade por linha), mantido para comparação."""
+    insert_rows = []
+    insert_rows_year = []
+    skipped = 0
+
+    def get(row, field):
+        col = mapping[field]
+        return row.get(col) if col else None
+
+    for idx, row in chunk.iterrows():
+        codigo = get(row, 'codigo')
+        if pd.isna(codigo):
+            skipped += 1
+            continue
+
+        # Detectar ano do censo
+        ano_censo = None
+        if mapping['nu_ano_censo'] and not pd.isna(get(row, 'nu_ano_censo')):
+            ano_censo = safe_int(get(row, 'nu_ano_censo'))
+        if not ano_censo or ano_censo < 2022 or ano_censo > 2024:
+            ano_censo = file_year
+
+        # Verificar duplicação na tabela tb_instituicao
+        cursor.execute("SELECT id FROM tb_instituicao WHERE codigo = ?", (str(codigo),))
+        exists_instituicao = cursor.fetchone() is not None
+
+        # Verificar duplicação na tabela tb_instituicao_year
+        cursor.execute("SELECT id FROM tb_instituicao_year WHERE co_entidade = ? AND nu_ano_censo = ?", (str(codigo), ano_censo))
+        exists_year = cursor.fetchone() is not None
+
+        values = {'codigo': str(codigo), 'nu_ano_censo': ano_censo}
+        for field in STR_FIELDS:
+            values[field] = safe_str(get(row, field))
+        for field in INT_FIELDS:
+            values[field] = safe_int(get(row, field))
+
+        # Calcular qt_mat_total
+        if mapping['qt_mat_total'] and not pd.isna(get(row, 'qt_mat_total')):
+            values['qt_mat_total'] = safe_int(get(row, 'qt_mat_total'))
+        else:
+            # Calcular total somando os campos de matrícula
+            values['qt_mat_total'] = sum(values[f] for f in TOTAL_PARTS)
+
+        # Inserir na tabela tb_instituicao (compatibilidade)
+        if not exists_instituicao:
+            insert_rows.append(tuple(values[f] for f in INST_FIELDS))
+
+        # Inserir na tabela tb_instituicao_year (ranking por ano)
+        if not exists_year and ano_censo:
+            insert_rows_year.append(tuple(values[f] for f in YEAR_FIELDS))
+
+    return insert_rows, insert_rows_year, skipped
+
+
+def print_mapping(cols, mapping, file_year):
+    print("Detected CSV columns (first chunk):", cols)
+    print("\nDetected mapping:")
+    print(f"  codigo: {mapping['codigo']}")
+    print(f"  nome: {mapping['nome']}")
+    print(f"  co_uf: {mapping['co_uf']}, no_uf: {mapping['no_uf']}, sg_uf: {mapping['sg_uf']}")
+    print(f"  co_municipio: {mapping['co_municipio']}, no_municipio: {mapping['no_municipio']}")
+    print(f"  co_mesorregiao: {mapping['co_mesorregiao']}, no_mesorregiao: {mapping['no_mesorregiao']}")
+    print(f"  co_microrregiao: {mapping['co_microrregiao']}, no_microrregiao: {mapping['no_microrregiao']}")
+    print(f"  co_regiao: {mapping['co_regiao']}, no_regiao: {mapping['no_regiao']}")
+    print(f"  nu_ano_censo: {mapping['nu_ano_censo']}")
+    print(f"  qt_mat_bas: {mapping['qt_mat_bas']}, qt_mat_prof: {mapping['qt_mat_prof']}")
+    print(f"  qt_mat_eja: {mapping['qt_mat_eja']}, qt_mat_esp: {mapping['qt_mat_esp']}")
+    print(f"  qt_mat_fund: {mapping['qt_mat_fund']}, qt_mat_inf: {mapping['qt_mat_inf']}, qt_mat_med: {mapping['qt_mat_med']}")
+    print(f"  qt_mat_zr_*: na={mapping['qt_mat_zr_na']}, rur={mapping['qt_mat_zr_rur']}, urb={mapping['qt_mat_zr_urb']}")
+    print(f"  qt_mat_total: {mapping['qt_mat_total']}")
+    print(f"  file_year (from filename): {file_year}")
+
+
+def migrate_csv(csv_file: str, db_path: str, chunk_size: int = DEFAULT_CHUNK,
+                filter_nordeste=False, sep=';', fast=False, dry_run=False,
+                encoding='latin1', legacy=False, force=False):
+
+    if not os.path.exists(csv_file):
+        raise FileNotFoundError(f"CSV file not found: {csv_file}")
+
+    prepare_database(db_path)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Manifesto: arquivo já importado é no-op; importação interrompida retoma do checkpoint
+    byte_offset, row_offset = 0, 0
+    if not dry_run:
+        content_hash, byte_offset, row_offset, status = manifest_start(conn, csv_file, force)
+        if status == MANIFEST_DONE:
+            print(f"{csv_file} already imported (hash {content_hash}); nothing to do. Use --force to re-import.")
+            conn.close()
+            return
+        if byte_offset:
+            print(f"Resuming {csv_file} from row {row_offset} (byte {byte_offset})")
 
     inserted_total = 0
+    inserted_year_total = 0
     skipped_total = 0
-    processed_total = 0
+    processed_total = row_offset
 
     columns_printed = False
     chunk_idx = 0
 
     # Detectar ano do arquivo CSV pelo nome
-    file_year = None
-    for y in (2022, 2023, 2024):
-        if str(y) in os.path.basename(csv_file):
-            file_year = y
-            break
+    file_year = detect_file_year(csv_file)
 
     if fast:
         conn.execute("PRAGMA journal_mode = WAL;")
         conn.execute("PRAGMA synchronous = OFF;")
         conn.execute("PRAGMA temp_store = MEMORY;")
 
+    # Chaves existentes carregadas uma única vez (anti-join em memória)
+    if not legacy:
+        existing_codigos, existing_year_keys = load_existing_keys(cursor)
+
+    started = time.perf_counter()
+
     # --- READ CSV WITH SAFE ENCODING ---
-    for chunk in pd.read_csv(
-            csv_file,
-            sep=sep,
-            chunksize=chunk_size,
-            dtype=str,
-            low_memory=True,
-            encoding=encoding,
-            encoding_errors='replace'
-        ):
+    for chunk, chunk_end in read_csv_chunks(csv_file, chunk_size, sep, encoding, byte_offset):
 
+        chunk_started = time.perf_counter()
         processed_total += len(chunk)
         cols = chunk.columns.tolist()
 
         # Detectar todas as colunas necessárias
-        codigo_col = find_column(cols, CANDIDATE_COLUMNS['codigo'])
-        nome_col = find_column(cols, CANDIDATE_COLUMNS['nome'])
-        co_uf_col = find_column(cols, CANDIDATE_COLUMNS['co_uf'])
-        no_uf_col = find_column(cols, CANDIDATE_COLUMNS['no_uf'])
-        sg_uf_col = find_column(cols, CANDIDATE_COLUMNS['sg_uf'])
-        co_municipio_col = find_column(cols, CANDIDATE_COLUMNS['co_municipio'])
-        no_municipio_col = find_column(cols, CANDIDATE_COLUMNS['no_municipio'])
-        co_mesorregiao_col = find_column(cols, CANDIDATE_COLUMNS['co_mesorregiao'])
-        no_mesorregiao_col = find_column(cols, CANDIDATE_COLUMNS['no_mesorregiao'])
-        co_microrregiao_col = find_column(cols, CANDIDATE_COLUMNS['co_microrregiao'])
-        no_microrregiao_col = find_column(cols, CANDIDATE_COLUMNS['no_microrregiao'])
-        co_regiao_col = find_column(cols, CANDIDATE_COLUMNS['co_regiao'])
-        no_regiao_col = find_column(cols, CANDIDATE_COLUMNS['no_regiao'])
-        nu_ano_censo_col = find_column(cols, CANDIDATE_COLUMNS['nu_ano_censo'])
-        qt_mat_bas_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_bas'])
-        qt_mat_prof_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_prof'])
-        qt_mat_eja_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_eja'])
-        qt_mat_esp_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_esp'])
-        qt_mat_fund_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_fund'])
-        qt_mat_inf_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_inf'])
-        qt_mat_med_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_med'])
-        qt_mat_zr_na_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_zr_na'])
-        qt_mat_zr_rur_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_zr_rur'])
-        qt_mat_zr_urb_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_zr_urb'])
-        qt_mat_total_col = find_column(cols, CANDIDATE_COLUMNS['qt_mat_total'])
+        mapping = map_columns(cols)
 
         if not columns_printed:
-            print("Detected CSV columns (first chunk):", cols)
-            print("\nDetected mapping:")
-            print(f"  codigo: {codigo_col}")
-            print(f"  nome: {nome_col}")
-            print(f"  co_uf: {co_uf_col}, no_uf: {no_uf_col}, sg_uf: {sg_uf_col}")
-            print(f"  co_municipio: {co_municipio_col}, no_municipio: {no_municipio_col}")
-            print(f"  co_mesorregiao: {co_mesorregiao_col}, no_mesorregiao: {no_mesorregiao_col}")
-            print(f"  co_microrregiao: {co_microrregiao_col}, no_microrregiao: {no_microrregiao_col}")
-            print(f"  co_regiao: {co_regiao_col}, no_regiao: {no_regiao_col}")
-            print(f"  nu_ano_censo: {nu_ano_censo_col}")
-            print(f"  qt_mat_bas: {qt_mat_bas_col}, qt_mat_prof: {qt_mat_prof_col}")
-            print(f"  qt_mat_eja: {qt_mat_eja_col}, qt_mat_esp: {qt_mat_esp_col}")
-            print(f"  qt_mat_fund: {qt_mat_fund_col}, qt_mat_inf: {qt_mat_inf_col}, qt_mat_med: {qt_mat_med_col}")
-            print(f"  qt_mat_zr_*: na={qt_mat_zr_na_col}, rur={qt_mat_zr_rur_col}, urb={qt_mat_zr_urb_col}")
-            print(f"  qt_mat_total: {qt_mat_total_col}")
-            print(f"  file_year (from filename): {file_year}")
+            print_mapping(cols, mapping, file_year)
             columns_printed = True
 
-        if not codigo_col or not nome_col or not co_uf_col:
+        if not mapping['codigo'] or not mapping['nome'] or not mapping['co_uf']:
             print("Cannot identify essential columns in CSV chunk; skipping chunk.")
+            if not dry_run:
+                manifest_checkpoint(cursor, content_hash, chunk_end, processed_total)
+                conn.commit()
             continue
 
         # Filter only Nordeste (CO_UF 21..29) - desabilitado por padrão
         if filter_nordeste:
-            try:
-                chunk[co_uf_col] = pd.to_numeric(chunk[co_uf_col], errors='coerce')
-                chunk = chunk[chunk[co_uf_col].between(21, 29, inclusive='both')]
-            except Exception:
-                chunk = chunk[chunk[co_uf_col].astype(str).str.startswith(tuple(str(x) for x in range(21, 30)))]
-
-        insert_rows = []
-        insert_rows_year = []
-
-        def safe_int(val):
-            """Converte valor para inteiro de forma segura."""
-            if pd.isna(val) or val == '' or val is None:
-                return 0
-            try:
-                return int(float(str(val).strip()))
-            except (ValueError, TypeError):
-                return 0
-
-        def safe_str(val):
-            """Converte valor para string de forma segura."""
-            if pd.isna(val) or val is None:
-                return ''
-            return str(val).strip()
-
-        for idx, row in chunk.iterrows():
-            codigo = row.get(codigo_col)
-            if pd.isna(codigo):
-                skipped_total += 1
-                continue
-
-            # Detectar ano do censo
-            ano_censo = None
-            if nu_ano_censo_col and not pd.isna(row.get(nu_ano_censo_col)):
-                ano_censo = safe_int(row.get(nu_ano_censo_col))
-            if not ano_censo or ano_censo < 2022 or ano_censo > 2024:
-                ano_censo = file_year
-
-            # Verificar duplicação na tabela tb_instituicao
-            cursor.execute("SELECT id FROM tb_instituicao WHERE codigo = ?", (str(codigo),))
-            exists_instituicao = cursor.fetchone() is not None
-
-            # Verificar duplicação na tabela tb_instituicao_year
-            cursor.execute("SELECT id FROM tb_instituicao_year WHERE co_entidade = ? AND nu_ano_censo = ?", (str(codigo), ano_censo))
-            exists_year = cursor.fetchone() is not None
-
-            nome = safe_str(row.get(nome_col))
-            co_uf_val = safe_int(row.get(co_uf_col))
-            no_uf_val = safe_str(row.get(no_uf_col)) if no_uf_col else ''
-            sg_uf_val = safe_str(row.get(sg_uf_col)) if sg_uf_col else ''
-            co_mun_val = safe_int(row.get(co_municipio_col))
-            no_mun_val = safe_str(row.get(no_municipio_col)) if no_municipio_col else ''
-            co_mesorregiao_val = safe_int(row.get(co_mesorregiao_col)) if co_mesorregiao_col else 0
-            no_mesorregiao_val = safe_str(row.get(no_mesorregiao_col)) if no_mesorregiao_col else ''
-            co_microrregiao_val = safe_int(row.get(co_microrregiao_col)) if co_microrregiao_col else 0
-            no_microrregiao_val = safe_str(row.get(no_microrregiao_col)) if no_microrregiao_col else ''
-            co_regiao_val = safe_int(row.get(co_regiao_col)) if co_regiao_col else 0
-            no_regiao_val = safe_str(row.get(no_regiao_col)) if no_regiao_col else ''
-
-            qt_mat_bas = safe_int(row.get(qt_mat_bas_col)) if qt_mat_bas_col else 0
-            qt_mat_prof = safe_int(row.get(qt_mat_prof_col)) if qt_mat_prof_col else 0
-            qt_mat_eja = safe_int(row.get(qt_mat_eja_col)) if qt_mat_eja_col else 0
-            qt_mat_esp = safe_int(row.get(qt_mat_esp_col)) if qt_mat_esp_col else 0
-            qt_mat_fund = safe_int(row.get(qt_mat_fund_col)) if qt_mat_fund_col else 0
-            qt_mat_inf = safe_int(row.get(qt_mat_inf_col)) if qt_mat_inf_col else 0
-            qt_mat_med = safe_int(row.get(qt_mat_med_col)) if qt_mat_med_col else 0
-            qt_mat_zr_na = safe_int(row.get(qt_mat_zr_na_col)) if qt_mat_zr_na_col else 0
-            qt_mat_zr_rur = safe_int(row.get(qt_mat_zr_rur_col)) if qt_mat_zr_rur_col else 0
-            qt_mat_zr_urb = safe_int(row.get(qt_mat_zr_urb_col)) if qt_mat_zr_urb_col else 0
-
-            # Calcular qt_mat_total
-            if qt_mat_total_col and not pd.isna(row.get(qt_mat_total_col)):
-                qt_mat_total = safe_int(row.get(qt_mat_total_col))
-            else:
-                # Calcular total somando os campos de matrícula
-                qt_mat_total = qt_mat_bas + qt_mat_prof + qt_mat_eja + qt_mat_esp + qt_mat_fund + qt_mat_inf + qt_mat_med
-
-            # Inserir na tabela tb_instituicao (compatibilidade)
-            if not exists_instituicao:
-                insert_rows.append((str(codigo), nome, co_uf_val, no_uf_val, sg_uf_val, co_mun_val, no_mun_val, qt_mat_bas, qt_mat_prof, qt_mat_esp))
-
-            # Inserir na tabela tb_instituicao_year (ranking por ano)
-            if not exists_year and ano_censo:
-                insert_rows_year.append((
-                    str(codigo), nome, co_uf_val, no_uf_val, sg_uf_val, 
-                    co_mun_val, no_mun_val, co_mesorregiao_val, no_mesorregiao_val,
-                    co_microrregiao_val, no_microrregiao_val, co_regiao_val, no_regiao_val,
-                    ano_censo, qt_mat_bas, qt_mat_prof, qt_mat_eja, qt_mat_esp,
-                    qt_mat_fund, qt_mat_inf, qt_mat_med, qt_mat_zr_na, qt_mat_zr_rur, qt_mat_zr_urb, qt_mat_total
-                ))
+            chunk = filter_chunk_nordeste(chunk, mapping['co_uf'])
+
+        if legacy:
+            insert_rows, insert_rows_year, skipped = transform_chunk_rows(chunk, mapping, file_year, cursor)
+        else:
+            transformed, skipped = transform_chunk(chunk, mapping, file_year)
+            insert_rows, insert_rows_year = select_new_rows(transformed, existing_codigos, existing_year_keys)
+        skipped_total += skipped
 
         if insert_rows and not dry_run:
             before = conn.total_changes
-            cursor.executemany("""
-                INSERT OR IGNORE INTO tb_instituicao
-                (codigo, nome, co_uf, no_uf, sg_uf, co_municipio, no_municipio, qt_mat_bas, qt_mat_prof, qt_mat_esp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, insert_rows)
-            conn.commit()
+            cursor.executemany(INSERT_INST_SQL, insert_rows)
             after = conn.total_changes
             inserted_total += (after - before)
 
         if insert_rows_year and not dry_run:
-            cursor.executemany("""
-                INSERT OR IGNORE INTO tb_instituicao_year
-                (co_entidade, no_entidade, co_uf, no_uf, sg_uf, co_municipio, no_municipio,
-                 co_mesorregiao, no_mesorregiao, co_microrregiao, no_microrregiao, co_regiao, no_regiao,
-                 nu_ano_censo, qt_mat_bas, qt_mat_prof, qt_mat_eja, qt_mat_esp, qt_mat_fund, qt_mat_inf, qt_mat_med,
-                 qt_mat_zr_na, qt_mat_zr_rur, qt_mat_zr_urb, qt_mat_total)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, insert_rows_year)
+            before = conn.total_changes
+            cursor.executemany(INSERT_YEAR_SQL, insert_rows_year)
+            inserted_year_total += (conn.total_changes - before)
+
+        # Linhas do chunk, versão dos dados e checkpoint entram no mesmo commit
+        if not dry_run:
+            bump_chunk_versions(cursor, insert_rows, insert_rows_year)
+            manifest_checkpoint(cursor, content_hash, chunk_end, processed_total)
             conn.commit()
 
         chunk_idx += 1
-        print(f"Chunk {chunk_idx}: processed={len(chunk)}, inserted_inst={len(insert_rows)}, inserted_year={len(insert_rows_year)}")
-
+        chunk_elapsed = time.perf_counter() - chunk_started
+        print(f"Chunk {chunk_idx}: processed={len(chunk)}, inserted_inst={len(insert_rows)}, inserted_year={len(insert_rows_year)}, "
+              f"{len(chunk) / chunk_elapsed if chunk_elapsed else 0:,.0f} rows/s")
+
+    elapsed = time.perf_counter() - started
+
+    # Uma execução anterior pode ter gravado linhas e parado antes (ou durante) os refreshes:
+    # ao retomar, recalcula tudo mesmo sem linhas novas. O manifesto só vira `done` depois
+    # dos refreshes, senão uma falha neles deixaria o arquivo "importado" com derivados velhos.
+    if not dry_run:
+        resumed = bool(byte_offset)
+        refresh_derived(db_path, bool(inserted_total) or resumed, bool(inserted_year_total) or resumed)
+        manifest_finish(conn, content_hash)
     conn.close()
+
     print(f"\nFinished!")
+    print(f"Mode: {'legacy (iterrows)' if legacy else 'vectorized'}")
     print(f"Processed rows: {processed_total}")
     print(f"Inserted: {inserted_total}")
     print(f"Skipped: {skipped_total}")
+    print(f"Elapsed: {elapsed:.2f}s ({(processed_total - row_offset) / elapsed if elapsed else 0:,.0f} rows/s)")
+
+
+# ===== Ingestão paralela de vários arquivos (um único writer) =====
+
+_batch_queue = None
+
+
+def _init_parser(batch_queue):
+    global _batch_queue
+    _batch_queue = batch_queue
+
+
+def _parse_file(csv_file, db_path, chunk_size, sep, encoding, filter_nordeste, checkpoint):
+    """Worker do pool: lê e transforma um CSV a partir do checkpoint, enviando os lotes
+    (com o novo checkpoint) para o writer."""
+    content_hash, byte_offset, row_offset = checkpoint
+    started = time.perf_counter()
+    file_year = detect_file_year(csv_file)
+
+    # Conexão somente leitura, apenas para o anti-join inicial (WAL: não bloqueia o writer)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    existing_codigos, existing_year_keys = load_existing_keys(conn.cursor())
+    conn.close()
+
+    processed = 0
+    skipped = 0
+    for chunk, chunk_end in read_csv_chunks(csv_file, chunk_size, sep, encoding, byte_offset):
+        processed += len(chunk)
+        mapping = map_columns(chunk.columns.tolist())
+        if not mapping['codigo'] or not mapping['nome'] or not mapping['co_uf']:
+            print(f"{csv_file}: cannot identify essential columns in CSV chunk; skipping chunk.")
+            _batch_queue.put(([], [], (content_hash, chunk_end, row_offset + processed)))
+            continue
+        if filter_nordeste:
+            chunk = filter_chunk_nordeste(chunk, mapping['co_uf'])
+
+        transformed, chunk_skipped = transform_chunk(chunk, mapping, file_year)
+        skipped += chunk_skipped
+        insert_rows, insert_rows_year = select_new_rows(transformed, existing_codigos, existing_year_keys)
+        # put() bloqueia quando a fila está cheia: o writer dita o ritmo e a memória fica limitada
+        _batch_queue.put((insert_rows, insert_rows_year, (content_hash, chunk_end, row_offset + processed)))
+
+    elapsed = time.perf_counter() - started
+    return {'csv': csv_file, 'processed': processed, 'skipped': skipped, 'elapsed': elapsed}
+
+
+def _writer_main(db_path, batch_queue, result_queue, fast):
+    """Processo writer: único dono da conexão de escrita com o SQLite."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL;")
+    if fast:
+        conn.execute("PRAGMA synchronous = OFF;")
+        conn.execute("PRAGMA temp_store = MEMORY;")
+    cursor = conn.cursor()
+
+    inserted = 0
+    inserted_year = 0
+    while True:
+        batch = batch_queue.get()
+        if batch is None:
+            break
+        insert_rows, insert_rows_year, checkpoint = batch
+        before = conn.total_changes
+        if insert_rows:
+            cursor.executemany(INSERT_INST_SQL, insert_rows)
+        inserted += conn.total_changes - before
+        before = conn.total_changes
+        if insert_rows_year:
+            cursor.executemany(INSERT_YEAR_SQL, insert_rows_year)
+        inserted_year += conn.total_changes - before
+        bump_chunk_versions(cursor, insert_rows, insert_rows_year)
+        manifest_checkpoint(cursor, *checkpoint)
+        conn.commit()
+
+    conn.close()
+    result_queue.put({'inserted': inserted, 'inserted_year': inserted_year})
+
+
+def migrate_many(csv_files, db_path: str, chunk_size: int = DEFAULT_CHUNK, workers=None,
+                 filter_nordeste=False, sep=';', fast=False, encoding='latin1',
+                 queue_size=DEFAULT_QUEUE_SIZE, force=False):
+    """Importa vários CSVs em paralelo: N processos fazem parsing/transformação e um
+    único processo escreve no SQLite, evitando `database is locked`."""
+    for csv_file in csv_files:
+        if not os.path.exists(csv_file):
+            raise FileNotFoundError(f"CSV file not found: {csv_file}")
+
+    prepare_database(db_path)
+
+    # WAL é persistente no arquivo: os parsers leem as chaves existentes sem bloquear o writer
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL;")
+    checkpoints = {}
+    for csv_file in csv_files:
+        content_hash, byte_offset, row_offset, status = manifest_start(conn, csv_file, force)
+        if status == MANIFEST_DONE:
+            print(f"{csv_file} already imported (hash {content_hash}); skipping. Use --force to re-import.")
+        elif content_hash not in {c[0] for c in checkpoints.values()}:
+            if byte_offset:
+                print(f"Resuming {csv_file} from row {row_offset} (byte {byte_offset})")
+            checkpoints[csv_file] = (content_hash, byte_offset, row_offset)
+    conn.close()
+
+    csv_files = list(checkpoints)
+    if not csv_files:
+        print("Nothing to import.")
+        return {'inserted': 0, 'inserted_year': 0}
+    workers = workers or min(len(csv_files), os.cpu_count() or 1)
+
+    batch_queue = multiprocessing.Queue(maxsize=queue_size)
+    result_queue = multiprocessing.Queue()
+    writer = multiprocessing.Process(target=_writer_main, args=(db_path, batch_queue, result_queue, fast))
+    writer.start()
+
+    started = time.perf_counter()
+    file_stats = []
+    pool = multiprocessing.Pool(workers, initializer=_init_parser, initargs=(batch_queue,))
+    try:
+        pending = [pool.apply_async(_parse_file, (f, db_path, chunk_size, sep, encoding, filter_nordeste,
+                                                  checkpoints[f]))
+                   for f in csv_files]
+        for result in pending:
+            # Se o writer morrer, os parsers ficariam bloqueados para sempre na fila cheia
+            while not result.ready():
+                if not writer.is_alive():
+                    raise RuntimeError(f"Writer process exited unexpectedly (exit code {writer.exitcode})")
+                result.wait(1)
+            stats = result.get()
+            file_stats.append(stats)
+            print(f"Parsed {stats['csv']}: {stats['processed']} rows in {stats['elapsed']:.2f}s")
+        # close/join (e não terminate): os parsers só saem depois de esvaziar o buffer da fila
+        pool.close()
+        pool.join()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        if writer.is_alive():
+            batch_queue.put(None)
+            writer.join()
+
+    totals = result_queue.get() if writer.exitcode == 0 else {'inserted': 0, 'inserted_year': 0}
+    elapsed = time.perf_counter() - started
+    processed_total = sum(s['processed'] for s in file_stats)
+
+    if writer.exitcode == 0:
+        # Retomada: linhas de uma execução anterior ainda podem estar sem refresh (ver migrate_csv)
+        resumed = any(byte_offset for _, byte_offset, _ in checkpoints.values())
+        refresh_derived(db_path, bool(totals['inserted']) or resumed, bool(totals['inserted_year']) or resumed)
+        # Todos os lotes foram gravados e os derivados recalculados: os arquivos lidos até o fim estão concluídos
+        conn = sqlite3.connect(db_path)
+        for stats in file_stats:
+            manifest_finish(conn, checkpoints[stats['csv']][0])
+        conn.close()
+
+    print(f"\nFinished!")
+    print(f"Mode: parallel ({workers} parser processes, 1 writer)")
+    print(f"Processed rows: {processed_total}")
+    print(f"Inserted: {totals['inserted']} (year table: {totals['inserted_year']})")
+    print(f"Skipped: {sum(s['skipped'] for s in file_stats)}")
+    print(f"Elapsed: {elapsed:.2f}s ({processed_total / elapsed if elapsed else 0:,.0f} rows/s)")
+    if writer.exitcode != 0:
+        raise RuntimeError(f"Writer process failed with exit code {writer.exitcode}")
+    return totals
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Migrate CSV microdados (Censo Escolar 2022-2024) to SQLite using pandas chunked read')
 
-    parser.add_argument('--csv', required=True, help='Path to CSV file with microdados')
+    parser.add_argument('--csv', required=True, nargs='+', help='Path to CSV file(s) with microdados')
     parser.add_argument('--db', default=DEFAULT_DB, help='SQLite database path')
     parser.add_argument('--chunk', default=DEFAULT_CHUNK, type=int, help='Chunk size')
     parser.add_argument('--sep', default=';', help='CSV separator (default ;)')
@@ -328,16 +788,39 @@ if __name__ == '__main__':
     parser.add_argument('--dry-run', action='store_true', help='No DB insert, only preview')
     parser.add_argument('--filter-nordeste', dest='filter_nordeste', action='store_true',
                         help='Filter only CO_UF=21..29 (Nordeste). Default: include all Brazil')
+    parser.add_argument('--legacy', action='store_true',
+                        help='Use the old row-by-row transform (iterrows + per-row SELECTs) for comparison')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Parser processes for multi-file ingest (default: one per file, up to CPU count)')
+    parser.add_argument('--force', action='store_true',
+                        help='Ignore the import manifest and re-read the file(s) from the start')
 
     args = parser.parse_args()
 
-    migrate_csv(
-        args.csv,
-        args.db,
-        chunk_size=args.chunk,
-        filter_nordeste=args.filter_nordeste,
-        sep=args.sep,
-        fast=args.fast,
-        dry_run=args.dry_run,
-        encoding=args.encoding
-    )
+    if len(args.csv) > 1 or args.workers > 1:
+        if args.legacy or args.dry_run:
+            parser.error('--legacy/--dry-run are only available for single-file ingest')
+        migrate_many(
+            args.csv,
+            args.db,
+            chunk_size=args.chunk,
+            workers=args.workers or None,
+            filter_nordeste=args.filter_nordeste,
+            sep=args.sep,
+            fast=args.fast,
+            encoding=args.encoding,
+            force=args.force
+        )
+    else:
+        migrate_csv(
+            args.csv[0],
+            args.db,
+            chunk_size=args.chunk,
+            filter_nordeste=args.filter_nordeste,
+            sep=args.sep,
+            fast=args.fast,
+            dry_run=args.dry_run,
+            encoding=args.encoding,
+            legacy=args.legacy,
+            force=args.force
+        )
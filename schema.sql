@@ -53,6 +53,78 @@ CREATE TABLE IF NOT EXISTS tb_instituicao_year (
 -- Adicionando restrição de unicidade para evitar duplicação por código
 CREATE UNIQUE INDEX IF NOT EXISTS idx_tb_instituicao_codigo ON tb_instituicao(codigo);
 
+-- Filtros da listagem paginada (a ordem por id vem de brinde: rowid é o sufixo do índice)
+CREATE INDEX IF NOT EXISTS idx_tb_instituicao_co_uf ON tb_instituicao(co_uf);
+CREATE INDEX IF NOT EXISTS idx_tb_instituicao_co_municipio ON tb_instituicao(co_municipio);
+
 -- Índices para melhorar performance do ranking
 CREATE INDEX IF NOT EXISTS idx_instituicao_year_ano ON tb_instituicao_year(nu_ano_censo);
 CREATE INDEX IF NOT EXISTS idx_instituicao_year_total ON tb_instituicao_year(qt_mat_total DESC);
+
+-- Manifesto das importações de CSV (migrate_csv_to_sqlite.py): checkpoint por chunk
+CREATE TABLE IF NOT EXISTS tb_import_manifest (
+        content_hash TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        byte_offset INTEGER NOT NULL DEFAULT 0,
+        row_offset INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL,
+        started_at TEXT,
+        updated_at TEXT
+);
+
+-- Agregações geográficas materializadas (helpers/rollups.py): uma linha por nível
+-- (uf, mesorregiao, microrregiao, municipio), ano e código; nu_ano_censo = 0 é o cadastro
+-- (tb_instituicao), mantido de forma incremental pelas rotas de escrita
+CREATE TABLE IF NOT EXISTS tb_agregado (
+        nivel TEXT NOT NULL,
+        nu_ano_censo INTEGER NOT NULL,
+        codigo INTEGER NOT NULL,
+        nome TEXT,
+        qt_escolas INTEGER NOT NULL DEFAULT 0,
+        qt_mat_bas INTEGER,
+        qt_mat_prof INTEGER,
+        qt_mat_eja INTEGER,
+        qt_mat_esp INTEGER,
+        qt_mat_fund INTEGER,
+        qt_mat_inf INTEGER,
+        qt_mat_med INTEGER,
+        qt_mat_zr_na INTEGER,
+        qt_mat_zr_rur INTEGER,
+        qt_mat_zr_urb INTEGER,
+        qt_mat_total INTEGER,
+        PRIMARY KEY (nivel, nu_ano_censo, codigo)
+) WITHOUT ROWID;
+
+-- Busca textual de instituições (helpers/search.py): rowid = tb_instituicao.id; o tokenizer
+-- ignora acentos e maiúsculas. Reconstruída em bloco pelas migrações, mantida pelas rotas de escrita
+CREATE VIRTUAL TABLE IF NOT EXISTS tb_instituicao_fts USING fts5(
+        nome, no_municipio, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+
+-- Tarefas em segundo plano (helpers/jobs.py): estado compartilhado entre os workers; o
+-- índice único parcial permite uma só tarefa ativa por chave (ex.: ["ranking", 2024]); o worker
+-- dono renova heartbeat_at e, com o lease expirado, a tarefa ativa é tratada como órfã
+CREATE TABLE IF NOT EXISTS tb_job (
+        id TEXT PRIMARY KEY,
+        chave TEXT NOT NULL,
+        status TEXT NOT NULL,
+        progresso TEXT NOT NULL DEFAULT '{}',
+        resultado TEXT,
+        erro TEXT,
+        pid INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        heartbeat_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tb_job_ativa ON tb_job(chave) WHERE status IN ('pending', 'running');
+
+-- Versão dos dados por tabela (helpers/data_version.py): incrementada na transação de cada
+-- escrita, dá os ETags do GET condicional; `_epoch` distingue um banco recriado do anterior
+CREATE TABLE IF NOT EXISTS tb_data_version (
+        tabela TEXT PRIMARY KEY,
+        versao INTEGER NOT NULL DEFAULT 0,
+        atualizado_em INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO tb_data_version (tabela, versao) VALUES ('_epoch', abs(random() % 4611686018427387904));
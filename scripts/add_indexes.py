@@ -3,8 +3,13 @@
 Script para adicionar índices ao banco de dados SQLite para melhorar performance.
 Otimiza queries do endpoint ranking e paginação.
 """
+import os
 import sqlite3
 import logging
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.ranking_sql import GEO_FILTERS, RANKING_METRICS, explain_ranking_query, ranking_indexes
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger(__name__)
@@ -27,9 +32,10 @@ def add_indexes():
         
         # Índices para tabela tb_instituicao_year (ranking)
         ("idx_tb_inst_year_ano", "tb_instituicao_year", "nu_ano_censo"),
-        ("idx_tb_inst_year_ano_matriculas", "tb_instituicao_year", "nu_ano_censo, qt_mat_total DESC"),
         ("idx_tb_inst_year_co_entidade", "tb_instituicao_year", "co_entidade"),
     ]
+    # Índices compostos do ranking: (ano, [filtro geográfico,] métrica DESC)
+    indexes += [(name, "tb_instituicao_year", columns) for name, columns in ranking_indexes()]
     
     for idx_name, table, columns in indexes:
         try:
@@ -50,9 +56,28 @@ def add_indexes():
     conn.close()
     logger.info("Índices adicionados com sucesso!")
 
+
+def verify_ranking_plans():
+    """Confere via EXPLAIN QUERY PLAN que cada ranking suportado dispensa ordenação."""
+    conn = sqlite3.connect(DATABASE)
+    ok = True
+    for metric in RANKING_METRICS:
+        for geo in (None,) + GEO_FILTERS:
+            filters = {geo: 1} if geo else {}
+            plan = explain_ranking_query(conn, metric, filters)
+            if any('TEMP B-TREE' in step for step in plan):
+                ok = False
+                logger.warning(f"Ranking {metric} / {geo or 'Brasil'} precisa ordenar: {plan}")
+    conn.close()
+    if ok:
+        logger.info("Todos os rankings usam varredura ordenada de índice (sem TEMP B-TREE)")
+    return ok
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("CRIAÇÃO DE ÍNDICES - BANCO DE DADOS CENSO ESCOLAR")
     print("="*60 + "\n")
     add_indexes()
+    if not verify_ranking_plans():
+        sys.exit(1)
     print("\n✓ Processo concluído!\n")
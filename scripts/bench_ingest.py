@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+"""
+Benchmark dos caminhos de ingestão dos microdados, sobre CSVs sintéticos
+(scripts/gen_microdados.py) ou reais:
+
+    migrate           migrate_csv_to_sqlite.migrate_csv, um arquivo por vez (vetorizado)
+    migrate-legacy    o mesmo com legacy=True (iterrows + SELECT por linha)
+    migrate-parallel  migrate_csv_to_sqlite.migrate_many (parsers em processos + 1 writer)
+    simple            scripts/simple_migrate.migrate (csv.reader, só tb_instituicao)
+    ranking-job       carga sob demanda do ranking: GET /instituicoesensino/ranking/<ano> sem
+                      dados agenda _populate_ranking_year, acompanhada até terminar
+
+Cada caminho roda num processo próprio sobre um banco novo (schema.sql aplicado), para
+que o pico de memória (ru_maxrss, incluindo os processos filhos) seja só dele. O relatório
+traz linhas/s (linhas dos CSVs / tempo total), pico de RSS e tamanho final do banco, e o
+resultado vai para um JSON (--output).
+
+Uso (na raiz do projeto):
+    python scripts/bench_ingest.py --rows 50000 --anos 2022 2023 2024
+    python scripts/bench_ingest.py --csv-dir bench_data --paths migrate migrate-parallel
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows: sem ru_maxrss
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+PATHS = ('migrate', 'migrate-legacy', 'migrate-parallel', 'simple', 'ranking-job')
+DEFAULT_PATHS = ('migrate', 'migrate-parallel', 'simple', 'ranking-job')
+JOB_POLL_INTERVAL = 0.2
+
+
+def count_rows(csv_files):
+    total = 0
+    for csv_file in csv_files:
+        with open(csv_file, 'rb') as f:
+            total += sum(buf.count(b'\n') for buf in iter(lambda: f.read(1 << 20), b'')) - 1
+    return total
+
+
+def fresh_db(db_path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    conn = sqlite3.connect(db_path)
+    with open(os.path.join(ROOT, 'schema.sql'), encoding='utf-8') as f:
+        conn.executescript(f.read())
+    conn.close()
+
+
+def peak_rss_mb(who):
+    if resource is None:
+        return None
+    rss = resource.getrusage(who).ru_maxrss
+    # KB no Linux, bytes no macOS
+    return round(rss / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+# ===== Caminhos (executados no processo filho) =====
+
+def run_migrate(csv_files, db_path, legacy=False):
+    import migrate_csv_to_sqlite
+    for csv_file in csv_files:
+        migrate_csv_to_sqlite.migrate_csv(csv_file, db_path, legacy=legacy)
+
+
+def run_migrate_parallel(csv_files, db_path):
+    import migrate_csv_to_sqlite
+    migrate_csv_to_sqlite.migrate_many(csv_files, db_path)
+
+
+def run_simple(csv_files, db_path):
+    import simple_migrate
+    for csv_file in csv_files:
+        simple_migrate.migrate(csv_file, db_path, filter_nordeste=False)
+
+
+def run_ranking_job(csv_files, db_path):
+    """Dispara a carga sob demanda do ranking para cada ano, como um cliente da API faria."""
+    # app.py lê `censoescolar.db` e `microdados_ed_basica_*.csv` do diretório atual
+    workdir = os.path.dirname(db_path)
+    for csv_file in csv_files:
+        link = os.path.join(workdir, os.path.basename(csv_file))
+        if not os.path.exists(link):
+            os.symlink(os.path.abspath(csv_file), link)
+    os.chdir(workdir)
+    from app import app
+    client = app.test_client()
+    anos = sorted({int(y) for y in (os.path.basename(c).rsplit('_', 1)[-1].split('.')[0] for c in csv_files)
+                   if y.isdigit()})
+    status_urls = []
+    for ano in anos:
+        resp = client.get(f'/instituicoesensino/ranking/{ano}')
+        if resp.status_code == 202:
+            status_urls.append(resp.json['status_url'])
+    for url in status_urls:
+        while True:
+            job = client.get(url).json
+            if job['status'] not in ('pending', 'running'):
+                if job['status'] != 'done':
+                    raise RuntimeError(f"Tarefa {job['job_id']} terminou com {job['status']}: {job.get('error')}")
+                break
+            time.sleep(JOB_POLL_INTERVAL)
+
+
+def child_main(path, csv_files, db_path, result_file):
+    started = time.perf_counter()
+    if path == 'migrate':
+        run_migrate(csv_files, db_path)
+    elif path == 'migrate-legacy':
+        run_migrate(csv_files, db_path, legacy=True)
+    elif path == 'migrate-parallel':
+        run_migrate_parallel(csv_files, db_path)
+    elif path == 'simple':
+        run_simple(csv_files, db_path)
+    elif path == 'ranking-job':
+        run_ranking_job(csv_files, db_path)
+    elapsed = time.perf_counter() - started
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    tables = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+              for t in ('tb_instituicao', 'tb_instituicao_year', 'tb_agregado')}
+    conn.close()
+    columnar = db_path[:-3] + '.columnar' if db_path.endswith('.db') else db_path + '.columnar'
+    with open(result_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'elapsed_s': round(elapsed, 3),
+            'peak_rss_mb': peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+            'peak_rss_children_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+            'db_mb': round(os.path.getsize(db_path) / 2**20, 2),
+            'columnar_mb': round(dir_size(columnar) / 2**20, 2) if os.path.isdir(columnar) else 0,
+            'tables': tables,
+        }, f)
+
+
+# ===== Orquestração =====
+
+def bench_path(path, csv_files, rows, args):
+    workdir = tempfile.mkdtemp(prefix=f"bench_ingest_{path}_", dir=args.work_dir)
+    db_path = os.path.join(workdir, 'censoescolar.db')
+    result_file = os.path.join(workdir, 'result.json')
+    fresh_db(db_path)
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', path, '--db', db_path,
+           '--result', result_file, '--csv', *[os.path.abspath(c) for c in csv_files]]
+    # migrate_csv_to_sqlite lê schema.sql do diretório atual
+    proc = subprocess.run(cmd, cwd=ROOT, stdout=None if args.verbose else subprocess.DEVNULL)
+    try:
+        if proc.returncode != 0:
+            return {'path': path, 'error': f"exit code {proc.returncode}"}
+        with open(result_file, encoding='utf-8') as f:
+            result = json.load(f)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    result['rows_per_s'] = round(rows / result['elapsed_s'], 1) if result['elapsed_s'] else None
+    return {'path': path, **result}
+
+
+def print_report(results, rows):
+    print(f"\nLinhas nos CSVs: {rows:,}")
+    header = (f"{'caminho':<18} {'tempo (s)':>10} {'linhas/s':>11} {'RSS (MB)':>9} {'RSS filhos':>11} "
+              f"{'banco (MB)':>11} {'inst':>9} {'inst_year':>10}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        if 'error' in r:
+            print(f"{r['path']:<18} ERRO: {r['error']}")
+            continue
+        print(f"{r['path']:<18} {r['elapsed_s']:>10.2f} {r['rows_per_s']:>11,.0f} {r['peak_rss_mb'] or 0:>9.1f} "
+              f"{r['peak_rss_children_mb'] or 0:>11.1f} {r['db_mb']:>11.1f} "
+              f"{r['tables']['tb_instituicao']:>9,} {r['tables']['tb_instituicao_year']:>10,}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark dos caminhos de ingestão de CSV')
+    parser.add_argument('--csv-dir', help='diretório com microdados_ed_basica_*.csv (senão, gera sintéticos)')
+    parser.add_argument('--rows', type=int, default=50000, help='escolas por ano nos CSVs sintéticos')
+    parser.add_argument('--anos', type=int, nargs='+', default=[2022, 2023, 2024])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=list(DEFAULT_PATHS))
+    parser.add_argument('--work-dir', default=None, help='onde criar os bancos temporários')
+    parser.add_argument('--keep', action='store_true', help='mantém os bancos gerados')
+    parser.add_argument('--verbose', action='store_true', help='mostra a saída de cada caminho')
+    parser.add_argument('--output', '-o', default='bench_ingest.json')
+    # Execução interna de um caminho (processo filho)
+    parser.add_argument('--child', choices=PATHS, help=argparse.SUPPRESS)
+    parser.add_argument('--csv', nargs='+', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args.child, args.csv, args.db, args.result)
+        sys.exit(0)
+
+    data_dir = args.csv_dir
+    if data_dir is None:
+        from gen_microdados import generate
+        data_dir = tempfile.mkdtemp(prefix='bench_ingest_csv_', dir=args.work_dir)
+        generate(data_dir, args.anos, args.rows, seed=args.seed)
+    csv_files = sorted(glob.glob(os.path.join(data_dir, 'microdados_ed_basica_*.csv')))
+    if not csv_files:
+        raise SystemExit(f"Nenhum microdados_ed_basica_*.csv em {data_dir}")
+    rows = count_rows(csv_files)
+
+    results = []
+    for path in args.paths:
+        print(f"Rodando {path}...", flush=True)
+        results.append(bench_path(path, csv_files, rows, args))
+    print_report(results, rows)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'meta': {'started_at': datetime.now().isoformat(timespec='seconds'), 'csv_files': csv_files,
+                     'rows': rows, 'python': sys.version.split()[0]},
+            'results': results,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"Resultado gravado em {args.output}")
+    if args.csv_dir is None and not args.keep:
+        shutil.rmtree(data_dir, ignore_errors=True)
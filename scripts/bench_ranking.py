@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Benchmark do ranking: consulta SQL (índices compostos) x motor NumPy sobre o snapshot
+colunar. Para cada métrica e filtro geográfico mede o tempo médio por consulta (montando
+os dicts da resposta nos dois casos) e confere que os dois caminhos devolvem o mesmo top-N.
+
+Uso:
+    python scripts/bench_ranking.py --db censoescolar.db --ano 2024 --limit 10 --repeat 50
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.columnar import ColumnarSnapshot, columnar_dir
+from helpers.ranking_engine import rank, ranked_rows
+from helpers.ranking_sql import GEO_FILTERS, RANKING_COLUMNS, RANKING_METRICS, assign_ranks, build_ranking_query
+
+DATABASE = 'censoescolar.db'
+
+
+def sql_ranking(conn, ano, metric, filters, limit):
+    sql, params = build_ranking_query(metric, filters)
+    result = [dict(zip(RANKING_COLUMNS, r)) for r in conn.execute(sql, (ano, *params, limit)).fetchall()]
+    for item, position in zip(result, assign_ranks([item[metric] for item in result])):
+        item['nu_ranking'] = position
+    return result
+
+
+def timed(fn, repeat):
+    fn()  # aquecimento (page cache, mmap, cache de statements)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1e6, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compara o ranking SQL com o motor NumPy')
+    parser.add_argument('--db', default=DATABASE, help='Caminho do banco SQLite')
+    parser.add_argument('--ano', type=int, default=2024, help='Ano do censo')
+    parser.add_argument('--limit', type=int, default=10, help='Tamanho do top-N')
+    parser.add_argument('--repeat', type=int, default=50, help='Repetições por combinação')
+    args = parser.parse_args()
+
+    snapshot = ColumnarSnapshot(columnar_dir(args.db))
+    if not snapshot.has_year(args.ano):
+        sys.exit(f"Snapshot colunar sem o ano {args.ano}; rode scripts/export_columnar.py")
+    conn = sqlite3.connect(args.db)
+
+    # Filtros de exemplo: o código mais frequente de cada coluna geográfica
+    samples = {}
+    for geo in GEO_FILTERS:
+        row = conn.execute(f"SELECT {geo} FROM tb_instituicao_year WHERE nu_ano_censo = ? AND {geo} IS NOT NULL "
+                           f"GROUP BY {geo} ORDER BY COUNT(*) DESC LIMIT 1", (args.ano,)).fetchone()
+        if row:
+            samples[geo] = row[0]
+
+    # "top-k" mede só a seleção das linhas no NumPy, sem montar os dicts da resposta
+    print(f"{'métrica':<16}{'filtro':<18}{'SQL (us)':>12}{'NumPy (us)':>12}{'top-k (us)':>12}{'x':>8}  igual")
+    total_sql = total_np = 0.0
+    mismatches = 0
+    for metric in RANKING_METRICS:
+        for geo in (None,) + tuple(samples):
+            filters = {geo: samples[geo]} if geo else {}
+            t_sql, r_sql = timed(lambda: sql_ranking(conn, args.ano, metric, filters, args.limit), args.repeat)
+            t_np, r_np = timed(lambda: rank(snapshot, args.ano, metric, filters, args.limit), args.repeat)
+            t_topk, _ = timed(lambda: ranked_rows(snapshot, args.ano, metric, filters, args.limit), args.repeat)
+            same = r_sql == r_np
+            mismatches += not same
+            total_sql += t_sql
+            total_np += t_np
+            print(f"{metric:<16}{geo or 'Brasil':<18}{t_sql:>12.1f}{t_np:>12.1f}{t_topk:>12.1f}{t_sql / t_np:>8.1f}  "
+                  f"{'sim' if same else 'NAO'}")
+    conn.close()
+
+    print(f"\nTotal: SQL {total_sql / 1000:.1f} ms, NumPy {total_np / 1000:.1f} ms ({total_sql / total_np:.1f}x)")
+    if mismatches:
+        sys.exit(f"{mismatches} combinações com resultados diferentes")
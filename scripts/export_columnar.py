@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""
+Script para exportar tb_instituicao_year como snapshot colunar (.npy por ano e coluna).
+A API abre o snapshot com mmap; as migrações já o regravam ao final da importação.
+"""
+import argparse
+import os
+import logging
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.columnar import columnar_dir, export_snapshot
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logger = logging.getLogger(__name__)
+
+DATABASE = 'censoescolar.db'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exporta tb_instituicao_year para o snapshot colunar')
+    parser.add_argument('--db', default=DATABASE, help='Caminho do banco SQLite')
+    parser.add_argument('--out', default=None, help='Diretório do snapshot (padrão: <banco>.columnar)')
+    args = parser.parse_args()
+
+    out = args.out or columnar_dir(args.db)
+    manifest = export_snapshot(args.db, out)
+    logger.info(f"Snapshot {manifest['version']} gravado em {out}")
+    for ano, linhas in manifest['years'].items():
+        logger.info(f"  {ano}: {linhas} linhas")
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""
+Gera microdados sintéticos do Censo Escolar (`microdados_ed_basica_<ano>.csv`) no formato
+dos arquivos do INEP: latin1, separados por `;`, com os nomes de coluna reais
+(CANDIDATE_COLUMNS em migrate_csv_to_sqlite.py) e colunas extras de cadastro para chegar
+perto da largura do arquivo original.
+
+Os dados são plausíveis para medir a ingestão de forma repetível (mesma semente = mesmos
+arquivos): as 27 UFs com códigos IBGE e peso aproximado no número de escolas, hierarquia
+mesorregião > microrregião > município, nomes acentuados, matrículas com distribuição
+assimétrica e células vazias. As mesmas escolas se repetem entre os anos (com entradas e
+saídas e variação de matrículas), então os rankings de crescimento também têm dados.
+
+Uso:
+    python scripts/gen_microdados.py --rows 50000 --anos 2022 2023 2024 --out-dir bench_data
+    python scripts/gen_microdados.py --rows 2000000 --anos 2024 --extra-cols 120
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+# (co_uf, no_uf, sg_uf, co_regiao, peso ~ milhares de escolas)
+UFS = [
+    (11, 'Rondônia', 'RO', 1, 1.2), (12, 'Acre', 'AC', 1, 1.6), (13, 'Amazonas', 'AM', 1, 6.0),
+    (14, 'Roraima', 'RR', 1, 0.9), (15, 'Pará', 'PA', 1, 10.5), (16, 'Amapá', 'AP', 1, 0.8),
+    (17, 'Tocantins', 'TO', 1, 1.6), (21, 'Maranhão', 'MA', 2, 11.5), (22, 'Piauí', 'PI', 2, 4.6),
+    (23, 'Ceará', 'CE', 2, 7.3), (24, 'Rio Grande do Norte', 'RN', 2, 3.2), (25, 'Paraíba', 'PB', 2, 4.7),
+    (26, 'Pernambuco', 'PE', 2, 8.3), (27, 'Alagoas', 'AL', 2, 2.9), (28, 'Sergipe', 'SE', 2, 2.1),
+    (29, 'Bahia', 'BA', 2, 16.0), (31, 'Minas Gerais', 'MG', 3, 16.3), (32, 'Espírito Santo', 'ES', 3, 3.1),
+    (33, 'Rio de Janeiro', 'RJ', 3, 10.5), (35, 'São Paulo', 'SP', 3, 30.5), (41, 'Paraná', 'PR', 4, 9.4),
+    (42, 'Santa Catarina', 'SC', 4, 6.4), (43, 'Rio Grande do Sul', 'RS', 4, 9.6),
+    (50, 'Mato Grosso do Sul', 'MS', 5, 1.9), (51, 'Mato Grosso', 'MT', 5, 2.7), (52, 'Goiás', 'GO', 5, 4.3),
+    (53, 'Distrito Federal', 'DF', 5, 1.3),
+]
+REGIOES = {1: 'Norte', 2: 'Nordeste', 3: 'Sudeste', 4: 'Sul', 5: 'Centro-Oeste'}
+
+NOME_PREFIXOS = ['São', 'Santa', 'Nova', 'Bom Jesus de', 'Conceição do', 'Água Branca do', 'Itaí', 'Jaçanã do',
+                 'Araçá', 'Coração de', 'Santo Antônio do', 'Lagoa do', 'Serra do', 'Barra do', 'Poção de']
+NOME_SUFIXOS = ['José', 'Luzia', 'Esperança', 'Paraíso', 'Piauí', 'Araguaia', 'Tietê', 'Sertão', 'Pajeú',
+                'Ouro', 'Norte', 'Iguaçu', 'Jequitinhonha', 'Cariri', 'Seridó']
+ESCOLA_PREFIXOS = ['ESCOLA MUNICIPAL', 'ESCOLA ESTADUAL', 'EEEF', 'EMEF', 'CENTRO EDUCACIONAL', 'CRECHE MUNICIPAL',
+                   'COLÉGIO ESTADUAL', 'ESCOLA TÉCNICA ESTADUAL', 'INSTITUTO FEDERAL', 'COLÉGIO']
+ESCOLA_PATRONOS = ['JOSÉ DE ALENCAR', 'MARIA DA CONCEIÇÃO', 'SÃO JOÃO BATISTA', 'TIRADENTES', 'CECÍLIA MEIRELES',
+                   'JOÃO XXIII', 'PROFª ANTÔNIA SOUSA', 'DOM PEDRO II', 'PAULO FREIRE', 'ANÍSIO TEIXEIRA',
+                   'MONTEIRO LOBATO', 'RUI BARBOSA', 'IRMÃ DULCE', 'CHICO MENDES', 'ZUMBI DOS PALMARES']
+
+# Colunas de matrícula: (nome no CSV, fração média das matrículas da escola)
+QT_MAT_COLUMNS = [('QT_MAT_BAS', 1.0), ('QT_MAT_INF', 0.2), ('QT_MAT_FUND', 0.55), ('QT_MAT_MED', 0.18),
+                  ('QT_MAT_PROF', 0.05), ('QT_MAT_EJA', 0.06), ('QT_MAT_ESP', 0.03)]
+ZONA_COLUMNS = ['QT_MAT_ZR_URB', 'QT_MAT_ZR_RUR', 'QT_MAT_ZR_NA']
+# Colunas de cadastro do arquivo real, preenchidas com códigos pequenos (0/1, tipos)
+EXTRA_COLUMNS = ['TP_DEPENDENCIA', 'TP_CATEGORIA_ESCOLA_PRIVADA', 'TP_LOCALIZACAO', 'TP_LOCALIZACAO_DIFERENCIADA',
+                 'TP_SITUACAO_FUNCIONAMENTO', 'IN_VINCULO_SECRETARIA_EDUCACAO', 'IN_LOCAL_FUNC_PREDIO_ESCOLAR',
+                 'IN_AGUA_POTAVEL', 'IN_AGUA_REDE_PUBLICA', 'IN_ENERGIA_REDE_PUBLICA', 'IN_ESGOTO_REDE_PUBLICA',
+                 'IN_LIXO_SERVICO_COLETA', 'IN_ALMOXARIFADO', 'IN_AUDITORIO', 'IN_BANHEIRO', 'IN_BIBLIOTECA',
+                 'IN_COZINHA', 'IN_LABORATORIO_CIENCIAS', 'IN_LABORATORIO_INFORMATICA', 'IN_PARQUE_INFANTIL',
+                 'IN_QUADRA_ESPORTES', 'IN_REFEITORIO', 'IN_SALA_LEITURA', 'IN_INTERNET', 'IN_BANDA_LARGA',
+                 'IN_ALIMENTACAO', 'IN_EXAME_SELECAO', 'QT_SALAS_UTILIZADAS', 'QT_EQUIP_MULTIMIDIA',
+                 'QT_DESKTOP_ALUNO', 'QT_TUR_BAS', 'QT_DOC_BAS']
+BLANK_RATE = 0.05  # fração de células de matrícula vazias (como no arquivo real)
+WRITE_CHUNK = 100000
+
+
+def build_geography(rng):
+    """Municípios com sua micro/mesorregião; devolve arrays alinhados por município."""
+    mun = {k: [] for k in ('uf_idx', 'co_municipio', 'no_municipio', 'co_meso', 'no_meso', 'co_micro', 'no_micro')}
+    for uf_idx, (co_uf, no_uf, _, _, peso) in enumerate(UFS):
+        n_meso = max(2, int(round(peso / 2.5)))
+        n_mun = max(15, int(round(peso * 40)))
+        micro_of_meso = [max(2, int(rng.integers(3, 9))) for _ in range(n_meso)]
+        for i in range(n_mun):
+            meso = i % n_meso
+            micro = int(rng.integers(micro_of_meso[meso]))
+            nome = f"{NOME_PREFIXOS[int(rng.integers(len(NOME_PREFIXOS)))]} {NOME_SUFIXOS[int(rng.integers(len(NOME_SUFIXOS)))]}"
+            mun['uf_idx'].append(uf_idx)
+            mun['co_municipio'].append(co_uf * 100000 + i + 1)
+            mun['no_municipio'].append(f"{nome} {i + 1}" if i >= len(NOME_PREFIXOS) * len(NOME_SUFIXOS) else nome)
+            mun['co_meso'].append(co_uf * 100 + meso + 1)
+            mun['no_meso'].append(f"Mesorregião {meso + 1} de {no_uf}")
+            mun['co_micro'].append(co_uf * 1000 + meso * 10 + micro + 1)
+            mun['no_micro'].append(f"Microrregião {meso + 1}.{micro + 1} de {no_uf}")
+    return {k: np.array(v) for k, v in mun.items()}
+
+
+def build_schools(rng, n, geo):
+    """Universo de escolas (independente do ano): município, nome, código e porte."""
+    pesos = np.array([uf[4] for uf in UFS])
+    uf_idx = rng.choice(len(UFS), size=n, p=pesos / pesos.sum())
+    mun_by_uf = [np.flatnonzero(geo['uf_idx'] == i) for i in range(len(UFS))]
+    municipio = np.empty(n, dtype=np.int64)
+    for i, muns in enumerate(mun_by_uf):
+        rows = np.flatnonzero(uf_idx == i)
+        # Poucos municípios grandes concentram escolas (distribuição de Zipf)
+        zipf = 1.0 / np.arange(1, len(muns) + 1)
+        municipio[rows] = rng.choice(muns, size=len(rows), p=zipf / zipf.sum())
+    co_uf = np.array([uf[0] for uf in UFS])[uf_idx]
+    seq = np.zeros(n, dtype=np.int64)
+    for i in range(len(UFS)):
+        rows = np.flatnonzero(uf_idx == i)
+        seq[rows] = np.arange(len(rows))
+    return {
+        'municipio': municipio,
+        'co_entidade': co_uf * 1000000 + seq + 1,
+        'prefixo': rng.integers(len(ESCOLA_PREFIXOS), size=n),
+        'patrono': rng.integers(len(ESCOLA_PATRONOS), size=n),
+        'porte': np.clip(rng.lognormal(5.0, 1.0, size=n), 5, 6000),
+        'crescimento': rng.normal(0.0, 0.08, size=n),
+        'rural': rng.random(n) < 0.3,
+    }
+
+
+def _fmt_counts(values, blank):
+    out = values.astype(str).astype(object)
+    out[blank] = ''
+    return out
+
+
+def write_year(path, ano, rows, schools, geo, rng, extra_cols):
+    """Grava um ano: `rows` escolas do universo (as mesmas, em parte, nos outros anos)."""
+    n = len(schools['porte'])
+    idx = np.sort(rng.choice(n, size=min(rows, n), replace=False))
+    extras = (EXTRA_COLUMNS + [f"IN_EXTRA_{i}" for i in range(max(0, extra_cols - len(EXTRA_COLUMNS)))])[:extra_cols]
+    header = (['NU_ANO_CENSO', 'NO_REGIAO', 'CO_REGIAO', 'NO_UF', 'SG_UF', 'CO_UF', 'NO_MUNICIPIO', 'CO_MUNICIPIO',
+               'NO_MESORREGIAO', 'CO_MESORREGIAO', 'NO_MICRORREGIAO', 'CO_MICRORREGIAO', 'NO_ENTIDADE', 'CO_ENTIDADE']
+              + extras + [c for c, _ in QT_MAT_COLUMNS] + ZONA_COLUMNS)
+
+    with open(path, 'w', encoding='latin1', newline='') as f:
+        f.write(';'.join(header) + '\n')
+        for start in range(0, len(idx), WRITE_CHUNK):
+            part = idx[start:start + WRITE_CHUNK]
+            m = len(part)
+            mun = schools['municipio'][part]
+            uf = geo['uf_idx'][mun]
+            fator = (1 + schools['crescimento'][part]) ** (ano - 2022)
+            base = schools['porte'][part] * fator
+            cols = [
+                np.full(m, str(ano), dtype=object),
+                np.array([REGIOES[UFS[i][3]] for i in uf], dtype=object),
+                np.array([str(UFS[i][3]) for i in uf], dtype=object),
+                np.array([UFS[i][1] for i in uf], dtype=object),
+                np.array([UFS[i][2] for i in uf], dtype=object),
+                np.array([str(UFS[i][0]) for i in uf], dtype=object),
+                geo['no_municipio'][mun].astype(object),
+                geo['co_municipio'][mun].astype(str).astype(object),
+                geo['no_meso'][mun].astype(object),
+                geo['co_meso'][mun].astype(str).astype(object),
+                geo['no_micro'][mun].astype(object),
+                geo['co_micro'][mun].astype(str).astype(object),
+                np.char.add(np.char.add(np.array(ESCOLA_PREFIXOS)[schools['prefixo'][part]], ' '),
+                            np.array(ESCOLA_PATRONOS)[schools['patrono'][part]]).astype(object),
+                schools['co_entidade'][part].astype(str).astype(object),
+            ]
+            cols += [rng.integers(0, 2 if c.startswith('IN_') else 5, size=m).astype(str).astype(object) for c in extras]
+            total = np.zeros(m, dtype=np.int64)
+            for col, share in QT_MAT_COLUMNS:
+                values = np.rint(base * share * rng.uniform(0.5, 1.5, size=m)).astype(np.int64)
+                if col == 'QT_MAT_BAS':
+                    total = values
+                cols.append(_fmt_counts(values, rng.random(m) < BLANK_RATE))
+            rural = schools['rural'][part]
+            for col in ZONA_COLUMNS:
+                values = np.where(rural == (col == 'QT_MAT_ZR_RUR'), total, 0) if col != 'QT_MAT_ZR_NA' else np.zeros(m, dtype=np.int64)
+                cols.append(_fmt_counts(values, rng.random(m) < BLANK_RATE))
+            f.write(''.join(';'.join(r) + '\n' for r in zip(*cols)))
+    return len(idx)
+
+
+def generate(out_dir, anos, rows, seed=0, extra_cols=len(EXTRA_COLUMNS)):
+    """Gera um CSV por ano em `out_dir`; devolve a lista de caminhos."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    geo = build_geography(rng)
+    # Universo um pouco maior que cada ano: escolas abrem e fecham entre os censos
+    schools = build_schools(rng, int(rows * 1.08), geo)
+    paths = []
+    for ano in anos:
+        started = time.perf_counter()
+        path = os.path.join(out_dir, f"microdados_ed_basica_{ano}.csv")
+        written = write_year(path, ano, rows, schools, geo, np.random.default_rng([seed, ano]), extra_cols)
+        print(f"{path}: {written:,} linhas, {os.path.getsize(path) / 2**20:.1f} MB "
+              f"({time.perf_counter() - started:.1f}s)")
+        paths.append(path)
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera microdados sintéticos do Censo Escolar (CSV latin1, ;)')
+    parser.add_argument('--rows', type=int, default=50000, help='escolas por ano')
+    parser.add_argument('--anos', type=int, nargs='+', default=[2022, 2023, 2024])
+    parser.add_argument('--out-dir', default='.', help='diretório de saída')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--extra-cols', type=int, default=len(EXTRA_COLUMNS),
+                        help='colunas de cadastro além das usadas na ingestão (o arquivo real tem ~400)')
+    args = parser.parse_args()
+
+    generate(args.out_dir, args.anos, args.rows, seed=args.seed, extra_cols=args.extra_cols)
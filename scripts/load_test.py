@@ -1,142 +1,378 @@
 #!/usr/bin/env python
 """
-Teste de carga para validar performance dos endpoints.
-Mede tempo de resposta e comportamento sob múltiplas requisições.
+Teste de carga HTTP da API: N clientes concorrentes durante um tempo fixo, com uma
+mistura configurável de rotas (ranking, listagem paginada, detalhe, CRUD).
+
+Alvos:
+    --url http://127.0.0.1:5000   servidor já em execução (gunicorn, uvicorn asgi:application, ...)
+    --test-client                 Flask test client, no mesmo processo (sem socket)
+    (nenhum dos dois)             sobe a API localmente numa porta livre: --server wsgi (werkzeug,
+                                  uma thread por conexão, padrão) ou --server asgi (asgi.py: laço
+                                  de eventos + pool fixo de threads)
+
+--idle N mantém N conexões abertas com uma requisição incompleta durante o teste (clientes
+lentos/ociosos), para ver o efeito delas na latência de cada modo de servidor.
+
+Relata vazão (req/s) e latência p50/p95/p99/max, no total e por rota, e grava o resultado
+em JSON (--output) para comparar execuções: com --compare base.json cada rota é comparada
+com a execução anterior e o script sai com código 1 se o p95 ou a vazão piorarem além
+de --tolerance.
+
+Uso (na raiz do projeto):
+    python scripts/load_test.py --concurrency 16 --duration 30 --mix ranking=4,lista=3,detalhe=3,crud=1
+    python scripts/load_test.py --url http://127.0.0.1:8000 --compare load_test_base.json
+    python scripts/load_test.py --server wsgi --idle 500 -o load_test_wsgi.json
+    python scripts/load_test.py --server asgi --idle 500 --compare load_test_wsgi.json
 """
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import socket
+import sys
+import threading
 import time
-import sqlite3
-import statistics
-
-DATABASE = 'censoescolar.db'
-
-def measure_query_performance():
-    """Mede performance de queries críticas."""
-    conn = sqlite3.connect(DATABASE)
-    cur = conn.cursor()
-    
-    queries = {
-        "GET /instituicoesensino/ranking/2022 (TOP 10)": 
-            "SELECT * FROM tb_instituicao_year WHERE nu_ano_censo = 2022 ORDER BY qt_mat_total DESC LIMIT 10",
-        "GET /instituicoesensino/ranking/2023 (TOP 10)": 
-            "SELECT * FROM tb_instituicao_year WHERE nu_ano_censo = 2023 ORDER BY qt_mat_total DESC LIMIT 10",
-        "GET /instituicoesensino/ranking/2024 (TOP 10)": 
-            "SELECT * FROM tb_instituicao_year WHERE nu_ano_censo = 2024 ORDER BY qt_mat_total DESC LIMIT 10",
-        "GET /instituicoesensino (LIMIT 20, OFFSET 0)": 
-            "SELECT codigo, nome FROM tb_instituicao LIMIT 20 OFFSET 0",
-        "GET /instituicoesensino (LIMIT 20, OFFSET 1000)": 
-            "SELECT codigo, nome FROM tb_instituicao LIMIT 20 OFFSET 1000",
-        "GET /instituicoesensino (LIMIT 20, OFFSET 100000)": 
-            "SELECT codigo, nome FROM tb_instituicao LIMIT 20 OFFSET 100000",
-        "GET /usuarios": 
-            "SELECT * FROM tb_usuario",
-        "COUNT de instituições": 
-            "SELECT COUNT(*) FROM tb_instituicao",
-        "COUNT de usuários": 
-            "SELECT COUNT(*) FROM tb_usuario",
-    }
-    
-    print("\n" + "="*80)
-    print("TESTE DE PERFORMANCE - QUERIES CRÍTICAS")
-    print("="*80 + "\n")
-    
-    results = {}
-    for query_name, sql in queries.items():
-        times = []
-        for i in range(5):  # 5 execuções para cada query
-            start = time.time()
+from datetime import datetime
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.ranking_sql import RANKING_METRICS
+
+DEFAULT_MIX = 'ranking=4,lista=3,detalhe=3,crud=1'
+DEFAULT_ANOS = '2022,2023,2024'
+SAMPLE_SIZE = 200  # códigos de instituição usados nas rotas de detalhe
+LIST_MAX_OFFSET = 1000
+CRUD_PREFIX = 'LOADTEST'
+
+
+# ===== Clientes =====
+
+class HttpClient:
+    """Uma conexão keep-alive (http.client) por thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return conn
+
+    def request(self, method, path, body=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        for attempt in (0, 1):
+            conn = self._conn()
             try:
-                cur.execute(sql)
-                cur.fetchall()
-                elapsed = (time.time() - start) * 1000  # ms
-                times.append(elapsed)
+                conn.request(method, path, body=payload, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                return resp.status, data
+            except (http.client.HTTPException, ConnectionError):
+                # Servidor fechou a conexão (HTTP/1.0, reinício do worker): reabre uma vez
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+
+class TestClient:
+    """Flask test client (um por thread), sem rede: mede só a aplicação."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        resp = client.open(path, method=method, json=body)
+        return resp.status_code, resp.get_data()
+
+
+def load_app():
+    """Importa app.py; no mesmo processo o log por requisição distorceria as medidas."""
+    from app import app, logger
+    logger.setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    return app
+
+
+def start_local_server(kind='wsgi'):
+    """Sobe a API em segundo plano numa porta livre; devolve a URL e a função que a para."""
+    app = load_app()
+    if kind == 'asgi':
+        from asgi import application
+        from helpers.asgi import serve_in_thread
+        port, stop = serve_in_thread(application)
+        return f"http://127.0.0.1:{port}", stop
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def open_idle_connections(base_url, n):
+    """Abre `n` conexões que enviam só o começo de uma requisição e ficam paradas."""
+    parts = urlsplit(base_url)
+    sockets = []
+    for _ in range(n):
+        try:
+            s = socket.create_connection((parts.hostname, parts.port or 80), timeout=5)
+            s.sendall(f"GET / HTTP/1.1\r\nHost: {parts.hostname}\r\n".encode('ascii'))
+        except OSError as e:
+            print(f"Aviso: só {len(sockets)} conexões ociosas abertas ({e})")
+            break
+        sockets.append(s)
+    return sockets
+
+
+# ===== Cenários =====
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Rota desconhecida no --mix: {name} (use {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def discover(client, anos):
+    """Códigos de instituição e anos de ranking disponíveis para montar as requisições."""
+    status, data = client.request('GET', f'/instituicoesensino?limit={SAMPLE_SIZE}')
+    codigos = [item['codigo'] for item in json.loads(data)] if status == 200 else []
+    # Só anos já carregados em tb_instituicao_year (agregação por UF não vazia): um ano sem
+    # ranking materializado responderia 202 e agendaria a carga a partir dos CSVs
+    anos_ok = []
+    for ano in anos:
+        status, data = client.request('GET', f'/agregados/uf/{ano}')
+        if status == 200 and json.loads(data):
+            anos_ok.append(ano)
+    return {'codigos': codigos, 'anos': anos_ok}
+
+
+def op_ranking(client, ctx, rnd):
+    ano = rnd.choice(ctx['anos'])
+    metric = rnd.choice(RANKING_METRICS)
+    return [('GET /instituicoesensino/ranking/<ano>',
+             lambda: client.request('GET', f'/instituicoesensino/ranking/{ano}?metric={metric}&limit=10'))]
+
+
+def op_lista(client, ctx, rnd):
+    offset = rnd.randrange(0, LIST_MAX_OFFSET, 20)
+    return [('GET /instituicoesensino',
+             lambda: client.request('GET', f'/instituicoesensino?limit=20&offset={offset}'))]
+
+
+def op_detalhe(client, ctx, rnd):
+    codigo = rnd.choice(ctx['codigos'])
+    return [('GET /instituicoesensino/<codigo>',
+             lambda: client.request('GET', f'/instituicoesensino/{codigo}'))]
+
+
+def op_crud(client, ctx, rnd):
+    """Cria, atualiza e remove uma instituição própria do teste (três requisições)."""
+    codigo = f"{CRUD_PREFIX}-{os.getpid()}-{threading.get_ident()}-{rnd.getrandbits(32)}"
+    nova = {'codigo': codigo, 'nome': 'Escola de teste de carga', 'co_uf': 99, 'co_municipio': 9999999,
+            'qt_mat_bas': rnd.randrange(1000)}
+    return [
+        ('POST /instituicoesensino', lambda: client.request('POST', '/instituicoesensino', nova)),
+        ('PUT /instituicoesensino/<codigo>',
+         lambda: client.request('PUT', f'/instituicoesensino/{codigo}', {'qt_mat_bas': rnd.randrange(1000)})),
+        ('DELETE /instituicoesensino/<codigo>', lambda: client.request('DELETE', f'/instituicoesensino/{codigo}')),
+    ]
+
+
+SCENARIOS = {'ranking': op_ranking, 'lista': op_lista, 'detalhe': op_detalhe, 'crud': op_crud}
+
+
+# ===== Execução =====
+
+def worker(client, ctx, mix, warmup_until, deadline, seed, samples):
+    rnd = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        # Um cenário (ex.: o ciclo do CRUD) sempre roda até o fim, mesmo passando do prazo
+        for label, call in SCENARIOS[rnd.choices(names, weights)[0]](client, ctx, rnd):
+            started = time.perf_counter()
+            try:
+                status = call()[0]
             except Exception as e:
-                print(f"ERRO em {query_name}: {e}")
-                break
-        
-        if times:
-            avg_time = statistics.mean(times)
-            min_time = min(times)
-            max_time = max(times)
-            results[query_name] = {
-                'avg': avg_time,
-                'min': min_time,
-                'max': max_time,
-                'times': times
-            }
-            
-            status = "✓ RÁPIDO" if avg_time < 100 else "⚠ LENTO" if avg_time < 500 else "✗ MUITO LENTO"
-            print(f"{status} | {query_name}")
-            print(f"      Tempo médio: {avg_time:.2f}ms (min: {min_time:.2f}ms, max: {max_time:.2f}ms)")
-    
-    conn.close()
-    
-    # Resumo
-    print("\n" + "="*80)
-    print("RESUMO DE PERFORMANCE")
-    print("="*80 + "\n")
-    
-    quick = [k for k, v in results.items() if v['avg'] < 100]
-    medium = [k for k, v in results.items() if 100 <= v['avg'] < 500]
-    slow = [k for k, v in results.items() if v['avg'] >= 500]
-    
-    print(f"✓ Rápido (<100ms):  {len(quick)} queries")
-    print(f"⚠ Médio (100-500ms): {len(medium)} queries")
-    print(f"✗ Lento (>500ms):   {len(slow)} queries")
-    
-    if quick:
-        print(f"\nQueries rápidas:")
-        for q in quick[:3]:
-            print(f"  - {q} ({results[q]['avg']:.2f}ms)")
-    
-    return results
-
-
-def estimate_load_capacity():
-    """Estima capacidade de carga do servidor."""
-    print("\n" + "="*80)
-    print("ESTIMATIVA DE CAPACIDADE")
-    print("="*80 + "\n")
-    
-    conn = sqlite3.connect(DATABASE)
-    cur = conn.cursor()
-    
-    # Informações do banco
-    cur.execute("SELECT COUNT(*) FROM tb_instituicao")
-    total_instituicoes = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM tb_instituicao_year")
-    total_year_records = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM tb_usuario")
-    total_usuarios = cur.fetchone()[0]
-    
-    # Tamanho do arquivo
-    import os
-    db_size = os.path.getsize(DATABASE) / (1024 * 1024)  # MB
-    
-    print(f"Dados no banco de dados:")
-    print(f"  - Instituições: {total_instituicoes:,}")
-    print(f"  - Registros Year: {total_year_records:,}")
-    print(f"  - Usuários: {total_usuarios}")
-    print(f"  - Tamanho DB: {db_size:.2f} MB")
-    
-    print(f"\nCapacidade estimada:")
-    print(f"  ✓ Paginação: Suporta até {(total_instituicoes // 20)} páginas")
-    print(f"  ✓ Ranking: Top-10 por ano (3 anos = 30 instituições)")
-    print(f"  ✓ Usuários: Operações CRUD para {total_usuarios} usuários")
-    print(f"  ✓ JSON persistence: Mantém sincronização com DB")
-    
-    conn.close()
+                status = f"{type(e).__name__}"
+            if warmup_until <= started < deadline:
+                samples.append((label, time.perf_counter() - started, status))
+
+
+def percentile(sorted_values, p):
+    """Percentil pelo método nearest-rank."""
+    if not sorted_values:
+        return None
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(s[1] * 1000 for s in samples)
+    statuses = {}
+    for s in samples:
+        statuses[str(s[2])] = statuses.get(str(s[2]), 0) + 1
+    errors = sum(n for code, n in statuses.items() if not code.isdigit() or int(code) >= 400)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(latencies[-1] if latencies else None),
+        'status': statuses,
+    }
+
+
+def _ms(value):
+    return round(value, 3) if value is not None else None
+
+
+def run(client, target, args):
+    mix = parse_mix(args.mix)
+    ctx = discover(client, [int(a) for a in args.anos.split(',') if a])
+    if 'ranking' in mix and not ctx['anos']:
+        print("Aviso: nenhum ano com ranking disponível; 'ranking' removido da mistura")
+        mix.pop('ranking')
+    if 'detalhe' in mix and not ctx['codigos']:
+        print("Aviso: nenhuma instituição cadastrada; 'detalhe' removido da mistura")
+        mix.pop('detalhe')
+    if not mix:
+        raise SystemExit("Nada para executar: a mistura de rotas ficou vazia")
+
+    samples = []  # list.append é atômico; cada amostra é (rota, segundos, status)
+    started = time.perf_counter()
+    warmup_until = started + args.warmup
+    deadline = warmup_until + args.duration
+    threads = [threading.Thread(target=worker, args=(client, ctx, mix, warmup_until, deadline, args.seed + i, samples))
+               for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - warmup_until
+
+    by_route = {}
+    for s in samples:
+        by_route.setdefault(s[0], []).append(s)
+    return {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'target': target,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'mix': mix,
+            'idle_connections': args.idle,
+            'anos': ctx['anos'],
+            'seed': args.seed,
+        },
+        'total': summarize(samples, elapsed),
+        'routes': {route: summarize(rs, elapsed) for route, rs in sorted(by_route.items())},
+    }
+
+
+# ===== Relatório =====
+
+def print_report(result):
+    meta = result['meta']
+    print(f"\nAlvo: {meta['target']} | concorrência {meta['concurrency']} | {meta['duration_s']}s "
+          f"(+{meta['warmup_s']}s aquecimento) | mistura {meta['mix']} | "
+          f"{meta.get('idle_connections', 0)} conexões ociosas")
+    header = f"{'rota':<40} {'req':>7} {'err':>5} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    print(header)
+    print('-' * len(header))
+    rows = list(result['routes'].items()) + [('TOTAL', result['total'])]
+    for route, s in rows:
+        print(f"{route:<40} {s['requests']:>7} {s['errors']:>5} {s['rps']:>9.1f} "
+              + ' '.join(f"{s[k] if s[k] is not None else float('nan'):>8.2f}" for k in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')))
+    print("(latências em ms)")
+
+
+def compare(result, baseline, tolerance):
+    """Compara com uma execução anterior; devolve as regressões encontradas."""
+    regressions = []
+    print(f"\nComparação com {baseline['meta']['started_at']} ({baseline['meta']['target']}):")
+    rows = [('TOTAL', result['total'], baseline['total'])]
+    rows += [(r, s, baseline['routes'][r]) for r, s in result['routes'].items() if r in baseline['routes']]
+    for route, new, old in rows:
+        changes = []
+        for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if not old.get(key) or new.get(key) is None:
+                continue
+            change = (new[key] - old[key]) / old[key]
+            changes.append(f"{key} {old[key]:.2f} -> {new[key]:.2f} ({change:+.1%})")
+            worse = -change if key == 'rps' else change
+            if key in ('rps', 'p95_ms') and worse > tolerance:
+                regressions.append(f"{route}: {key} {change:+.1%}")
+        print(f"  {route}: " + ', '.join(changes))
+    return regressions
 
 
 if __name__ == '__main__':
-    print("\n╔════════════════════════════════════════════════════════════════════════════╗")
-    print("║          TESTE DE CARGA - CENSO ESCOLAR DATA PROJECT                     ║")
-    print("╚════════════════════════════════════════════════════════════════════════════╝")
-    
-    measure_query_performance()
-    estimate_load_capacity()
-    
-    print("\n" + "="*80)
-    print("CONCLUSÃO: Sistema está pronto para produção!")
-    print("="*80 + "\n")
+    parser = argparse.ArgumentParser(description='Teste de carga HTTP com percentis de latência')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='URL de um servidor já em execução')
+    target.add_argument('--test-client', action='store_true', help='usa o Flask test client no mesmo processo')
+    parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi',
+                        help='servidor local (sem --url): werkzeug threaded ou asgi.py')
+    parser.add_argument('--idle', type=int, default=0, help='conexões ociosas abertas durante o teste')
+    parser.add_argument('--concurrency', '-c', type=int, default=8)
+    parser.add_argument('--duration', '-d', type=float, default=10.0, help='segundos medidos')
+    parser.add_argument('--warmup', type=float, default=2.0, help='segundos iniciais descartados')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"pesos por rota ({', '.join(SCENARIOS)})")
+    parser.add_argument('--anos', default=DEFAULT_ANOS, help='anos usados nas rotas de ranking')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', '-o', default='load_test.json', help='arquivo JSON com o resultado')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='piora tolerada no p95 e na vazão (0.10 = 10%%)')
+    args = parser.parse_args()
+
+    stop_server = None
+    idle = []
+    if args.test_client:
+        client, target_name = TestClient(load_app()), 'flask-test-client'
+    else:
+        if args.url:
+            url = target_name = args.url
+        else:
+            url, stop_server = start_local_server(args.server)
+            target_name = f"{url} ({args.server})"
+        client = HttpClient(url)
+        idle = open_idle_connections(url, args.idle)
+
+    try:
+        result = run(client, target_name, args)
+    finally:
+        for s in idle:
+            s.close()
+        if stop_server is not None:
+            stop_server()
+
+    print_report(result)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"Resultado gravado em {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressões acima da tolerância:\n  " + '\n  '.join(regressions))
+            sys.exit(1)
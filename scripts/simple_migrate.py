@@ -2,6 +2,12 @@ import argparse
 import csv
 import os
 import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from helpers.data_version import bump as bump_version, ensure as ensure_versions
+from helpers.rollups import ensure as ensure_rollups, rebuild_cadastro_rollups
+from helpers.search import ensure as ensure_search_index, rebuild as rebuild_search_index
 
 CANDIDATE_COLUMNS = {
     'codigo': ['CO_ENTIDADE', 'CO_ENTIDADE_ESCOLA', 'CO_ENTIDADE_MEC', 'COD_ENTIDADE', 'CO_ENTIDADE_ENSINO', 'CO_ENTIDADE_CURSO'],
@@ -27,6 +33,11 @@ def migrate(csv_file, db_path, chunk_size=50000, filter_nordeste=True, encoding=
 
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
+    # Bancos anteriores às versões, às agregações e ao índice de busca os ganham antes da carga
+    ensure_versions(cur)
+    conn.commit()
+    ensure_rollups(conn)
+    ensure_search_index(conn)
 
     inserted = 0
     skipped = 0
@@ -114,9 +125,10 @@ def migrate(csv_file, db_path, chunk_size=50000, filter_nordeste=True, encoding=
                 cur.executemany('''INSERT OR IGNORE INTO tb_instituicao
                     (codigo, nome, co_uf, co_municipio, qt_mat_bas, qt_mat_prof, qt_mat_esp)
                     VALUES (?, ?, ?, ?, ?, ?, ?)''', batch)
-                conn.commit()
                 after = conn.total_changes
                 inserted += (after - before)
+                bump_version(cur, 'tb_instituicao')
+                conn.commit()
                 print(f'Processed {processed} rows, inserted so far: {inserted}')
                 batch = []
 
@@ -126,10 +138,15 @@ def migrate(csv_file, db_path, chunk_size=50000, filter_nordeste=True, encoding=
             cur.executemany('''INSERT OR IGNORE INTO tb_instituicao
                 (codigo, nome, co_uf, co_municipio, qt_mat_bas, qt_mat_prof, qt_mat_esp)
                 VALUES (?, ?, ?, ?, ?, ?, ?)''', batch)
-            conn.commit()
             after = conn.total_changes
             inserted += (after - before)
+            bump_version(cur, 'tb_instituicao')
+            conn.commit()
 
+    # Agregações do cadastro (UF / município) e índice de busca recalculados em bloco após a carga
+    if inserted:
+        rebuild_cadastro_rollups(conn)
+        rebuild_search_index(conn)
     conn.close()
     print('\nFinished')
     print('Processed:', processed)
@@ -0,0 +1,80 @@
+"""
+Servidor de produção da API: mestre prefork com N workers x M threads (helpers/prefork.py).
+
+O app e os dados somente leitura (snapshot colunar) são carregados no mestre antes do
+fork e compartilhados copy-on-write pelos workers.
+
+    python server.py --workers 4 --threads 8 --bind 0.0.0.0:8000
+    kill -HUP <pid do mestre>     recarga graciosa dos dados (relê o snapshot, troca os
+                                  workers; o código só muda reiniciando o mestre)
+    kill -TERM <pid do mestre>    parada graciosa
+
+`GET /healthz` (liveness) e `GET /readyz` (readiness; 503 enquanto o worker drena) servem
+para o balanceador: ao receber SIGTERM o worker segue atendendo por READINESS_GRACE
+segundos com /readyz em 503, e só então para de aceitar conexões. Com gunicorn, a configuração equivalente está em gunicorn.conf.py.
+`python app.py` continua sendo o servidor de desenvolvimento.
+"""
+import argparse
+import logging
+import os
+
+from helpers.prefork import PreforkServer, DEFAULT_GRACEFUL_TIMEOUT, DEFAULT_READINESS_GRACE, DEFAULT_REQUEST_TIMEOUT
+
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 0))  # 0 = DB_POOL_SIZE
+BIND = os.environ.get('BIND', '127.0.0.1:8000')
+GRACEFUL_TIMEOUT = int(os.environ.get('GRACEFUL_TIMEOUT', DEFAULT_GRACEFUL_TIMEOUT))
+REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', DEFAULT_REQUEST_TIMEOUT))
+# Segundos entre o /readyz passar a 503 e o worker parar de aceitar conexões (>= intervalo do health check)
+READINESS_GRACE = float(os.environ.get('READINESS_GRACE', DEFAULT_READINESS_GRACE))
+
+
+def preload():
+    """Importa o app e mapeia o snapshot colunar no mestre, antes do fork (e a cada SIGHUP)."""
+    import app as api
+    if api.columnar is not None:
+        arrays = api.columnar.preload()
+        api.logger.info('Snapshot colunar %s pré-carregado: %d arrays', api.columnar.version, arrays)
+    return api
+
+
+def post_fork():
+    """No worker, antes de atender: copia o banco para a réplica em memória (READ_REPLICA=1)."""
+    import app as api
+    api.replica.warm()
+
+
+def mark_draining():
+    """No worker, ao receber SIGTERM: /readyz passa a responder 503."""
+    import app as api
+    api.app.config['DRAINING'] = True
+
+
+def parse_bind(bind):
+    host, _, port = bind.rpartition(':')
+    return host.strip('[]') or '127.0.0.1', int(port)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor prefork da API')
+    parser.add_argument('--bind', '-b', default=BIND, help='host:porta')
+    parser.add_argument('--workers', '-w', type=int, default=WEB_WORKERS)
+    parser.add_argument('--threads', '-t', type=int, default=WEB_THREADS, help='threads por worker (0 = DB_POOL_SIZE)')
+    parser.add_argument('--graceful-timeout', type=int, default=GRACEFUL_TIMEOUT)
+    parser.add_argument('--request-timeout', type=int, default=REQUEST_TIMEOUT)
+    parser.add_argument('--readiness-grace', type=float, default=READINESS_GRACE,
+                        help='segundos atendendo com /readyz em 503 antes de drenar')
+    args = parser.parse_args()
+
+    import app as api
+    prefork_logger = logging.getLogger('helpers.prefork')
+    prefork_logger.setLevel(logging.INFO)
+    prefork_logger.addHandler(api.handler)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # sem log por requisição
+
+    host, port = parse_bind(args.bind)
+    server = PreforkServer(api.app, host, port, workers=args.workers, threads=args.threads or api.DB_POOL_SIZE,
+                           preload=preload, on_drain=mark_draining, graceful_timeout=args.graceful_timeout,
+                           request_timeout=args.request_timeout, post_fork=post_fork,
+                           readiness_grace=args.readiness_grace)
+    server.run()
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from helpers import rollups, search  # noqa: E402
+
+# (codigo, nome, co_uf, sg_uf, co_municipio, no_municipio, qt_mat_bas)
+INSTITUICOES = [
+    ('21000001', 'Escola Municipal São João', 21, 'MA', 2100055, 'Açailândia', 120),
+    ('21000002', 'Escola Estadual Dom Pedro', 21, 'MA', 2100055, 'Açailândia', 80),
+    ('21000003', 'Colégio Joana Angélica', 21, 'MA', 2111300, 'São Luís', 300),
+    ('21000004', 'Escola Rural Boa Vista', 21, 'MA', 2111300, 'São Luís', 15),
+    ('21000005', 'Centro de Ensino Gonçalves Dias', 21, 'MA', 2111300, 'São Luís', 210),
+]
+
+
+def create_database(path):
+    """Banco novo a partir de schema.sql, como o initdb.py."""
+    conn = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'schema.sql')) as f:
+        conn.executescript(f.read())
+    return conn
+
+
+@pytest.fixture(scope='session')
+def api(tmp_path_factory):
+    """Módulo `app` servindo um banco temporário com INSTITUICOES já migradas."""
+    workdir = tmp_path_factory.mktemp('api')
+    (workdir / 'data').mkdir()
+    conn = create_database(workdir / 'censoescolar.db')
+    conn.executemany("INSERT INTO tb_instituicao (codigo, nome, co_uf, sg_uf, co_municipio, no_municipio, qt_mat_bas) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", INSTITUICOES)
+    conn.commit()
+    # Fim de migração: agregações do cadastro e índice de busca em bloco
+    rollups.rebuild_cadastro_rollups(conn)
+    search.rebuild(conn)
+    conn.close()
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import app as module
+        yield module
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def client(api):
+    return api.app.test_client()
@@ -0,0 +1,81 @@
+"""Modo ASGI: AsgiBridge sobre o app Flask e o servidor asyncio embutido."""
+import asyncio
+import http.client
+import json
+
+import pytest
+
+from helpers.asgi import AsgiBridge, serve_in_thread
+
+
+@pytest.fixture
+def bridge(api):
+    bridge = AsgiBridge(api.app, max_threads=2)
+    yield bridge
+    api.app.extensions.pop('asgi_bridge', None)
+    bridge.executor.shutdown()
+
+
+def call(bridge, method, path, query=b'', body=b'', headers=()):
+    """Uma requisição pelo protocolo ASGI; devolve (status, cabeçalhos, corpo, mensagens de corpo)."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+             'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers]}
+    asyncio.run(bridge(scope, receive, send))
+    start, *chunks = messages
+    assert not chunks[-1].get('more_body')
+    return start['status'], dict(start['headers']), b''.join(m['body'] for m in chunks), chunks
+
+
+def test_bridge_serves_flask_routes(bridge):
+    status, headers, body, _ = call(bridge, 'GET', '/instituicoesensino/21000001')
+    assert status == 200
+    assert headers[b'content-type'] == b'application/json'
+    assert json.loads(body)['codigo'] == '21000001'
+
+    status, _, body, _ = call(bridge, 'POST', '/usuarios', body=b'{"nome": "Sem cpf"}',
+                              headers=[('Content-Type', 'application/json')])
+    assert status == 400 and 'mensagem' in json.loads(body)
+
+
+def test_bridge_streams_ndjson_in_pieces(api, bridge, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_BATCH_SIZE', 2)
+    status, headers, body, chunks = call(bridge, 'GET', '/instituicoesensino', query=b'stream=1&limit=5')
+    assert status == 200 and b'content-length' not in headers
+    assert [json.loads(line)['codigo'] for line in body.splitlines()] == [f'2100000{i}' for i in range(1, 6)]
+    assert len(chunks) > 2  # um envio por lote, não o corpo inteiro de uma vez
+    assert bridge.stats() == {'threads': 2, 'running': 0, 'waiting': 0}
+
+
+def test_status_route_reports_bridge_only_in_asgi_mode(client, bridge):
+    status, _, body, _ = call(bridge, 'GET', '/status/asgi')
+    assert status == 200
+    assert json.loads(body) == {'threads': 2, 'running': 1, 'waiting': 0}  # a própria requisição
+
+    client.application.extensions.pop('asgi_bridge')
+    assert client.get('/status/asgi').status_code == 404
+
+
+def test_embedded_server_keeps_connection_alive(bridge):
+    port, stop = serve_in_thread(bridge)
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        for codigo in ('21000001', '21000003'):
+            conn.request('GET', f'/instituicoesensino/{codigo}')
+            response = conn.getresponse()
+            assert response.status == 200
+            assert json.loads(response.read())['codigo'] == codigo
+        conn.request('GET', '/instituicoesensino?stream=1&limit=2')
+        response = conn.getresponse()
+        assert response.getheader('Transfer-Encoding') == 'chunked'
+        assert len(response.read().splitlines()) == 2
+        conn.close()
+    finally:
+        stop()
@@ -0,0 +1,47 @@
+"""Cargas em lote: POST /usuarios/bulk e POST /instituicoesensino/bulk (JSON e NDJSON)."""
+
+
+def _codigos(items):
+    return [item['codigo'] for item in items]
+
+
+def test_bulk_creates_and_updates(client):
+    r = client.post('/instituicoesensino/bulk', json=[
+        {'codigo': '24000001', 'nome': 'Escola Natal', 'co_uf': 24, 'co_municipio': 2408102},
+        {'codigo': '24000002', 'nome': 'Escola Mossoró', 'co_uf': 24, 'co_municipio': 2408003},
+    ])
+    assert r.status_code == 200
+    body = r.get_json()
+    assert (body['criados'], body['atualizados'], body['erros']) == (2, 0, 0)
+
+    r = client.post('/instituicoesensino/bulk', data='\n'.join([
+        '{"codigo": "24000001", "nome": "Escola Estadual Natal"}',
+        '{"codigo": "24000003", "nome": "Escola Caicó", "co_uf": 24, "co_municipio": 2402006}',
+        '{"codigo": "24000004"}',
+    ]), content_type='application/x-ndjson')
+    body = r.get_json()
+    assert (body['criados'], body['atualizados'], body['erros']) == (1, 1, 1)
+    assert [item['status'] for item in body['itens']] == [200, 201, 400]
+
+    assert client.get('/instituicoesensino/24000001').get_json()['nome'] == 'Escola Estadual Natal'
+    r = client.get('/instituicoesensino/busca', query_string={'q': 'caico'})
+    assert _codigos(r.get_json()) == ['24000003']
+    [uf] = client.get('/agregados/uf/cadastro?codigo=24').get_json()
+    assert uf['qt_escolas'] == 3
+
+
+def test_bulk_rejects_invalid_body(client):
+    assert client.post('/instituicoesensino/bulk', json=[]).status_code == 400
+    assert client.post('/instituicoesensino/bulk', data='{nao e json', content_type='application/json').status_code == 400
+
+
+def test_bulk_usuarios_rejects_unhashable_cpf_per_item(client):
+    r = client.post('/usuarios/bulk', json=[
+        {'nome': 'Ana', 'cpf': ['123'], 'nascimento': '2000-01-01'},
+        {'nome': 'Bia', 'cpf': {'n': 1}, 'nascimento': '2000-01-01'},
+        {'nome': 'Caio', 'cpf': '99988877766', 'nascimento': '2001-02-03'},
+    ])
+    assert r.status_code == 200
+    body = r.get_json()
+    assert [item['status'] for item in body['itens']] == [400, 400, 201]
+    assert (body['criados'], body['erros']) == (1, 2)
@@ -0,0 +1,71 @@
+"""Snapshot colunar de tb_instituicao_year (helpers/columnar.py)."""
+import os
+import sqlite3
+
+import pytest
+
+from conftest import create_database
+from helpers.columnar import KEEP_VERSIONS, ColumnarSnapshot, columnar_dir, export_snapshot
+from helpers.ranking_sql import RANKING_COLUMNS
+
+ROWS = [
+    # co_entidade, no_entidade, sg_uf, co_uf, co_municipio, no_municipio, nu_ano_censo, qt_mat_bas, qt_mat_total
+    ('21000001', 'Escola São João', 'MA', 21, 2100055, 'Açailândia', 2024, 120, 150),
+    ('21000002', None, 'MA', 21, 2100055, 'Açailândia', 2024, None, 80),
+    ('22000001', 'Escola Piauí', 'PI', 22, None, None, 2024, 0, 0),
+    ('21000001', 'Escola São João', 'MA', 21, 2100055, 'Açailândia', 2023, 100, 130),
+]
+COLUMNS = ('co_entidade', 'no_entidade', 'sg_uf', 'co_uf', 'co_municipio', 'no_municipio', 'nu_ano_censo',
+           'qt_mat_bas', 'qt_mat_total')
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'censoescolar.db')
+    conn = create_database(path)
+    conn.executemany(f"INSERT INTO tb_instituicao_year ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                     ROWS)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_snapshot_rows_match_the_table(db_path):
+    manifest = export_snapshot(db_path)
+    assert manifest['years'] == {'2023': 1, '2024': 3}
+
+    snapshot = ColumnarSnapshot(columnar_dir(db_path))
+    assert snapshot.years() == [2023, 2024]
+    conn = sqlite3.connect(db_path)
+    expected = [dict(zip(RANKING_COLUMNS, r)) for r in conn.execute(
+        f"SELECT {', '.join(RANKING_COLUMNS)} FROM tb_instituicao_year WHERE nu_ano_censo = 2024 ORDER BY id")]
+    conn.close()
+    # Textos pelo dicionário e NULL (texto e inteiro) preservados
+    assert snapshot.rows(2024, [0, 1, 2]) == expected
+    assert snapshot.decode(2024, 'no_entidade', [1, 0]) == [None, 'Escola São João']
+    assert not snapshot.column(2024, 'qt_mat_bas').flags.writeable  # mmap somente leitura
+
+
+def test_new_export_is_picked_up_and_old_versions_pruned(db_path):
+    export_snapshot(db_path)
+    snapshot = ColumnarSnapshot(columnar_dir(db_path))
+    first = snapshot.version
+    assert snapshot.refresh() and snapshot.version == first  # CURRENT não mudou: nada a recarregar
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE tb_instituicao_year SET qt_mat_total = 999 WHERE co_entidade = '22000001'")
+    conn.commit()
+    conn.close()
+    versions = [export_snapshot(db_path)['version'] for _ in range(KEEP_VERSIONS + 1)]
+
+    snapshot.refresh()
+    assert snapshot.version == versions[-1] != first
+    assert snapshot.column(2024, 'qt_mat_total').tolist() == [150, 80, 999]
+    kept = sorted(d for d in os.listdir(columnar_dir(db_path)) if d.startswith('v'))
+    assert kept == sorted(versions[-KEEP_VERSIONS:])
+
+
+def test_missing_snapshot_is_unavailable(tmp_path):
+    snapshot = ColumnarSnapshot(str(tmp_path / 'nada.columnar'))
+    assert not snapshot.available and snapshot.years() == []
+    assert not snapshot.has_year(2024)
@@ -0,0 +1,88 @@
+"""Compressão negociada por Accept-Encoding e ETags por codificação (helpers/compression.py)."""
+import gzip
+import json
+
+import pytest
+from flask import Flask, Response
+
+from helpers.compression import CompressedPayload, Compressor, available_encodings, init_app
+
+BIG = {'itens': [{'codigo': f'2100{i:04d}', 'nome': 'Escola Municipal São João'} for i in range(100)]}
+
+
+@pytest.fixture
+def flask_client():
+    """App mínimo só com o hook de compressão (gzip)."""
+    app = Flask(__name__)
+    init_app(app, Compressor(min_size=1024, encodings=['gzip']))
+
+    @app.get('/grande')
+    def grande():
+        response = app.make_response((BIG, 200))
+        response.set_etag('v1')
+        return response
+
+    @app.get('/pequena')
+    def pequena():
+        return {'ok': True}
+
+    @app.get('/stream')
+    def stream():
+        return Response((json.dumps(BIG) + '\n' for _ in range(2)), mimetype='application/x-ndjson')
+
+    return app.test_client()
+
+
+def test_negotiates_gzip_and_suffixes_etag(flask_client):
+    r = flask_client.get('/grande', headers={'Accept-Encoding': 'br;q=1, gzip;q=0.8'})
+    assert r.headers['Content-Encoding'] == 'gzip'
+    assert r.headers['ETag'] == '"v1-gzip"'
+    assert 'Accept-Encoding' in r.headers['Vary']
+    assert json.loads(gzip.decompress(r.get_data())) == BIG
+
+    r = flask_client.get('/grande', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'Content-Encoding' not in r.headers
+    assert r.headers['ETag'] == '"v1"'
+    assert r.get_json() == BIG
+
+
+def test_small_and_streamed_responses_are_untouched(flask_client):
+    for url in ('/pequena', '/stream'):
+        r = flask_client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in r.headers, url
+
+
+def test_etag_variants_and_payload_cache():
+    compressor = Compressor(encodings=['gzip'])
+    assert compressor.etag_variants('abc') == ['abc', 'abc-gzip']
+    assert Compressor(enabled=False).etag_variants('abc') == ['abc']
+
+    payload = CompressedPayload(json.dumps(BIG).encode())
+    first = payload.encoded('gzip', 6)
+    assert payload.encoded('gzip', 6) is first  # comprimido uma vez só
+    assert gzip.decompress(first) == payload.body
+
+
+def test_zstd_preferred_when_available():
+    if 'zstd' not in available_encodings():
+        pytest.skip('zstandard não instalado')
+    app = Flask(__name__)
+    init_app(app, Compressor(min_size=0))
+    app.get('/')(lambda: BIG)
+    r = app.test_client().get('/', headers={'Accept-Encoding': 'gzip, br, zstd'})
+    assert r.headers['Content-Encoding'] == 'zstd'
+
+
+def test_api_revalidates_compressed_etag(api, client, monkeypatch):
+    monkeypatch.setattr(api.compressor, 'min_size', 0)
+    url = '/instituicoesensino/21000001'
+    plain = client.get(url)
+    r = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert r.headers['Content-Encoding'] == 'gzip'
+    assert r.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert json.loads(gzip.decompress(r.get_data())) == plain.get_json()
+
+    # O cliente revalida com o ETag da versão comprimida que guardou
+    r = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': r.headers['ETag']})
+    assert r.status_code == 304
+    assert r.headers['ETag'].endswith('-gzip"')
@@ -0,0 +1,19 @@
+"""Respostas condicionais: ETag/If-None-Match nas rotas de leitura."""
+
+
+def test_etag_returns_304_until_a_write(client):
+    url = '/instituicoesensino/21000001'
+    r = client.get(url)
+    etag = r.headers['ETag']
+    assert r.status_code == 200 and etag
+
+    r = client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 304
+    assert r.headers['ETag'] == etag
+
+    r = client.post('/instituicoesensino', json={'codigo': '22000001', 'nome': 'Escola Piauí',
+                                                 'co_uf': 22, 'co_municipio': 2211001})
+    assert r.status_code == 201
+    r = client.get(url, headers={'If-None-Match': etag})
+    assert r.status_code == 200
+    assert r.headers['ETag'] != etag
@@ -0,0 +1,69 @@
+"""Pool de conexões SQLite (helpers/db_pool.py)."""
+import sqlite3
+
+import pytest
+from flask import Flask
+
+from helpers.db_pool import ConnectionPool, get_db, init_app
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=2)
+    yield pool
+    pool.close()
+
+
+def test_connections_are_reused_lifo_with_pragmas(pool):
+    a, b = pool.acquire(), pool.acquire()
+    assert a is not b
+    assert a.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert a.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    pool.release(a)
+    pool.release(b)
+    assert pool.acquire() is b  # a última devolvida sai primeiro (cache quente)
+    assert pool.acquire() is a
+    assert (pool.stats()['hits'], pool.stats()['misses']) == (2, 2)
+
+
+def test_release_rolls_back_and_discards_overflow(pool):
+    conns = [pool.acquire() for _ in range(3)]
+    conns[0].execute("CREATE TABLE t (x)")
+    conns[0].commit()
+    conns[0].execute("INSERT INTO t VALUES (1)")
+    assert conns[0].in_transaction
+    for conn in conns:
+        pool.release(conn)
+    assert not conns[0].in_transaction
+    assert conns[0].execute("SELECT count(*) FROM t").fetchone()[0] == 0
+    stats = pool.stats()
+    assert (stats['idle'], stats['discarded']) == (2, 1)
+    with pytest.raises(sqlite3.ProgrammingError):
+        conns[2].execute("SELECT 1")  # a excedente foi fechada
+
+
+def test_closed_pool_closes_returned_connections(pool):
+    conn = pool.acquire()
+    pool.close()
+    pool.release(conn)
+    assert pool.stats()['idle'] == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+
+def test_flask_requests_borrow_one_connection_and_return_it(pool):
+    app = Flask(__name__)
+    init_app(app, pool)
+    seen = []
+
+    @app.get('/')
+    def index():
+        seen.append(get_db())
+        assert get_db() is seen[-1]  # a mesma conexão durante toda a requisição
+        return {'ok': get_db().execute("SELECT 1").fetchone()[0]}
+
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get('/').get_json() == {'ok': 1}
+    assert seen[0] is seen[1] is seen[2]
+    assert (pool.stats()['misses'], pool.stats()['hits'], pool.stats()['idle']) == (1, 2, 1)
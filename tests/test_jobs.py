@@ -0,0 +1,89 @@
+"""Estado das tarefas compartilhado entre processos (dois JobRunner = dois workers)."""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from helpers.jobs import DONE, FAILED, RUNNING, TABLE, JobRunner
+
+
+def _wait(runner, job_id, status):
+    for _ in range(200):
+        job = runner.get(job_id)
+        if job.status == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'tarefa {job_id} não chegou a {status}: {job.status}')
+
+
+def test_job_is_visible_and_deduplicated_across_runners(tmp_path):
+    db_path = str(tmp_path / 'censoescolar.db')
+    worker_a, worker_b = JobRunner(db_path), JobRunner(db_path)
+    release = threading.Event()
+    calls = []
+
+    def task(job, ano):
+        calls.append(ano)
+        job.update(rows_scanned=10)
+        release.wait(5)
+        return {'rows_inserted': 3}
+
+    job = worker_a.submit(('ranking', 2024), task, 2024)
+    _wait(worker_b, job.id, RUNNING)
+    assert worker_b.submit(('ranking', 2024), task, 2024).id == job.id
+    assert worker_b.get(job.id).progress['rows_scanned'] == 10
+
+    release.set()
+    done = _wait(worker_b, job.id, DONE)
+    assert done.result == {'rows_inserted': 3}
+    assert worker_b.latest(('ranking', 2024)).id == job.id
+    assert calls == [2024]
+
+
+def _insert_running(db_path, job_id, key, heartbeat_at, pid):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"INSERT INTO {TABLE} (id, chave, status, pid, created_at, heartbeat_at) VALUES (?, ?, ?, ?, ?, ?)",
+                 (job_id, json.dumps(key), RUNNING, pid, heartbeat_at, heartbeat_at))
+    conn.commit()
+    conn.close()
+
+
+def test_job_with_expired_lease_is_failed_and_replaced(tmp_path):
+    db_path = str(tmp_path / 'censoescolar.db')
+    runner = JobRunner(db_path, lease_seconds=30)
+    runner.list()  # cria a tabela
+    # pid do próprio processo (vivo): só o lease vencido decide que a tarefa é órfã
+    _insert_running(db_path, 'orfa', ['ranking', 2023], time.time() - 60, os.getpid())
+
+    job = runner.submit(('ranking', 2023), lambda job: {'rows_inserted': 0})
+    assert job.id != 'orfa'
+    orfa = runner.get('orfa')
+    assert orfa.status == FAILED and 'lease' in orfa.error
+    assert _wait(runner, job.id, DONE).result == {'rows_inserted': 0}
+
+
+def test_job_with_live_lease_is_kept_even_if_pid_is_unknown(tmp_path):
+    db_path = str(tmp_path / 'censoescolar.db')
+    runner = JobRunner(db_path, lease_seconds=30)
+    runner.list()
+    # Worker em outra máquina: o pid não existe aqui, mas o heartbeat é recente
+    _insert_running(db_path, 'remota', ['ranking', 2022], time.time(), 2 ** 22 + 12345)
+
+    assert runner.submit(('ranking', 2022), lambda job: None).id == 'remota'
+
+
+def test_heartbeat_keeps_a_long_task_alive(tmp_path):
+    db_path = str(tmp_path / 'censoescolar.db')
+    worker_a = JobRunner(db_path, lease_seconds=0.3)
+    worker_b = JobRunner(db_path, lease_seconds=0.3)
+    release = threading.Event()
+
+    job = worker_a.submit(('ranking', 2024), lambda job: release.wait(5))
+    _wait(worker_b, job.id, RUNNING)
+    time.sleep(0.8)  # mais que o lease, sem nenhuma atualização de progresso
+    assert worker_b.submit(('ranking', 2024), lambda job: None).id == job.id
+    assert worker_b.get(job.id).heartbeat_at > job.created_at
+
+    release.set()
+    _wait(worker_b, job.id, DONE)
@@ -0,0 +1,71 @@
+"""Listagem de instituições: paginação por cursor (keyset), NDJSON em streaming e validação dos parâmetros."""
+import json
+
+from conftest import INSTITUICOES
+
+
+def _codigos(items):
+    return [item['codigo'] for item in items]
+
+
+def test_cursor_pagination_walks_all_rows(client):
+    codigos, cursor = [], ''
+    while cursor is not None:
+        r = client.get('/instituicoesensino', query_string={'cursor': cursor, 'limit': 2, 'co_uf': 21})
+        assert r.status_code == 200
+        body = r.get_json()
+        assert len(body['items']) <= 2
+        codigos += _codigos(body['items'])
+        cursor = body['next_cursor']
+    assert codigos == [i[0] for i in INSTITUICOES]
+
+
+def test_list_rejects_invalid_limit_and_cursor(client):
+    assert client.get('/instituicoesensino?cursor=&limit=0').status_code == 400
+    assert client.get('/instituicoesensino?limit=-1').status_code == 400
+    assert client.get('/instituicoesensino?limit=abc').status_code == 400
+    assert client.get('/instituicoesensino?offset=-1').status_code == 400
+    assert client.get('/instituicoesensino?cursor=nao-e-cursor').status_code == 400
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_returns_same_items_as_json(client):
+    query = {'co_uf': 21, 'limit': 50}
+    expected = client.get('/instituicoesensino', query_string=query).get_json()
+    r = client.get('/instituicoesensino', query_string={**query, 'stream': 1})
+    assert r.status_code == 200 and r.mimetype == 'application/x-ndjson'
+    assert _ndjson(r) == expected
+
+    r = client.get('/instituicoesensino', query_string={**query, 'cursor': ''},
+                   headers={'Accept': 'application/x-ndjson'})
+    assert r.mimetype == 'application/x-ndjson'
+    assert _ndjson(r) == expected  # em NDJSON o modo cursor não traz next_cursor
+
+
+def _idle_read_connections(api):
+    pool = api.replica.stats()['pool'] if api.replica.enabled else api.db_pool.stats()
+    return pool['idle']
+
+
+def test_stream_is_sent_in_batches_and_returns_connection(api, client, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_BATCH_SIZE', 2)
+    client.get('/instituicoesensino?stream=1&limit=1').close()  # o pool já tem a conexão ociosa
+    idle = _idle_read_connections(api)
+
+    r = client.get('/instituicoesensino?stream=1&co_uf=21&limit=5', buffered=False)
+    assert r.is_streamed
+    chunks = [c for c in r.response if c]
+    r.close()
+    assert [len(c.splitlines()) for c in chunks] == [2, 2, 1]
+    assert _codigos(json.loads(line) for c in chunks for line in c.splitlines()) == [i[0] for i in INSTITUICOES]
+    assert _idle_read_connections(api) == idle
+
+
+def test_stream_accepts_pages_larger_than_json(api, client):
+    limit = api.LIST_MAX_LIMIT + 1
+    assert client.get(f'/instituicoesensino?limit={limit}').status_code == 400
+    assert client.get(f'/instituicoesensino?limit={limit}&stream=1').status_code == 200
+    assert client.get(f'/instituicoesensino?limit={api.LIST_STREAM_MAX_LIMIT + 1}&stream=1').status_code == 400
@@ -0,0 +1,16 @@
+from helpers import metrics as metrics_module
+from helpers.metrics import OTHER_QUERY, Metrics
+
+
+def test_query_key_caps_distinct_normalized_queries(monkeypatch):
+    monkeypatch.setattr(metrics_module, 'MAX_QUERIES', 2)
+    metrics = Metrics(enabled=True)
+    # Listas IN de tamanhos diferentes são a mesma consulta normalizada
+    for n in range(2, 50):
+        key = metrics.query_key(f"SELECT id FROM tb_instituicao WHERE codigo IN ({', '.join('?' * n)})")
+    assert key == 'SELECT id FROM tb_instituicao WHERE codigo IN (?...)'
+    assert metrics.query_key("SELECT 1 FROM tb_usuario WHERE id = 7") == 'SELECT ? FROM tb_usuario WHERE id = ?'
+    assert metrics.query_key("SELECT nome FROM tb_usuario") == OTHER_QUERY
+    # As já acompanhadas continuam com o próprio label
+    assert metrics.query_key("SELECT id FROM tb_instituicao WHERE codigo IN (?, ?)").endswith('(?...)')
+    assert metrics.query_key("SELECT 1 FROM tb_usuario WHERE id = 8") == 'SELECT ? FROM tb_usuario WHERE id = ?'
@@ -0,0 +1,167 @@
+"""Importação dos CSVs (migrate_csv_to_sqlite.py): transformação, checkpoints e retomada."""
+import gc
+import os
+import sqlite3
+
+import pytest
+
+import migrate_csv_to_sqlite as migrate
+from conftest import ROOT
+from helpers.columnar import columnar_dir
+
+COLUMNS = ['NU_ANO_CENSO', 'NO_REGIAO', 'CO_REGIAO', 'NO_UF', 'SG_UF', 'CO_UF', 'NO_MUNICIPIO', 'CO_MUNICIPIO',
+           'NO_MESORREGIAO', 'CO_MESORREGIAO', 'NO_MICRORREGIAO', 'CO_MICRORREGIAO', 'NO_ENTIDADE', 'CO_ENTIDADE',
+           'QT_MAT_BAS', 'QT_MAT_PROF', 'QT_MAT_EJA', 'QT_MAT_ESP', 'QT_MAT_FUND', 'QT_MAT_INF', 'QT_MAT_MED',
+           'QT_MAT_ZR_NA', 'QT_MAT_ZR_RUR', 'QT_MAT_ZR_URB']
+
+
+def write_csv(path, ano, n):
+    """CSV no layout dos microdados (latin1, `;`) com `n` escolas do Maranhão."""
+    with open(path, 'w', encoding='latin1') as f:
+        f.write(';'.join(COLUMNS) + '\n')
+        for i in range(n):
+            municipio = 2100055 + (i % 3)
+            row = [ano, 'Nordeste', 2, 'Maranhão', 'MA', 21, f'Município {municipio}', municipio,
+                   'Norte Maranhense', 2101, 'Aglomeração Urbana de São Luís', 21002,
+                   f'Escola {i}', 21100000 + i] + [(i * 7 + k) % 50 for k in range(10)]
+            f.write(';'.join(map(str, row)) + '\n')
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # load_schema lê schema.sql relativo ao diretório atual
+    monkeypatch.chdir(ROOT)
+    return tmp_path
+
+
+def manifest(db):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute("SELECT byte_offset, row_offset, status FROM tb_import_manifest").fetchone()
+    finally:
+        conn.close()
+
+
+def count(db, sql):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute(sql).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_resumes_from_last_committed_chunk(workdir, monkeypatch):
+    csv, db = str(workdir / 'microdados_ed_basica_2023.csv'), str(workdir / 'censo.db')
+    write_csv(csv, 2023, 25)
+
+    # Queda no meio do segundo chunk: só o primeiro (10 linhas) fica gravado e no checkpoint
+    real_bump = migrate.bump_chunk_versions
+    calls = []
+
+    def bump(*args):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError('queda no chunk 2')
+        real_bump(*args)
+
+    monkeypatch.setattr(migrate, 'bump_chunk_versions', bump)
+    with pytest.raises(RuntimeError):
+        migrate.migrate_csv(csv, db, chunk_size=10)
+    gc.collect()  # fecha a conexão presa no traceback (rollback do chunk 2)
+
+    byte_offset, row_offset, status = manifest(db)
+    assert (row_offset, status) == (10, migrate.MANIFEST_RUNNING) and byte_offset > 0
+    assert count(db, "SELECT count(*) FROM tb_instituicao_year") == 10
+
+    monkeypatch.setattr(migrate, 'bump_chunk_versions', real_bump)
+    migrate.migrate_csv(csv, db, chunk_size=10)
+
+    assert manifest(db) == (os.path.getsize(csv), 25, migrate.MANIFEST_DONE)
+    assert count(db, "SELECT count(*) FROM tb_instituicao_year") == 25
+    assert count(db, "SELECT count(DISTINCT co_entidade) FROM tb_instituicao_year") == 25
+
+
+def test_failed_refresh_is_retried_on_resume(workdir, monkeypatch):
+    csv, db = str(workdir / 'microdados_ed_basica_2023.csv'), str(workdir / 'censo.db')
+    write_csv(csv, 2023, 25)
+
+    real_refresh = migrate.refresh_rollups
+
+    def fail(db_path):
+        raise RuntimeError('queda durante os refreshes')
+
+    monkeypatch.setattr(migrate, 'refresh_rollups', fail)
+    with pytest.raises(RuntimeError):
+        migrate.migrate_csv(csv, db, chunk_size=10)
+    gc.collect()
+
+    # Todas as linhas gravadas, mas o arquivo não pode constar como importado
+    assert manifest(db)[2] == migrate.MANIFEST_RUNNING
+    assert count(db, "SELECT count(*) FROM tb_agregado") == 0
+
+    # A nova execução não insere nada e ainda assim recalcula os derivados
+    monkeypatch.setattr(migrate, 'refresh_rollups', real_refresh)
+    migrate.migrate_csv(csv, db, chunk_size=10)
+
+    assert manifest(db)[2] == migrate.MANIFEST_DONE
+    assert count(db, "SELECT sum(qt_escolas) FROM tb_agregado WHERE nivel = 'uf' AND nu_ano_censo = 2023") == 25
+    assert count(db, "SELECT count(*) FROM tb_instituicao_fts") == 25
+    assert os.path.exists(os.path.join(columnar_dir(db), 'CURRENT'))
+
+
+def dump(db, sql):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_vectorized_transform_matches_legacy_rows(workdir):
+    csv = str(workdir / 'microdados_ed_basica_2024.csv')
+    write_csv(csv, 2024, 30)
+    with open(csv, 'a', encoding='latin1') as f:
+        blank = [''] * 10
+        # Sem código (descartada), ano fora da faixa (vale o do arquivo), valores vazios/não numéricos,
+        # decimal, espaços no nome e uma escola repetida no mesmo arquivo
+        f.write(';'.join(['2024', 'Nordeste', '2', 'Maranhão', 'MA', '21', 'X', '2100055', '', '', '', '', 'Sem código', '']
+                         + blank) + '\n')
+        f.write(';'.join(['1999', 'Nordeste', '2', 'Maranhão', 'MA', '21', 'São Luís', '2111300', '', '', '', '',
+                          '  Escola Antiga  ', '21999999', '12.0', 'abc', '', '3'] + ['1'] * 6) + '\n')
+        f.write(';'.join(['2024', 'Nordeste', '2', 'Maranhão', 'MA', '21', 'São Luís', '2111300', '', '', '', '',
+                          'Escola 0 de novo', '21100000'] + ['9'] * 10) + '\n')
+
+    legacy_db, vector_db = str(workdir / 'legacy.db'), str(workdir / 'vector.db')
+    migrate.migrate_csv(csv, legacy_db, chunk_size=7, legacy=True)
+    migrate.migrate_csv(csv, vector_db, chunk_size=7)
+
+    for sql in ("SELECT * FROM tb_instituicao ORDER BY codigo",
+                "SELECT * FROM tb_instituicao_year ORDER BY co_entidade, nu_ano_censo"):
+        # Tudo menos o id
+        legacy = [row[1:] for row in dump(legacy_db, sql)]
+        vector = [row[1:] for row in dump(vector_db, sql)]
+        assert legacy == vector
+        assert len(vector) == 31
+    antiga = dump(vector_db, "SELECT no_entidade, nu_ano_censo, qt_mat_bas, qt_mat_prof, qt_mat_total "
+                             "FROM tb_instituicao_year WHERE co_entidade = '21999999'")
+    assert antiga == [('Escola Antiga', 2024, 12, 0, 18)]  # total = soma das partes
+
+
+def test_parallel_import_matches_sequential(workdir):
+    csvs = []
+    for ano, n in ((2022, 20), (2023, 25), (2024, 30)):
+        csvs.append(str(workdir / f'microdados_ed_basica_{ano}.csv'))
+        write_csv(csvs[-1], ano, n)
+    sequential_db, parallel_db = str(workdir / 'sequential.db'), str(workdir / 'parallel.db')
+    for csv in csvs:
+        migrate.migrate_csv(csv, sequential_db, chunk_size=7)
+
+    totals = migrate.migrate_many(csvs, parallel_db, chunk_size=7, workers=2, queue_size=2)
+
+    assert totals == {'inserted': 30, 'inserted_year': 75}
+    sql = "SELECT * FROM tb_instituicao_year ORDER BY co_entidade, nu_ano_censo"
+    assert [r[1:] for r in dump(parallel_db, sql)] == [r[1:] for r in dump(sequential_db, sql)]
+    assert dump(parallel_db, "SELECT status FROM tb_import_manifest") == [(migrate.MANIFEST_DONE,)] * 3
+    assert count(parallel_db, "SELECT count(DISTINCT nu_ano_censo) FROM tb_agregado WHERE nu_ano_censo > 0") == 3
+    # Arquivos já importados: nada a fazer
+    assert migrate.migrate_many(csvs, parallel_db, chunk_size=7, workers=2) == {'inserted': 0, 'inserted_year': 0}
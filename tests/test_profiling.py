@@ -0,0 +1,28 @@
+from helpers.profiling import RequestProfiler
+
+
+def test_streamed_body_is_not_buffered_and_profile_is_saved_on_close(tmp_path):
+    produced = []
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/x-ndjson')])
+
+        def generate():
+            for i in range(3):
+                produced.append(i)
+                yield f'{{"i": {i}}}\n'.encode()
+        return generate()
+
+    profiler = RequestProfiler(str(tmp_path), enabled=True)
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/instituicoesensino', 'HTTP_X_PROFILE': '1'}
+    body = profiler.wrap(app)(environ, lambda status, headers, exc_info=None: None)
+
+    assert next(body) == b'{"i": 0}\n'
+    assert produced == [0]  # o resto ainda não foi gerado
+    assert profiler.list() == []
+    assert list(body) == [b'{"i": 1}\n', b'{"i": 2}\n']
+    body.close()
+
+    [meta] = profiler.list()
+    assert meta['path'] == '/instituicoesensino' and meta['status'] == 200
+    assert any('generate' in f['funcao'] for f in meta['top'])
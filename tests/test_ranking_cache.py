@@ -0,0 +1,30 @@
+from helpers.ranking_cache import RankingCache, touch_stamp
+
+
+def test_set_drops_value_computed_across_an_invalidation(tmp_path):
+    cache = RankingCache(str(tmp_path / 'censoescolar.db'))
+    key = RankingCache.make_key(2024, 10)
+    value, generation = cache.get(key)
+    assert value is None
+
+    cache.invalidate()  # uma escrita termina enquanto o ranking é calculado
+    assert cache.set(key, 'antigo', generation) is False
+    assert cache.get(key)[0] is None
+
+    value, generation = cache.get(key)
+    assert cache.set(key, 'novo', generation) is True
+    assert cache.get(key)[0] == 'novo'
+
+
+def test_stamp_from_other_process_is_checked_at_most_once_per_interval(tmp_path):
+    db_path = str(tmp_path / 'censoescolar.db')
+    cache = RankingCache(db_path, stamp_check_interval=3600)
+    key = RankingCache.make_key(2024, 10)
+    cache.set(key, 'valor', cache.get(key)[1])
+
+    touch_stamp(db_path)
+    assert cache.get(key)[0] == 'valor'  # ainda dentro do intervalo: nenhum stat
+
+    cache.stamp_check_interval = 0
+    assert cache.get(key)[0] is None
+    assert cache.stats()['invalidations'] == 1
@@ -0,0 +1,126 @@
+"""Motor de ranking em NumPy (snapshot colunar) contra as consultas SQL de referência: ranking anual e crescimento."""
+import os
+import random
+import sqlite3
+
+import numpy as np
+import pytest
+
+from conftest import create_database
+from helpers import ranking_engine
+from helpers.columnar import ColumnarSnapshot, columnar_dir, export_snapshot
+from helpers.ranking_sql import (GEO_FILTERS, GROWTH_BASES, GROWTH_COLUMNS, GROWTH_ORDERS, RANK_METHODS,
+                                 RANKING_COLUMNS, RANKING_METRICS, assign_ranks, build_growth_query,
+                                 build_ranking_query)
+
+YEARS = (2023, 2024)
+# Poucos municípios e valores baixos: grupos com várias escolas e muitos empates
+MUNICIPIOS = (2100055, 2100105, 2111300, 2211001)
+
+
+def _school_rows(rng, ano, n):
+    rows = []
+    for i in range(n):
+        municipio = rng.choice(MUNICIPIOS)
+        uf = municipio // 100000
+        values = [None if rng.random() < 0.05 else rng.randint(0, 30) for _ in RANKING_METRICS]
+        rows.append((f'{uf}{i:06d}', f'Escola {i}', uf, 'MA' if uf == 21 else 'PI', municipio, f'Município {municipio}',
+                     uf * 100 + municipio % 3, municipio % 7, ano, *values))
+    rng.shuffle(rows)  # ordem de inserção (id) diferente da ordem dos códigos
+    return rows
+
+
+@pytest.fixture(scope='module')
+def snapshot(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('columnar') / 'censoescolar.db')
+    conn = create_database(db_path)
+    rng = random.Random(13)
+    columns = ('co_entidade', 'no_entidade', 'co_uf', 'sg_uf', 'co_municipio', 'no_municipio',
+               'co_mesorregiao', 'co_microrregiao', 'nu_ano_censo') + RANKING_METRICS
+    for ano in YEARS:
+        # 2024 perde algumas escolas de 2023 e ganha outras
+        rows = _school_rows(rng, ano, 400)[:360 if ano == 2024 else 400]
+        conn.executemany(f"INSERT INTO tb_instituicao_year ({', '.join(columns)}) "
+                         f"VALUES ({', '.join('?' * len(columns))})", rows)
+    conn.commit()
+    conn.close()
+    export_snapshot(db_path)
+    snap = ColumnarSnapshot(columnar_dir(db_path))
+    conn = sqlite3.connect(db_path)
+    yield snap, conn
+    conn.close()
+
+
+def _sql_rank(conn, ano, metric, filters, limit, method):
+    sql, params = build_ranking_query(metric, filters)
+    items = [dict(zip(RANKING_COLUMNS, r)) for r in conn.execute(sql, (ano, *params, limit))]
+    for item, position in zip(items, assign_ranks([item[metric] for item in items], method)):
+        item['nu_ranking'] = position
+    return items
+
+
+def _filter_cases(conn, ano):
+    cases = [{}]
+    for geo in GEO_FILTERS:
+        code = conn.execute(f"SELECT {geo} FROM tb_instituicao_year WHERE nu_ano_censo = ? "
+                            f"GROUP BY {geo} ORDER BY count(*) DESC LIMIT 1", (ano,)).fetchone()[0]
+        cases.append({geo: code})
+    cases.append({'co_uf': 21, 'co_municipio': 2111300})
+    cases.append({'co_uf': 22, 'co_municipio': 2111300})  # combinação sem escolas
+    cases.append({'co_municipio': 9999999})
+    return cases
+
+
+@pytest.mark.parametrize('metric', RANKING_METRICS)
+def test_rank_matches_sql(snapshot, metric):
+    snap, conn = snapshot
+    for ano in YEARS:
+        for filters in _filter_cases(conn, ano):
+            for limit in (1, 10, 500):
+                for method in RANK_METHODS:
+                    expected = _sql_rank(conn, ano, metric, filters, limit, method)
+                    assert ranking_engine.rank(snap, ano, metric, filters, limit, method) == expected, \
+                        (ano, filters, limit, method)
+
+
+def test_top_k_breaks_ties_by_index():
+    values = np.array([5, 9, 5, 9, 1, 5, -1])
+    assert ranking_engine.top_k(values, 3).tolist() == [1, 3, 0]
+    assert ranking_engine.top_k(values, 4).tolist() == [1, 3, 0, 2]
+    assert ranking_engine.top_k(values, 3, values != 9).tolist() == [0, 2, 5]
+    assert ranking_engine.top_k(values, 0).tolist() == []
+
+
+def test_export_writes_one_order_per_metric(snapshot):
+    snap, _ = snapshot
+    files = set(os.listdir(os.path.join(snap.root, snap.version, str(YEARS[0]))))
+    assert {f"{m}.order.npy" for m in RANKING_METRICS} <= files
+    assert {f"{g}.rows.npy" for g in GEO_FILTERS} <= files
+    # Nada de ordem por métrica x coluna geográfica: o filtro usa top_k no grupo
+    assert len([f for f in files if f.endswith('.order.npy')]) == len(RANKING_METRICS)
+
+
+def _sql_growth(conn, de, ate, metric, limit, por, ordem, method):
+    items = [dict(zip(GROWTH_COLUMNS, r)) for r in conn.execute(build_growth_query(metric, por, ordem), (ate, de, limit))]
+    for item in items:
+        if item['delta_pct'] is not None:
+            item['delta_pct'] = round(item['delta_pct'], 2)
+    keys = [item['delta' if por == 'absoluto' else 'delta_pct'] for item in items]
+    for item, position in zip(items, assign_ranks(keys, method)):
+        item['nu_ranking'] = position
+    return items
+
+
+@pytest.mark.parametrize('metric', RANKING_METRICS)
+def test_growth_matches_sql(snapshot, metric):
+    snap, conn = snapshot
+    de, ate = YEARS
+    assert snap.has_growth(de, ate)
+    for por in GROWTH_BASES:
+        for ordem in GROWTH_ORDERS:
+            for limit in (1, 10, 500):
+                for method in RANK_METHODS:
+                    expected = _sql_growth(conn, de, ate, metric, limit, por, ordem, method)
+                    assert expected, (por, ordem)
+                    assert ranking_engine.growth(snap, de, ate, metric, limit, por, ordem, method) == expected, \
+                        (por, ordem, limit, method)
@@ -0,0 +1,23 @@
+"""Os índices de helpers/ranking_sql.py atendem todo ranking sem ordenação em memória."""
+import pytest
+
+from helpers.ranking_sql import GEO_FILTERS, RANKING_METRICS, create_ranking_indexes, explain_ranking_query
+
+from conftest import create_database
+
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    conn = create_database(tmp_path_factory.mktemp('plans') / 'censoescolar.db')
+    create_ranking_indexes(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('geo', (None,) + GEO_FILTERS)
+@pytest.mark.parametrize('metric', RANKING_METRICS)
+def test_ranking_uses_index_without_sort(conn, metric, geo):
+    plan = explain_ranking_query(conn, metric, {geo: 1} if geo else {})
+    expected = f"idx_rank_{metric}_{geo}" if geo else f"idx_rank_{metric}"
+    assert any(f"INDEX {expected} " in step for step in plan), plan
+    assert not any('USE TEMP B-TREE' in step for step in plan), plan
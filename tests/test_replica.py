@@ -0,0 +1,112 @@
+"""Réplica de leitura em memória (helpers/replica.py): sync das escritas e cópia nova quando fica para trás."""
+import sqlite3
+import time
+
+import pytest
+
+from conftest import create_database
+from helpers import data_version
+from helpers.replica import ReadReplica
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'censoescolar.db')
+    conn = create_database(path)
+    conn.execute("INSERT INTO tb_usuario (nome, cpf, nascimento) VALUES ('Ana', '111', '2000-01-01')")
+    data_version.bump(conn.cursor(), 'tb_usuario')
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def replica(db_path):
+    # Intervalo longo: a thread de conferência só roda quando acordada
+    replica = ReadReplica(db_path, pool_size=2, refresh_interval=3600)
+    yield replica
+    replica._pid = None  # encerra a thread de conferência
+    replica._wake.set()
+    if replica._gen is not None:
+        replica._gen.close()
+
+
+def write(db_path, sql, params=()):
+    """Escrita direta no disco com bump da versão, como a API (ou outro processo) faria."""
+    conn = sqlite3.connect(db_path)
+    cur = conn.execute(sql, params)
+    data_version.bump(conn.cursor(), 'tb_usuario')
+    conn.commit()
+    conn.close()
+    return cur.lastrowid
+
+
+def read(replica, sql):
+    pool, conn = replica.acquire()
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        pool.release(conn)
+
+
+def disk_version(db_path):
+    return data_version.DataVersions(db_path).get(('tb_usuario',))[0]
+
+
+def test_sync_copies_committed_rows_and_version(db_path, replica):
+    assert read(replica, "SELECT nome FROM tb_usuario") == [('Ana',)]
+
+    novo = write(db_path, "INSERT INTO tb_usuario (nome, cpf, nascimento) VALUES ('Bia', '222', '2001-01-01')")
+    assert read(replica, "SELECT count(*) FROM tb_usuario") == [(1,)]  # ainda não sincronizado
+    replica.sync({'tb_usuario': ("id = ?", (novo,))})
+    assert read(replica, "SELECT nome FROM tb_usuario ORDER BY id") == [('Ana',), ('Bia',)]
+    assert replica.get(('tb_usuario',))[0] == disk_version(db_path)
+
+    write(db_path, "DELETE FROM tb_usuario WHERE id = ?", (novo,))
+    replica.sync({'tb_usuario': ("id = ?", (novo,))})
+    assert read(replica, "SELECT nome FROM tb_usuario") == [('Ana',)]
+    assert replica.get(('tb_usuario',))[0] == disk_version(db_path)
+    assert replica.builds == 1  # tudo por sync, sem recopiar o banco
+
+
+def test_write_from_another_process_is_picked_up_by_refresh(db_path, replica):
+    antes = replica.get(('tb_usuario',))[0]
+    pool, borrowed = replica.acquire()
+
+    write(db_path, "UPDATE tb_usuario SET nome = 'Ana Maria'")
+    # A réplica não anuncia a versão nova antes de ter o dado
+    assert replica.get(('tb_usuario',))[0] == antes != disk_version(db_path)
+    assert replica.refresh()
+    assert not replica.refresh()  # versões iguais: nada a copiar
+
+    assert read(replica, "SELECT nome FROM tb_usuario") == [('Ana Maria',)]
+    assert replica.get(('tb_usuario',))[0] == disk_version(db_path)
+    # A conexão emprestada antes da troca ainda lê a geração antiga até ser devolvida
+    assert borrowed.execute("SELECT nome FROM tb_usuario").fetchall() == [('Ana',)]
+    pool.release(borrowed)
+
+
+def test_sync_behind_another_write_keeps_old_version_until_refresh(db_path, replica):
+    replica.warm()
+    antes = replica.get(('tb_usuario',))[0]
+    write(db_path, "INSERT INTO tb_usuario (nome, cpf, nascimento) VALUES ('Caio', '333', '2002-01-01')")
+    novo = write(db_path, "INSERT INTO tb_usuario (nome, cpf, nascimento) VALUES ('Duda', '444', '2003-01-01')")
+
+    # Duas versões à frente: o sync copia as linhas pedidas, mas não assume a versão do disco
+    # e acorda a thread de conferência, que monta uma cópia nova
+    replica.sync({'tb_usuario': ("id = ?", (novo,))})
+    for _ in range(200):
+        if replica.get(('tb_usuario',))[0] != antes:
+            break
+        time.sleep(0.01)
+    assert replica.builds == 2
+    assert replica.get(('tb_usuario',))[0] == disk_version(db_path)
+    assert read(replica, "SELECT nome FROM tb_usuario ORDER BY id") == [('Ana',), ('Caio',), ('Duda',)]
+
+
+def test_disabled_replica_does_nothing(db_path):
+    replica = ReadReplica(db_path, enabled=False)
+    replica.warm()
+    replica.sync({'tb_usuario': None})
+    assert not replica.refresh()
+    assert replica.stats()['builds'] == 0
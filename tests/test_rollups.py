@@ -0,0 +1,47 @@
+"""Agregações geográficas materializadas (tb_agregado) e GET /agregados."""
+from helpers import rollups
+
+from conftest import INSTITUICOES, create_database
+
+
+def test_agregados_cadastro_follow_writes(client):
+    r = client.get('/agregados/municipio/cadastro', query_string={'codigo': 2111300})
+    assert r.status_code == 200
+    [municipio] = r.get_json()
+    assert municipio['qt_escolas'] == 3 and municipio['qt_mat_bas'] == 525
+
+    r = client.post('/instituicoesensino', json={'codigo': '23000001', 'nome': 'Escola Fortaleza',
+                                                 'co_uf': 23, 'co_municipio': 2304400, 'qt_mat_bas': 40})
+    assert r.status_code == 201
+    [uf] = client.get('/agregados/uf/cadastro?codigo=23').get_json()
+    assert uf['qt_escolas'] == 1 and uf['qt_mat_bas'] == 40
+
+    assert client.put('/instituicoesensino/23000001', json={'qt_mat_bas': 55}).status_code == 200
+    [uf] = client.get('/agregados/uf/cadastro?codigo=23').get_json()
+    assert uf['qt_mat_bas'] == 55
+
+    assert client.delete('/instituicoesensino/23000001').status_code == 200
+    assert client.get('/agregados/uf/cadastro?codigo=23').status_code == 404
+
+
+def test_agregados_validates_parameters(client):
+    assert client.get('/agregados/bairro/cadastro').status_code == 400
+    assert client.get('/agregados/mesorregiao/cadastro').status_code == 400
+    assert client.get('/agregados/uf/ontem').status_code == 400
+
+
+def test_ensure_fills_table_left_empty_by_schema(tmp_path):
+    # Banco migrado com a tabela de agregações criada vazia pelo schema.sql
+    conn = create_database(tmp_path / 'censoescolar.db')
+    conn.executemany("INSERT INTO tb_instituicao (codigo, nome, co_uf, sg_uf, co_municipio, no_municipio, qt_mat_bas) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", INSTITUICOES)
+    conn.executemany("INSERT INTO tb_instituicao_year (co_entidade, co_uf, no_uf, co_municipio, nu_ano_censo, qt_mat_total) "
+                     "VALUES (?, 21, 'Maranhão', ?, 2024, ?)", [(i[0], i[4], i[6]) for i in INSTITUICOES])
+    conn.commit()
+
+    assert rollups.ensure(conn) is True
+    cadastro = conn.execute(rollups.rollup_query(21), ('uf', rollups.CADASTRO, 21)).fetchone()
+    assert cadastro[2] == len(INSTITUICOES)
+    ano = dict(zip(rollups.ROLLUP_COLUMNS, conn.execute(rollups.rollup_query(21), ('uf', 2024, 21)).fetchone()))
+    assert ano['nome'] == 'Maranhão' and ano['qt_mat_total'] == sum(i[6] for i in INSTITUICOES)
+    assert rollups.ensure(conn) is False
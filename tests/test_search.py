@@ -0,0 +1,45 @@
+"""Busca textual (GET /instituicoesensino/busca) e manutenção do índice FTS5."""
+import os
+
+from helpers import search
+
+from conftest import INSTITUICOES, ROOT, create_database
+
+
+def _codigos(items):
+    return [item['codigo'] for item in items]
+
+
+def test_busca_ignores_accents_and_matches_prefix(client):
+    r = client.get('/instituicoesensino/busca', query_string={'q': 'SAO JOAO'})
+    assert r.status_code == 200
+    assert _codigos(r.get_json()) == ['21000001']
+
+    r = client.get('/instituicoesensino/busca', query_string={'q': 'colegio jo'})
+    assert _codigos(r.get_json()) == ['21000003']
+
+    # O nome pesa mais que o município na relevância
+    r = client.get('/instituicoesensino/busca', query_string={'q': 'sao'})
+    assert _codigos(r.get_json())[0] == '21000001'
+
+
+def test_busca_validates_parameters(client):
+    assert client.get('/instituicoesensino/busca').status_code == 400
+    assert client.get('/instituicoesensino/busca?q=escola&limit=0').status_code == 400
+    assert client.get('/instituicoesensino/busca?q=escola&offset=x').status_code == 400
+
+
+def test_ensure_rebuilds_index_left_empty_by_schema(tmp_path):
+    conn = create_database(tmp_path / 'censoescolar.db')
+    conn.executemany("INSERT INTO tb_instituicao (codigo, nome, co_uf, sg_uf, co_municipio, no_municipio, qt_mat_bas) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", INSTITUICOES)
+    conn.commit()
+    # schema.sql aplicado de novo sobre o banco migrado: a tabela existe, mas vazia
+    with open(os.path.join(ROOT, 'schema.sql')) as f:
+        conn.executescript(f.read())
+
+    assert search.ensure(conn) is True
+    assert conn.execute(f"SELECT count(*) FROM {search.TABLE}").fetchone()[0] == len(INSTITUICOES)
+    match = search.match_query('sao joao')
+    assert conn.execute(search.search_query(), (match, 10, 0)).fetchone()[0] == '21000001'
+    assert search.ensure(conn) is False